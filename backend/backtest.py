@@ -0,0 +1,251 @@
+# backtest.py
+# Walk-forward backtest of the /predict model: accuracy, confidence calibration
+# and compute cost, step by step.
+#
+# Usage:
+#   python backtest.py [--dataset PATH] [--tolerance 10] [--small-history 5]
+#                      [--max-steps N] [--json report.json]
+#
+# Without --dataset it reads submitted attempts from DATABASE_URL (no Flask app
+# needed). PATH may be a CSV/Parquet file from synthetic.py or a directory of
+# feature_pipeline.py parts.
+#
+# Every (user, quiz) history is replayed in time order. After t attempts the
+# model holds exactly the state /predict would (moments folded in one attempt at
+# a time), and its prediction for attempt t+1 is scored against the real
+# percentage. Histories are sorted by length, so step t is one fold and one
+# batched 3x3 solve over a prefix of all of them, whatever the number of users.
+#
+# A prediction counts as a hit when it lands within --tolerance percentage
+# points; a well-calibrated confidence score is close to its hit rate.
+# --small-history changes the "fewer than N attempts -> blend the last two
+# scores" threshold so alternatives can be compared on the same data.
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from predictor import (
+    PREDICTION_ATTEMPTS_REQUIRED, SMALL_HISTORY_ATTEMPTS, difficulty_to_num, fit_from_moments,
+    predict_next_percentage, confidence_score, confidence_label, regression_metrics,
+)
+
+DEFAULT_TOLERANCE = 10.0
+CALIBRATION_BINS = 10
+
+HISTORY_SQL = """
+    SELECT id, user_id, quiz_id, timestamp, difficulty, percentage
+    FROM quiz_attempt
+    WHERE status = 'submitted' AND percentage IS NOT NULL
+    ORDER BY user_id, quiz_id, timestamp, id
+"""
+
+
+# -------------------------
+# Loading
+# -------------------------
+def load_histories_from_db(engine):
+    with engine.connect() as conn:
+        return pd.read_sql(text(HISTORY_SQL), conn)
+
+
+def load_histories_from_file(path):
+    path = Path(path)
+    files = sorted(path.glob("part-*")) if path.is_dir() else [path]
+    if not files:
+        raise ValueError(f"no part files under {path}")
+    frames = [pd.read_parquet(f) if f.suffix == ".parquet" else pd.read_csv(f) for f in files]
+    df = pd.concat(frames, ignore_index=True)
+    if "attempt_id" in df.columns:  # feature_pipeline.py output
+        df = df.rename(columns={"attempt_id": "id"})
+    if "status" in df.columns:
+        df = df[df["status"] == "submitted"]
+    return df[df["percentage"].notna()]
+
+
+def history_arrays(df):
+    """
+    Flat, time-ordered percentage/difficulty arrays plus the start and length of
+    every (user, quiz) history, longest history first.
+    """
+    df = df.copy()
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    df = df.sort_values(["user_id", "quiz_id", "timestamp", "id"], kind="stable", ignore_index=True)
+    if "difficulty_num" in df.columns:
+        difficulty_num = df["difficulty_num"].to_numpy(dtype=float)
+    else:
+        levels, uniques = pd.factorize(df["difficulty"].fillna(""))
+        difficulty_num = np.array([difficulty_to_num(d) for d in uniques], dtype=float)[levels]
+
+    sizes = df.groupby(["user_id", "quiz_id"], sort=False).size().to_numpy()
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    order = np.argsort(-sizes, kind="stable")
+    return df["percentage"].to_numpy(dtype=float), difficulty_num, starts[order], sizes[order]
+
+
+# -------------------------
+# Replay
+# -------------------------
+def calibration_report(scores, hits, errors):
+    labels = confidence_label(scores)
+    by_label = {}
+    for label in ("Low", "Medium", "High"):
+        mask = labels == label
+        if mask.any():
+            by_label[label] = {
+                "predictions": int(mask.sum()),
+                "mean_confidence": round(float(scores[mask].mean()), 4),
+                "hit_rate": round(float(hits[mask].mean()), 4),
+                "mae": round(float(np.abs(errors[mask]).mean()), 4),
+            }
+    # expected calibration error: |hit rate - mean confidence| weighted over score bins
+    bins = np.minimum((scores * CALIBRATION_BINS).astype(int), CALIBRATION_BINS - 1)
+    counts = np.bincount(bins, minlength=CALIBRATION_BINS)
+    used = counts > 0
+    mean_score = np.bincount(bins, scores, CALIBRATION_BINS)[used] / counts[used]
+    hit_rate = np.bincount(bins, hits, CALIBRATION_BINS)[used] / counts[used]
+    ece = float(np.sum(counts[used] * np.abs(hit_rate - mean_score)) / counts.sum())
+    return {"by_label": by_label, "expected_calibration_error": round(ece, 4)}
+
+
+def run_backtest(pct, difficulty_num, starts, lengths, tolerance=DEFAULT_TOLERANCE,
+                 small_history=SMALL_HISTORY_ATTEMPTS, max_steps=None):
+    """Replay every history (see history_arrays) and return the report dict."""
+    h = len(lengths)
+    S, T = np.zeros((h, 3, 3, 3)), np.zeros((h, 3, 3))
+    pct_sum, pct_sq_sum = np.zeros(h), np.zeros(h)
+    last, prev, last_diff = np.full(h, np.nan), np.full(h, np.nan), np.zeros(h)
+
+    # histories are sorted longest first, so "length >= t" is a prefix
+    neg_lengths = -lengths
+    max_t = int(lengths.max(initial=0)) - 1
+    if max_steps is not None:
+        max_t = min(max_t, PREDICTION_ATTEMPTS_REQUIRED + max_steps - 1)
+
+    steps, collected = [], {"actual": [], "model": [], "fit": [], "last": [], "blended": [], "confidence": []}
+    for t in range(1, max_t + 1):
+        started = time.perf_counter()
+        k = int(np.searchsorted(neg_lengths, -t, side="right"))
+        rows = starts[:k] + t - 1
+        x = np.column_stack([np.ones(k), np.full(k, float(t)), difficulty_num[rows]])
+        powers = float(t) ** np.arange(3)
+        S[:k] += powers[None, :, None, None] * (x[:, :, None] * x[:, None, :])[:, None]
+        T[:k] += powers[None, :, None] * (x * pct[rows, None])[:, None]
+        pct_sum[:k] += pct[rows]
+        pct_sq_sum[:k] += pct[rows] ** 2
+        prev[:k], last[:k], last_diff[:k] = last[:k], pct[rows], difficulty_num[rows]
+        fold_seconds = time.perf_counter() - started
+
+        if t < PREDICTION_ATTEMPTS_REQUIRED:
+            continue
+        m = int(np.searchsorted(neg_lengths, -(t + 1), side="right"))  # histories with an attempt t+1
+
+        started = time.perf_counter()
+        beta = fit_from_moments({"S": S[:m], "T": T[:m]}, t)
+        predicted = predict_next_percentage(beta, t, last_diff[:m], last[:m], prev[:m], small_history)
+        mean = pct_sum[:m] / t
+        confidence = confidence_score(t, np.sqrt(np.maximum(pct_sq_sum[:m] / t - mean ** 2, 0.0)))
+        predict_seconds = time.perf_counter() - started
+
+        actual = pct[starts[:m] + t]
+        collected["actual"].append(actual)
+        collected["model"].append(predicted)
+        collected["fit"].append(predict_next_percentage(beta, t, last_diff[:m], last[:m], prev[:m], 0))
+        collected["blended"].append(predict_next_percentage(beta, t, last_diff[:m], last[:m], prev[:m], t + 1))
+        collected["last"].append(last[:m].copy())
+        collected["confidence"].append(confidence)
+        steps.append({
+            "attempts": t,
+            "predictions": m,
+            **regression_metrics(actual, predicted),
+            "hit_rate": round(float(np.mean(np.abs(actual - predicted) <= tolerance)), 4),
+            "fold_ms": round(fold_seconds * 1000, 3),
+            "predict_ms": round(predict_seconds * 1000, 3),
+            "us_per_prediction": round(predict_seconds * 1e6 / m, 3),
+        })
+
+    if not steps:
+        return {"histories": h, "predictions": 0, "steps": [], "models": {}, "calibration": {}}
+
+    data = {key: np.concatenate(values) for key, values in collected.items()}
+    errors = data["actual"] - data["model"]
+    hits = (np.abs(errors) <= tolerance).astype(float)
+    return {
+        "histories": h,
+        "predictions": int(len(errors)),
+        "tolerance": tolerance,
+        "small_history": small_history,
+        "steps": steps,
+        # the served model next to its parts and the naive "same as last time" baseline
+        "models": {
+            name: regression_metrics(data["actual"], data[name]) for name in ("model", "fit", "blended", "last")
+        },
+        "calibration": calibration_report(data["confidence"], hits, errors),
+        "predict_seconds": round(sum(s["predict_ms"] for s in steps) / 1000, 4),
+        "fold_seconds": round(sum(s["fold_ms"] for s in steps) / 1000, 4),
+    }
+
+
+# -------------------------
+# CLI
+# -------------------------
+def print_report(report):
+    print(f"{report['histories']} histories, {report['predictions']} predictions")
+    if not report["steps"]:
+        print("Nothing to score: no history has more than "
+              f"{PREDICTION_ATTEMPTS_REQUIRED} attempts.")
+        return
+
+    print(f"\n{'attempts':>8} {'preds':>8} {'mae':>8} {'rmse':>8} {'hit':>6} {'fold ms':>9} {'pred ms':>9} {'us/pred':>8}")
+    for s in report["steps"]:
+        print(f"{s['attempts']:>8} {s['predictions']:>8} {s['mae']:>8.3f} {s['rmse']:>8.3f} {s['hit_rate']:>6.3f} "
+              f"{s['fold_ms']:>9.3f} {s['predict_ms']:>9.3f} {s['us_per_prediction']:>8.3f}")
+
+    print(f"\nOverall (small-history blend below {report['small_history']} attempts):")
+    for name, m in report["models"].items():
+        print(f"  {name:<8} mae={m['mae']:.3f} rmse={m['rmse']:.3f}")
+
+    print(f"\nConfidence calibration (hit = within {report['tolerance']} points):")
+    for label, c in report["calibration"]["by_label"].items():
+        print(f"  {label:<6} n={c['predictions']:<8} confidence={c['mean_confidence']:.3f} "
+              f"hit_rate={c['hit_rate']:.3f} mae={c['mae']:.3f}")
+    print(f"  expected calibration error: {report['calibration']['expected_calibration_error']:.4f}")
+    print(f"\nCompute: fold {report['fold_seconds']}s, predict {report['predict_seconds']}s")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    options = dict(zip(argv[::2], argv[1::2]))
+    unknown = set(options) - {"--dataset", "--tolerance", "--small-history", "--max-steps", "--json"}
+    if len(argv) % 2 or unknown:
+        print("Usage: python backtest.py [--dataset PATH] [--tolerance 10] [--small-history 5] "
+              "[--max-steps N] [--json report.json]")
+        sys.exit(1)
+
+    started = time.perf_counter()
+    if "--dataset" in options:
+        df = load_histories_from_file(options["--dataset"])
+    else:
+        from migrations import get_engine
+        df = load_histories_from_db(get_engine())
+    arrays = history_arrays(df)
+    print(f"Loaded {len(df)} attempts in {time.perf_counter() - started:.2f}s")
+
+    report = run_backtest(
+        *arrays,
+        tolerance=float(options.get("--tolerance", DEFAULT_TOLERANCE)),
+        small_history=int(options.get("--small-history", SMALL_HISTORY_ATTEMPTS)),
+        max_steps=int(options["--max-steps"]) if "--max-steps" in options else None,
+    )
+    print_report(report)
+    if "--json" in options:
+        Path(options["--json"]).write_text(json.dumps(report, indent=2))
+        print(f"✅ Report written to {options['--json']}")
+
+
+if __name__ == "__main__":
+    main()
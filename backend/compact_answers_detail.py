@@ -0,0 +1,92 @@
+# compact_answers_detail.py
+# Usage: python compact_answers_detail.py [batch_size] [sleep_seconds]
+# Rewrites legacy answers_detail lists into the compact format in small batches
+# (safe to run while the app is serving) and reports the size before/after.
+import sys
+import time
+
+import numpy as np
+from sqlalchemy import text, update
+
+from server import app, db, QuizAttempt, compact_answers_detail, is_compact_detail
+
+batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+sleep_seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+
+
+def table_size():
+    """(table bytes or None, answers_detail bytes)."""
+    detail_bytes = db.session.execute(
+        text("SELECT COALESCE(SUM(LENGTH(CAST(answers_detail AS TEXT))), 0) FROM quiz_attempt")
+    ).scalar()
+    table_bytes = None
+    try:
+        if db.engine.dialect.name == "postgresql":
+            table_bytes = db.session.execute(text("SELECT pg_total_relation_size('quiz_attempt')")).scalar()
+        else:
+            table_bytes = db.session.execute(
+                text("SELECT SUM(pgsize) FROM dbstat WHERE name = 'quiz_attempt'")
+            ).scalar()
+    except Exception:
+        db.session.rollback()  # dbstat is not compiled into every SQLite build
+    return table_bytes, int(detail_bytes or 0)
+
+
+def compacted(row):
+    """Compact form of a legacy detail list, or None if it can't be mapped onto question_order."""
+    detail, question_order = row.answers_detail, row.question_order or []
+    if not isinstance(detail, list) or len(detail) != len(question_order) or not detail:
+        return None
+    try:
+        if [d["question_id"] for d in detail] != list(question_order):
+            return None
+        selected = [int(d["selected_option"]) for d in detail]
+        correct_mask = np.array([bool(d["is_correct"]) for d in detail])
+        answer_key = [int(d["correct_option"]) for d in detail]
+    except (KeyError, TypeError, ValueError):
+        return None
+    return compact_answers_detail(selected, correct_mask), answer_key
+
+
+with app.app_context():
+    before = table_size()
+    print(f"Before: table={before[0]} bytes, answers_detail={before[1]} bytes")
+
+    last_id, converted, skipped = 0, 0, 0
+    while True:
+        rows = (
+            db.session.query(QuizAttempt.id, QuizAttempt.answers_detail, QuizAttempt.question_order, QuizAttempt.answer_key)
+            .filter(QuizAttempt.id > last_id, QuizAttempt.answers_detail.isnot(None))
+            .order_by(QuizAttempt.id.asc())
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        updates = []
+        for row in rows:
+            if is_compact_detail(row.answers_detail):
+                continue
+            result = compacted(row)
+            if result is None:
+                skipped += 1
+                continue
+            detail, answer_key = result
+            # keep the key the attempt was graded with
+            updates.append({"id": row.id, "answers_detail": detail, "answer_key": row.answer_key or answer_key})
+
+        if updates:
+            db.session.execute(update(QuizAttempt), updates)
+        db.session.commit()
+        converted += len(updates)
+        print(f"...up to id {last_id}: {converted} compacted, {skipped} skipped")
+        if sleep_seconds:
+            time.sleep(sleep_seconds)
+
+    after = table_size()
+    print(f"After: table={after[0]} bytes, answers_detail={after[1]} bytes")
+    if db.engine.dialect.name == "postgresql":
+        print("Note: PostgreSQL returns the space after VACUUM (FULL) quiz_attempt.")
+    print(f"✅ Compacted {converted} attempts ({skipped} left as-is).")
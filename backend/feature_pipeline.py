@@ -0,0 +1,227 @@
+# feature_pipeline.py
+# Streams submitted quiz_attempt rows into per-attempt training features.
+#
+# Usage:
+#   python feature_pipeline.py <out_dir> [--window 5] [--chunk-rows 200000]
+#                              [--format parquet|csv] [--restart]
+#
+# Rows are read in (user_id, quiz_id, timestamp) order through a server-side
+# cursor (stream_results), so the table is never loaded whole. Features are
+# computed per chunk with vectorized groupby operations; a chunk is only cut at a
+# (user, quiz) boundary, so every history is complete inside the part file that
+# holds it and memory stays at about one chunk plus the longest single history.
+#
+# Each chunk is written to <out_dir>/part-NNNNN.<format> and then recorded in
+# <out_dir>/_checkpoint.json. Re-running the same command resumes after the last
+# finished (user, quiz); --restart drops the existing parts and starts over.
+# Parquet needs pyarrow; without it the default format is csv.
+#
+# Like migrations.py this only needs DATABASE_URL, not the Flask app.
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from migrations import get_engine
+from predictor import difficulty_to_num
+
+try:
+    import pyarrow  # noqa: F401  (only needed for parquet output)
+    DEFAULT_FORMAT = "parquet"
+except ImportError:
+    DEFAULT_FORMAT = "csv"
+
+FEATURE_FORMATS = ("csv", "parquet")
+DEFAULT_WINDOW = 5
+DEFAULT_CHUNK_ROWS = 200_000
+CHECKPOINT_FILE = "_checkpoint.json"
+
+GROUP_KEYS = ["user_id", "quiz_id"]
+
+# Same population as /predict's model state: submitted attempts with a percentage.
+ATTEMPTS_SQL = """
+    SELECT id, user_id, quiz_id, timestamp, difficulty, score, total_questions,
+           percentage, duration_seconds
+    FROM quiz_attempt
+    WHERE status = 'submitted' AND percentage IS NOT NULL
+      AND (user_id > :after_user OR (user_id = :after_user AND quiz_id > :after_quiz))
+    ORDER BY user_id, quiz_id, timestamp, id
+"""
+
+
+def compute_features(df, window=DEFAULT_WINDOW):
+    """
+    Feature frame for complete, ordered (user, quiz) histories. Rolling stats look
+    only at the `window` attempts before each row, so they never include the
+    row's own percentage; next_percentage is the label for next-score models.
+    """
+    df = df.reset_index(drop=True)
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    g = df.groupby(GROUP_KEYS, sort=False)
+
+    position = g.cumcount().to_numpy()  # 0-based attempt position in the history
+    levels, uniques = pd.factorize(df["difficulty"].fillna(""))
+    difficulty_num = np.array([difficulty_to_num(d) for d in uniques], dtype=np.int8)[levels]
+
+    # prefix sums before each row, per group, so the window sums stay small numbers
+    pct = df["percentage"].astype(float)
+    before = g["percentage"].cumsum() - pct
+    before_sq = (pct ** 2).groupby([df[k] for k in GROUP_KEYS], sort=False).cumsum() - pct ** 2
+    frame = pd.DataFrame({"before": before, "before_sq": before_sq, **{k: df[k] for k in GROUP_KEYS}})
+    lagged = frame.groupby(GROUP_KEYS, sort=False)[["before", "before_sq"]].shift(window).fillna(0.0)
+    count = np.minimum(position, window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = (before - lagged["before"]).to_numpy() / count
+        mean_sq = (before_sq - lagged["before_sq"]).to_numpy() / count
+    # differences of prefix sums leave rounding noise where the window is constant,
+    # which can also push the variance slightly below zero
+    var = np.maximum(mean_sq - mean ** 2, 0.0)
+    var[var <= 1e-12 * mean_sq] = 0.0
+    std = np.sqrt(var)
+
+    # consecutive-day streak ending at each attempt (same day doesn't count twice)
+    day = df["timestamp"].dt.normalize()
+    day_gap = day.groupby([df[k] for k in GROUP_KEYS], sort=False).diff()
+    run_id = ((position == 0) | (day_gap > pd.Timedelta(days=1))).cumsum()
+    run_start = day.groupby(run_id).transform("first")
+    streak = (day - run_start).dt.days + 1
+
+    return pd.DataFrame({
+        "attempt_id": df["id"].astype(np.int64),
+        "user_id": df["user_id"].astype(np.int64),
+        "quiz_id": df["quiz_id"].astype(np.int64),
+        "attempt_index": position + 1,
+        "timestamp": df["timestamp"],
+        "difficulty_num": difficulty_num,
+        "score": df["score"],
+        "total_questions": df["total_questions"],
+        "duration_seconds": df["duration_seconds"],
+        "rolling_mean": mean,
+        "rolling_std": std,
+        "gap_hours": g["timestamp"].diff().dt.total_seconds().to_numpy() / 3600.0,
+        "streak_days": streak.to_numpy(),
+        "percentage": pct,
+        "next_percentage": g["percentage"].shift(-1),
+    })
+
+
+def write_part(out_dir, number, features, fmt):
+    """Write one part file atomically (temp file + rename) and return its name."""
+    name = f"part-{number:05d}.{fmt}"
+    tmp = out_dir / f".{name}.tmp"
+    if fmt == "parquet":
+        features.to_parquet(tmp, index=False)
+    else:
+        features.to_csv(tmp, index=False)
+    os.replace(tmp, out_dir / name)
+    return name
+
+
+def load_checkpoint(out_dir, config, restart):
+    path = out_dir / CHECKPOINT_FILE
+    if restart:
+        for stale in out_dir.glob("part-*.*"):
+            stale.unlink()
+        path.unlink(missing_ok=True)
+    if not path.exists():
+        return {**config, "after": [-1, -1], "parts": 0, "rows": 0, "histories": 0, "done": False}
+
+    checkpoint = json.loads(path.read_text())
+    changed = [k for k in config if checkpoint.get(k) != config[k]]
+    if changed:
+        raise ValueError(f"{out_dir} was written with different {', '.join(changed)}; use --restart")
+    return checkpoint
+
+
+def save_checkpoint(out_dir, checkpoint):
+    tmp = out_dir / f".{CHECKPOINT_FILE}.tmp"
+    tmp.write_text(json.dumps(checkpoint, indent=2))
+    os.replace(tmp, out_dir / CHECKPOINT_FILE)
+
+
+def run_pipeline(engine, out_dir, window=DEFAULT_WINDOW, chunk_rows=DEFAULT_CHUNK_ROWS, fmt=DEFAULT_FORMAT,
+                 restart=False):
+    """Stream quiz_attempt into feature part files under out_dir and return the final checkpoint."""
+    if fmt not in FEATURE_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FEATURE_FORMATS)}")
+    if window < 1 or chunk_rows < 1:
+        raise ValueError("window and chunk rows must be positive")
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    checkpoint = load_checkpoint(out_dir, {"window": window, "format": fmt}, restart)
+    if checkpoint["done"]:
+        return checkpoint
+
+    def flush(frame):
+        features = compute_features(frame, window)
+        checkpoint["parts"] += 1
+        name = write_part(out_dir, checkpoint["parts"] - 1, features, fmt)
+        last = frame.iloc[-1]
+        checkpoint["after"] = [int(last["user_id"]), int(last["quiz_id"])]
+        checkpoint["rows"] += len(features)
+        checkpoint["histories"] += int(features["attempt_index"].eq(1).sum())
+        save_checkpoint(out_dir, checkpoint)
+        print(f"  {name}: {len(features)} rows (through user {checkpoint['after'][0]}, quiz {checkpoint['after'][1]})")
+
+    started = time.perf_counter()
+    after_user, after_quiz = checkpoint["after"]
+    pending = None
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_rows).execute(
+            text(ATTEMPTS_SQL), {"after_user": after_user, "after_quiz": after_quiz}
+        )
+        columns = list(result.keys())
+        for rows in result.partitions(chunk_rows):
+            batch = pd.DataFrame(rows, columns=columns)
+            pending = batch if pending is None else pd.concat([pending, batch], ignore_index=True)
+            if len(pending) < chunk_rows:
+                continue
+            # cut after the last complete (user, quiz); the open one waits for more rows
+            keys = pending[GROUP_KEYS].to_numpy()
+            changes = np.flatnonzero((keys[1:] != keys[:-1]).any(axis=1))
+            open_start = int(changes[-1]) + 1 if len(changes) else 0
+            if open_start == 0:
+                continue  # a single history longer than chunk_rows; keep reading
+            flush(pending.iloc[:open_start])
+            pending = pending.iloc[open_start:].reset_index(drop=True)
+
+    if pending is not None and len(pending):
+        flush(pending)
+    checkpoint["done"] = True
+    save_checkpoint(out_dir, checkpoint)
+    checkpoint["seconds"] = round(time.perf_counter() - started, 3)
+    return checkpoint
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0].startswith("--"):
+        print("Usage: python feature_pipeline.py <out_dir> [--window N] [--chunk-rows N] "
+              "[--format parquet|csv] [--restart]")
+        sys.exit(1)
+
+    flags = [a for a in argv[1:] if a == "--restart"]
+    options = dict(zip(*[iter([a for a in argv[1:] if a not in flags])] * 2))
+    try:
+        checkpoint = run_pipeline(
+            get_engine(),
+            argv[0],
+            window=int(options.get("--window", DEFAULT_WINDOW)),
+            chunk_rows=int(options.get("--chunk-rows", DEFAULT_CHUNK_ROWS)),
+            fmt=options.get("--format", DEFAULT_FORMAT),
+            restart=bool(flags),
+        )
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"✅ {checkpoint['rows']} rows from {checkpoint['histories']} histories in "
+          f"{checkpoint['parts']} part(s) under {argv[0]}")
+
+
+if __name__ == "__main__":
+    main()
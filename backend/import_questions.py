@@ -0,0 +1,25 @@
+# import_questions.py
+# Usage: python import_questions.py <quiz_id> <file.ndjson|file.csv> [batch_size]
+import json
+import sys
+
+from server import app, Quiz, import_questions, iter_import_rows, IMPORT_BATCH_SIZE
+
+if len(sys.argv) < 3:
+    print("Usage: python import_questions.py <quiz_id> <file.ndjson|file.csv> [batch_size]")
+    sys.exit(1)
+
+quiz_id = int(sys.argv[1])
+path = sys.argv[2]
+batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else IMPORT_BATCH_SIZE
+fmt = "csv" if path.lower().endswith(".csv") else "ndjson"
+
+with app.app_context():
+    if not Quiz.query.get(quiz_id):
+        print(f"Quiz {quiz_id} not found")
+        sys.exit(1)
+
+    with open(path, "rb") as f:
+        report = import_questions(quiz_id, iter_import_rows(f, fmt), batch_size)
+
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,376 @@
+# migrations.py
+# Versioned, idempotent schema migrations.
+#
+# Usage:
+#   python migrations.py             apply every pending migration
+#   python migrations.py --status    list migrations and whether they are applied
+#
+# Runs against DATABASE_URL with plain SQLAlchemy, so it does not import server.py
+# (no Flask app, no caches, no background threads). Every migration checks the live
+# schema before changing it, so it is safe on databases that were created with
+# db.create_all() or partially patched by the old database_scripts.py.
+# Base tables must exist already (python init_db.py on a brand new database).
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from dotenv import load_dotenv
+from sqlalchemy import (
+    JSON, Boolean, Column, Date, DateTime, Float, Integer, MetaData, String, Table,
+    create_engine, inspect, text,
+)
+
+load_dotenv(Path(__file__).with_name(".env"))
+
+metadata = MetaData()
+
+schema_version = Table(
+    "schema_version", metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# Tables introduced after the original schema, as they looked when introduced.
+user_quiz_stats = Table(
+    "user_quiz_stats", metadata,
+    Column("user_id", Integer, primary_key=True),
+    Column("quiz_id", Integer, primary_key=True),
+    Column("attempts", Integer, nullable=False, default=0),
+    Column("percentage_sum", Float, nullable=False, default=0.0),
+    Column("percentage_count", Integer, nullable=False, default=0),
+    Column("best_percentage", Float, nullable=True),
+    Column("latest_percentage", Float, nullable=True),
+    Column("latest_timestamp", DateTime, nullable=True),
+    Column("latest_attempt_id", Integer, nullable=True),
+    Column("total_correct", Integer, nullable=False, default=0),
+    Column("total_questions", Integer, nullable=False, default=0),
+)
+
+user_quiz_model = Table(
+    "user_quiz_model", metadata,
+    Column("user_id", Integer, primary_key=True),
+    Column("quiz_id", Integer, primary_key=True),
+    Column("attempts", Integer, nullable=False, default=0),
+    Column("moments", JSON, nullable=True),
+    Column("percentage_sum", Float, nullable=False, default=0.0),
+    Column("percentage_sq_sum", Float, nullable=False, default=0.0),
+    Column("best_percentage", Float, nullable=True),
+    Column("last_percentage", Float, nullable=True),
+    Column("prev_percentage", Float, nullable=True),
+    Column("last_difficulty", String(50), nullable=True),
+    Column("last_total_questions", Integer, nullable=True),
+    Column("last_timestamp", DateTime, nullable=True),
+    Column("last_attempt_id", Integer, nullable=True),
+    Column("streak_days", Integer, nullable=False, default=0),
+    Column("streak_last_date", Date, nullable=True),
+)
+
+user_activity = Table(
+    "user_activity", metadata,
+    Column("user_id", Integer, primary_key=True),
+    Column("first_active_date", Date, nullable=True),
+    Column("last_active_date", Date, nullable=True),
+    Column("current_streak", Integer, nullable=False, default=0),
+    Column("longest_streak", Integer, nullable=False, default=0),
+    Column("active_days", Integer, nullable=False, default=0),
+    Column("total_attempts", Integer, nullable=False, default=0),
+)
+
+user_activity_day = Table(
+    "user_activity_day", metadata,
+    Column("user_id", Integer, primary_key=True),
+    Column("day", Date, primary_key=True),
+    Column("attempts", Integer, nullable=False, default=0),
+)
+
+weekly_leaderboard_stats = Table(
+    "weekly_leaderboard_stats", metadata,
+    Column("week_start", Date, primary_key=True),
+    Column("user_id", Integer, primary_key=True),
+    Column("weighted_points_sum", Float, nullable=False, default=0.0),
+    Column("weight_sum", Float, nullable=False, default=0.0),
+    Column("time_ratio_sum", Float, nullable=False, default=0.0),
+    Column("time_ratio_count", Integer, nullable=False, default=0),
+    Column("attempts_count", Integer, nullable=False, default=0),
+    Column("has_medium_or_hard", Boolean, nullable=False, default=False),
+)
+
+quiz_purge_job = Table(
+    "quiz_purge_job", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("quiz_id", Integer, nullable=False, index=True),
+    Column("status", String(20), nullable=False, default="queued"),
+    Column("attempts_deleted", Integer, nullable=False, default=0),
+    Column("questions_deleted", Integer, nullable=False, default=0),
+    Column("error", String(1000), nullable=True),
+    Column("created_at", DateTime, nullable=True),
+    Column("finished_at", DateTime, nullable=True),
+)
+
+
+# -------------------------
+# Helpers
+# -------------------------
+def columns_of(conn, table):
+    return [c["name"] for c in inspect(conn).get_columns(table)]
+
+
+def add_column(conn, table, column, ddl):
+    if column in columns_of(conn, table):
+        print(f"  '{table}.{column}' already exists. Skipping.")
+        return
+    conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl}'))
+    print(f"  '{table}.{column}' added.")
+
+
+def drop_column(conn, table, column):
+    if column not in columns_of(conn, table):
+        print(f"  '{table}.{column}' does not exist. Skipping.")
+        return
+    conn.execute(text(f'ALTER TABLE "{table}" DROP COLUMN {column}'))
+    print(f"  '{table}.{column}' dropped.")
+
+
+def index_names(conn, table):
+    return {ix["name"] for ix in inspect(conn).get_indexes(table)}
+
+
+def create_index(conn, name, table, columns, unique=False):
+    """
+    CREATE INDEX CONCURRENTLY on PostgreSQL (conn must be in autocommit mode),
+    a plain CREATE INDEX IF NOT EXISTS elsewhere.
+    """
+    unique_sql = "UNIQUE " if unique else ""
+    column_sql = ", ".join(columns)
+
+    if conn.dialect.name == "postgresql":
+        # a failed CONCURRENTLY build leaves an INVALID index behind; rebuild it
+        invalid = conn.execute(text(
+            "SELECT NOT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name"
+        ), {"name": name}).scalar()
+        if invalid is False:
+            print(f"  index '{name}' already exists. Skipping.")
+            return
+        if invalid:
+            conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"'))
+        conn.execute(text(f'CREATE {unique_sql}INDEX CONCURRENTLY "{name}" ON "{table}" ({column_sql})'))
+    else:
+        if name in index_names(conn, table):
+            print(f"  index '{name}' already exists. Skipping.")
+            return
+        conn.execute(text(f'CREATE {unique_sql}INDEX IF NOT EXISTS "{name}" ON "{table}" ({column_sql})'))
+    print(f"  index '{name}' created.")
+
+
+# -------------------------
+# Migrations
+# -------------------------
+def m001_legacy_columns(conn):
+    """Everything database_scripts.py used to do, collapsed to its end state."""
+    drop_column(conn, "quiz", "difficulty")
+    add_column(conn, "question", "difficulty", "VARCHAR(50) DEFAULT 'Medium' NOT NULL")
+    add_column(conn, "quiz_attempt", "question_order", "TEXT")
+    add_column(conn, "quiz_attempt", "status", "VARCHAR(20) DEFAULT 'in_progress' NOT NULL")
+    add_column(conn, "quiz_attempt", "difficulty", "VARCHAR(50) NOT NULL DEFAULT 'Easy'")
+    add_column(conn, "user", "google_sub", "VARCHAR(255)")
+    # OTP login was added and later removed again
+    for column in ("is_verified", "otp_hash", "otp_expires_at", "otp_sent_at"):
+        drop_column(conn, "user", column)
+
+
+def m002_question_options_jsonb(conn):
+    if conn.dialect.name != "postgresql":
+        print("  SQLite keeps JSON as TEXT; nothing to convert.")
+        return
+    options_type = next(c["type"] for c in inspect(conn).get_columns("question") if c["name"] == "options")
+    if options_type.__class__.__name__.upper() == "JSONB":
+        print("  'question.options' is already JSONB. Skipping.")
+        return
+    conn.execute(text("ALTER TABLE question ALTER COLUMN options TYPE JSONB USING options::jsonb"))
+    print("  'question.options' converted to JSONB.")
+
+
+def m003_attempt_answer_key(conn):
+    add_column(conn, "quiz_attempt", "answer_key", "JSON")
+
+
+def m004_quiz_purge(conn):
+    add_column(conn, "quiz", "is_hidden", "BOOLEAN NOT NULL DEFAULT FALSE")
+    quiz_purge_job.create(conn, checkfirst=True)
+
+
+def m005_user_quiz_stats(conn):
+    if inspect(conn).has_table("user_quiz_stats"):
+        print("  'user_quiz_stats' already exists. Skipping.")
+        return
+    user_quiz_stats.create(conn)
+
+    def latest(column):
+        return (
+            f"(SELECT l.{column} FROM quiz_attempt l "
+            "WHERE l.user_id = a.user_id AND l.quiz_id = a.quiz_id "
+            "AND l.status = 'submitted' AND l.percentage IS NOT NULL "
+            "ORDER BY l.timestamp DESC, l.id DESC LIMIT 1)"
+        )
+
+    result = conn.execute(text(
+        "INSERT INTO user_quiz_stats (user_id, quiz_id, attempts, percentage_sum, percentage_count, "
+        "best_percentage, latest_percentage, latest_timestamp, latest_attempt_id, total_correct, total_questions) "
+        "SELECT a.user_id, a.quiz_id, COUNT(a.id), COALESCE(SUM(a.percentage), 0), COUNT(a.percentage), "
+        f"MAX(a.percentage), {latest('percentage')}, {latest('timestamp')}, {latest('id')}, "
+        "COALESCE(SUM(a.score), 0), COALESCE(SUM(a.total_questions), 0) "
+        "FROM quiz_attempt a WHERE a.status = 'submitted' GROUP BY a.user_id, a.quiz_id"
+    ))
+    print(f"  'user_quiz_stats' created and backfilled ({result.rowcount} rows).")
+
+
+def m006_attempt_idempotency_key(conn):
+    add_column(conn, "quiz_attempt", "idempotency_key", "VARCHAR(100)")
+    create_index(conn, "ux_quiz_attempt_user_idempotency", "quiz_attempt", ["user_id", "idempotency_key"], unique=True)
+
+
+def m007_hot_path_indexes(conn):
+    create_index(conn, "ix_quiz_attempt_user_quiz_status_ts", "quiz_attempt",
+                 ["user_id", "quiz_id", "status", "timestamp"])
+    create_index(conn, "ix_question_quiz_id_difficulty", "question", ["quiz_id", "difficulty"])
+
+    # google_sub is declared unique, which already gives tables built by create_all an index
+    inspector = inspect(conn)
+    covered = any(
+        (ix.get("column_names") or [None])[0] == "google_sub" for ix in inspector.get_indexes("user")
+    ) or any(
+        (uc.get("column_names") or [None])[0] == "google_sub" for uc in inspector.get_unique_constraints("user")
+    )
+    if covered:
+        print("  'user.google_sub' is already indexed. Skipping.")
+    else:
+        create_index(conn, "ix_user_google_sub", "user", ["google_sub"])
+
+
+def m008_user_quiz_model(conn):
+    if inspect(conn).has_table("user_quiz_model"):
+        print("  'user_quiz_model' already exists. Skipping.")
+        return
+    user_quiz_model.create(conn)
+    # the fit itself lives in predictor.py; rows missing here are rebuilt from
+    # history on the next submit, so backfilling is optional
+    print("  'user_quiz_model' created. Run 'python rebuild_rollups.py' to backfill it.")
+
+
+def m009_user_activity(conn):
+    for table in (user_activity, user_activity_day):
+        if inspect(conn).has_table(table.name):
+            print(f"  '{table.name}' already exists. Skipping.")
+            continue
+        table.create(conn)
+        print(f"  '{table.name}' created.")
+    # a user's rows are built from history on their next submit
+    print("  Run 'python rebuild_rollups.py' to backfill activity for everyone now.")
+
+
+def m010_weekly_leaderboard_stats(conn):
+    if inspect(conn).has_table("weekly_leaderboard_stats"):
+        print("  'weekly_leaderboard_stats' already exists. Skipping.")
+        return
+    weekly_leaderboard_stats.create(conn)
+    # the endpoint only reads these rows, so this week's must be backfilled
+    print("  'weekly_leaderboard_stats' created. Run 'python rebuild_rollups.py' to backfill it.")
+
+
+def m011_quiz_purge_heartbeat(conn):
+    add_column(conn, "quiz_purge_job", "heartbeat_at", "TIMESTAMP")
+
+
+def m012_quiz_question_revision(conn):
+    add_column(conn, "quiz", "question_revision", "INTEGER NOT NULL DEFAULT 0")
+
+
+# (version, description, function, transactional)
+# Non-transactional migrations run in autocommit mode so PostgreSQL can build
+# indexes CONCURRENTLY; they must stay idempotent because a crash can leave them
+# half applied.
+MIGRATIONS = [
+    (1, "legacy columns from database_scripts.py", m001_legacy_columns, True),
+    (2, "question.options as JSONB", m002_question_options_jsonb, True),
+    (3, "quiz_attempt.answer_key", m003_attempt_answer_key, True),
+    (4, "quiz.is_hidden and quiz_purge_job", m004_quiz_purge, True),
+    (5, "user_quiz_stats rollup", m005_user_quiz_stats, True),
+    (6, "quiz_attempt.idempotency_key", m006_attempt_idempotency_key, False),
+    (7, "hot-path indexes", m007_hot_path_indexes, False),
+    (8, "user_quiz_model prediction state", m008_user_quiz_model, True),
+    (9, "user_activity streaks and calendar", m009_user_activity, True),
+    (10, "weekly_leaderboard_stats rollup", m010_weekly_leaderboard_stats, True),
+    (11, "quiz_purge_job.heartbeat_at", m011_quiz_purge_heartbeat, True),
+    (12, "quiz.question_revision", m012_quiz_question_revision, True),
+]
+
+
+# -------------------------
+# Runner
+# -------------------------
+def get_engine():
+    url = os.environ.get("DATABASE_URL")
+    if not url:
+        print("DATABASE_URL is not set (see backend/.env).")
+        sys.exit(1)
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    return create_engine(url)
+
+
+def applied_versions(engine):
+    with engine.begin() as conn:
+        schema_version.create(conn, checkfirst=True)
+        return {row.version for row in conn.execute(schema_version.select())}
+
+
+def run_migrations(engine):
+    with engine.connect() as conn:
+        missing = [t for t in ("user", "quiz", "question", "quiz_attempt") if not inspect(conn).has_table(t)]
+    if missing:
+        print(f"Base tables missing ({', '.join(missing)}). Run 'python init_db.py' first.")
+        sys.exit(1)
+
+    done = applied_versions(engine)
+    pending = [m for m in MIGRATIONS if m[0] not in done]
+    if not pending:
+        print("✅ Schema is up to date.")
+        return
+
+    for version, description, migrate, transactional in pending:
+        print(f"Applying {version:03d}: {description}...")
+        if transactional:
+            with engine.begin() as conn:
+                migrate(conn)
+                conn.execute(schema_version.insert().values(
+                    version=version, description=description, applied_at=datetime.utcnow()
+                ))
+        else:
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                migrate(conn)
+                conn.execute(schema_version.insert().values(
+                    version=version, description=description, applied_at=datetime.utcnow()
+                ))
+    print(f"✅ Applied {len(pending)} migration(s).")
+
+
+def print_status(engine):
+    done = applied_versions(engine)
+    for version, description, _, _ in MIGRATIONS:
+        print(f"{'[x]' if version in done else '[ ]'} {version:03d} {description}")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    engine = get_engine()
+    if "--status" in argv:
+        print_status(engine)
+    else:
+        run_migrations(engine)
+
+
+if __name__ == "__main__":
+    main()
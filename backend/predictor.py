@@ -0,0 +1,168 @@
+# predictor.py
+# Score-prediction math behind /predict, kept free of Flask and the database so
+# scripts can reuse it.
+#
+# /predict fits  percentage ~ b0 + b1 * attempt_index + b2 * difficulty  by least
+# squares, weighting attempts linearly from 0.6 (oldest) to 1.0 (newest). The
+# weights depend on n, but they are linear in the index i (w_i = a + b*i), so
+#
+#     X^T W^2 X = a^2 S0 + 2ab S1 + b^2 S2,   S_k = sum_i i^k x_i x_i^T
+#     X^T W^2 y = a^2 T0 + 2ab T1 + b^2 T2,   T_k = sum_i i^k x_i y_i
+#
+# Keeping S_k and T_k per (user, quiz) lets a new attempt be folded in with O(1)
+# work, and the fit for any n is a 3x3 solve.
+#
+# The prediction and confidence rules below take scalars or arrays, so
+# backtest.py can score many users at once with exactly what /predict serves.
+import numpy as np
+
+DIFFICULTY_LEVELS = {"Very Easy": 1, "Easy": 2, "Medium": 3, "Hard": 4}
+
+WEIGHT_OLDEST = 0.6
+WEIGHT_NEWEST = 1.0
+
+# /predict answers with a fitted prediction from this many submitted attempts on.
+PREDICTION_ATTEMPTS_REQUIRED = 2
+
+# Below this many attempts /predict blends the last two scores instead of trusting
+# the fit (prevents crazy 0%/100% swings with only a few attempts).
+SMALL_HISTORY_ATTEMPTS = 5
+SMALL_HISTORY_WEIGHTS = (0.7, 0.3)  # last, previous
+
+# Relative singular-value cutoff for the 3x3 normal equations. Users who always
+# pick the same difficulty make [1, index, difficulty] rank 2; cutting that
+# direction gives the same minimum-norm answer as lstsq on the full history.
+SOLVE_RCOND = 1e-13
+
+
+def difficulty_to_num(d):
+    if not d:
+        return 3  # default Medium
+    d = d.strip().title()
+    return DIFFICULTY_LEVELS.get(d, 3)
+
+
+def empty_moments():
+    return {"S": np.zeros((3, 3, 3)), "T": np.zeros((3, 3))}
+
+
+def add_observation(moments, index, difficulty_num, percentage):
+    """Fold the attempt at 1-based position `index` into the moments (in place)."""
+    x = np.array([1.0, float(index), float(difficulty_num)])
+    powers = float(index) ** np.arange(3)
+    moments["S"] += powers[:, None, None] * np.outer(x, x)
+    moments["T"] += powers[:, None] * (x * float(percentage))
+    return moments
+
+
+def moments_from_history(percentages, difficulty_nums):
+    """The same moments computed in one pass over an ordered history."""
+    y = np.asarray(percentages, dtype=float)
+    d = np.asarray(difficulty_nums, dtype=float)
+    index = np.arange(1, len(y) + 1, dtype=float)
+    X = np.column_stack([np.ones_like(index), index, d])
+    powers = index[:, None] ** np.arange(3)
+    return {
+        "S": np.einsum("nk,nr,nc->krc", powers, X, X),
+        "T": np.einsum("nk,nr,n->kr", powers, X, y),
+    }
+
+
+def moments_to_json(moments):
+    return {"S": moments["S"].tolist(), "T": moments["T"].tolist()}
+
+
+def moments_from_json(data):
+    if not data:
+        return empty_moments()
+    return {"S": np.array(data["S"], dtype=float), "T": np.array(data["T"], dtype=float)}
+
+
+def weight_coefficients(n):
+    """(a^2, 2ab, b^2) for w_i = a + b*i, i.e. np.linspace(WEIGHT_OLDEST, WEIGHT_NEWEST, n)."""
+    n = np.asarray(n, dtype=float)
+    b = (WEIGHT_NEWEST - WEIGHT_OLDEST) / np.maximum(n - 1, 1)
+    a = WEIGHT_OLDEST - b
+    return np.stack([a * a, 2 * a * b, b * b], axis=-1)
+
+
+def stack_moments(moments_list):
+    """Stack several moment sets so fit_from_moments can solve them in one pass."""
+    return {
+        "S": np.stack([m["S"] for m in moments_list]),
+        "T": np.stack([m["T"] for m in moments_list]),
+    }
+
+
+def fit_from_moments(moments, n):
+    """
+    Coefficients [b0, b1, b2] of the weighted fit over the first n attempts.
+    Works on a single moment set or a stack of them (with n an array), solving
+    every 3x3 system in one batched pseudo-inverse.
+    """
+    c = weight_coefficients(n)
+    A = np.einsum("...k,...krc->...rc", c, moments["S"])
+    rhs = np.einsum("...k,...kr->...r", c, moments["T"])
+    return np.einsum("...ij,...j->...i", np.linalg.pinv(A, rcond=SOLVE_RCOND), rhs)
+
+
+def fit_weighted_history(percentages, difficulty_nums):
+    """Reference fit straight from the history, used to verify the moment path."""
+    y = np.asarray(percentages, dtype=float)
+    x1 = np.arange(1, len(y) + 1, dtype=float)
+    X = np.column_stack([np.ones_like(x1), x1, np.asarray(difficulty_nums, dtype=float)])
+    w = np.linspace(WEIGHT_OLDEST, WEIGHT_NEWEST, len(y))
+    beta, *_ = np.linalg.lstsq(w[:, None] * X, w * y, rcond=None)
+    return beta
+
+
+def predict_next_percentage(beta, n, last_difficulty_num, last_percentage, prev_percentage,
+                            small_history=SMALL_HISTORY_ATTEMPTS):
+    """
+    Predicted percentage for attempt n+1 at the last attempt's difficulty, clamped
+    to [0, 100]. With fewer than `small_history` attempts it blends the last two
+    scores instead. Broadcasts over stacked betas and array arguments.
+    """
+    beta = np.asarray(beta, dtype=float)
+    n = np.asarray(n)
+    fitted = beta[..., 0] + beta[..., 1] * (n + 1.0) + beta[..., 2] * last_difficulty_num
+    w_last, w_prev = SMALL_HISTORY_WEIGHTS
+    blended = w_last * np.asarray(last_percentage, dtype=float) + w_prev * np.asarray(prev_percentage, dtype=float)
+    return np.clip(np.where(n < small_history, blended, fitted), 0.0, 100.0)
+
+
+def confidence_score(attempt_count, std):
+    """Confidence in [0.10, 0.95] from the attempt count and the population std (array-friendly)."""
+    n = np.asarray(attempt_count)
+    # base increases with attempts (caps at 0.85)
+    base = np.minimum(0.85, 0.35 + 0.10 * n)
+    # penalty increases with instability (caps at 0.5)
+    penalty = np.minimum(0.50, np.asarray(std, dtype=float) / 30.0)
+    score = np.clip(base - penalty, 0.10, 0.95)
+    return np.where(n < 2, 0.2, score)
+
+
+def confidence_label(score):
+    return np.select([np.asarray(score) >= 0.75, np.asarray(score) >= 0.45], ["High", "Medium"], "Low")
+
+
+def confidence_level(attempt_count: int, std: float):
+    """
+    Returns a confidence label/score based on number of attempts + variability
+    (population std of the percentages).
+    """
+    if attempt_count < 2:
+        return {"label": "Low", "score": 0.2, "reason": "Need at least 2 attempts"}
+
+    score = float(confidence_score(attempt_count, std))
+    reason = f"{attempt_count} attempts, variability (std) ≈ {round(std, 2)}"
+    return {"label": str(confidence_label(score)), "score": round(score, 2), "reason": reason}
+
+
+def regression_metrics(y_true, y_pred):
+    y_true = np.array(y_true, dtype=float)
+    y_pred = np.array(y_pred, dtype=float)
+    mse = np.mean((y_true - y_pred) ** 2)
+    rmse = np.sqrt(mse)
+    mae = np.mean(np.abs(y_true - y_pred))
+    return {"mse": round(float(mse), 4), "rmse": round(float(rmse), 4), "mae": round(float(mae), 4)}
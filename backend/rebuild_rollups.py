@@ -0,0 +1,189 @@
+# rebuild_rollups.py
+# Usage: python rebuild_rollups.py [--check] [user_id]
+#   rebuilds the submit-time rollups from quiz_attempt, or with --check only
+#   compares them against a fresh SQL aggregate and reports mismatches.
+import sys
+from collections import defaultdict
+
+import numpy as np
+
+from predictor import difficulty_to_num, fit_from_moments, fit_weighted_history, moments_from_history, moments_from_json
+from server import (
+    app, db, QuizAttempt, UserQuizStats, UserQuizModel, aggregate_user_quiz_stats, rebuild_user_quiz_stats,
+    MODEL_STATE_FIELDS, build_user_quiz_model, model_history_query, rebuild_user_quiz_models,
+    UserActivity, UserActivityDay, ACTIVITY_FIELDS, activity_days_query, fold_activity_days, rebuild_user_activity,
+    WeeklyLeaderboardStats, aggregate_weekly_leaderboard, rebuild_weekly_leaderboard,
+)
+
+def same_value(stored, expected):
+    if isinstance(stored, float) and isinstance(expected, float):
+        return abs(stored - expected) < 1e-6
+    return stored == expected
+
+
+def check_user_quiz_stats(user_id=None):
+    mismatches = 0
+    expected = {(r["user_id"], r["quiz_id"]): r for r in aggregate_user_quiz_stats(user_id)}
+    query = UserQuizStats.query
+    if user_id is not None:
+        query = query.filter_by(user_id=user_id)
+    actual = {(r.user_id, r.quiz_id): r for r in query.all()}
+
+    for key in set(expected) | set(actual):
+        exp, act = expected.get(key), actual.get(key)
+        if exp is None or act is None:
+            print(f"user_quiz_stats {key}: {'missing' if act is None else 'unexpected'} row")
+            mismatches += 1
+            continue
+        for field, value in exp.items():
+            stored = getattr(act, field)
+            if not same_value(stored, value):
+                print(f"user_quiz_stats {key}: {field} stored={stored!r} expected={value!r}")
+                mismatches += 1
+    return mismatches
+
+
+def check_user_quiz_models(user_id=None):
+    """
+    Compare each stored model state with one folded from the full history, and the
+    prediction solved from its moments with a direct weighted lstsq over the history.
+    """
+    mismatches = 0
+    query = UserQuizModel.query
+    if user_id is not None:
+        query = query.filter_by(user_id=user_id)
+    actual = {(r.user_id, r.quiz_id): r for r in query.all()}
+    pairs = model_history_query(user_id).with_entities(QuizAttempt.user_id, QuizAttempt.quiz_id).order_by(None).distinct()
+    expected_keys = {(r.user_id, r.quiz_id) for r in pairs}
+
+    for key in expected_keys | set(actual):
+        act = actual.get(key)
+        if act is None or key not in expected_keys:
+            print(f"user_quiz_model {key}: {'missing' if act is None else 'unexpected'} row")
+            mismatches += 1
+            continue
+
+        exp = build_user_quiz_model(*key)
+        for field in MODEL_STATE_FIELDS:
+            if field == "moments":
+                continue
+            stored, value = getattr(act, field), getattr(exp, field)
+            if not same_value(stored, value):
+                print(f"user_quiz_model {key}: {field} stored={stored!r} expected={value!r}")
+                mismatches += 1
+
+        history = model_history_query(*key).with_entities(QuizAttempt.percentage, QuizAttempt.difficulty).all()
+        y = [r.percentage for r in history]
+        d = [difficulty_to_num(r.difficulty) for r in history]
+        stored_moments = moments_from_json(act.moments)
+        expected_moments = moments_from_history(y, d)
+        if not all(np.allclose(stored_moments[m], expected_moments[m], rtol=1e-9, atol=1e-6) for m in ("S", "T")):
+            print(f"user_quiz_model {key}: moments differ from history")
+            mismatches += 1
+        elif len(y) >= 2:
+            x_next = np.array([1.0, len(y) + 1, d[-1]])
+            stored_pred = x_next @ fit_from_moments(stored_moments, act.attempts)
+            direct_pred = x_next @ fit_weighted_history(y, d)
+            if abs(stored_pred - direct_pred) > 1e-6 * max(1.0, abs(direct_pred)):
+                print(f"user_quiz_model {key}: prediction {stored_pred!r} vs direct lstsq {direct_pred!r}")
+                mismatches += 1
+    return mismatches
+
+
+def check_user_activity(user_id=None):
+    """Compare user_activity_day with a per-day SQL count, and user_activity with streaks folded from it."""
+    mismatches = 0
+    user_ids = [user_id] if user_id is not None else None
+    expected_days = defaultdict(list)
+    for uid, day, attempts in activity_days_query(user_ids).all():
+        expected_days[uid].append((day, attempts))
+
+    day_query = UserActivityDay.query
+    activity_query = UserActivity.query
+    if user_id is not None:
+        day_query = day_query.filter_by(user_id=user_id)
+        activity_query = activity_query.filter_by(user_id=user_id)
+    actual_days = defaultdict(list)
+    for row in day_query.order_by(UserActivityDay.user_id, UserActivityDay.day).all():
+        actual_days[row.user_id].append((row.day, row.attempts))
+    actual = {r.user_id: r for r in activity_query.all()}
+
+    for uid in set(expected_days) | set(actual):
+        act = actual.get(uid)
+        if act is None or uid not in expected_days:
+            print(f"user_activity {uid}: {'missing' if act is None else 'unexpected'} row")
+            mismatches += 1
+            continue
+        if actual_days[uid] != expected_days[uid]:
+            print(f"user_activity_day {uid}: calendar differs from quiz_attempt")
+            mismatches += 1
+        exp = fold_activity_days(uid, expected_days[uid])
+        for field in ACTIVITY_FIELDS:
+            stored, value = getattr(act, field), getattr(exp, field)
+            if stored != value:
+                print(f"user_activity {uid}: {field} stored={stored!r} expected={value!r}")
+                mismatches += 1
+    return mismatches
+
+
+def check_weekly_leaderboard(user_id=None):
+    mismatches = 0
+    user_ids = [user_id] if user_id is not None else None
+    expected = aggregate_weekly_leaderboard(user_ids=user_ids)
+    query = WeeklyLeaderboardStats.query
+    if user_id is not None:
+        query = query.filter_by(user_id=user_id)
+    actual = {(r.week_start, r.user_id): r for r in query.all()}
+
+    for key in set(expected) | set(actual):
+        exp, act = expected.get(key), actual.get(key)
+        if exp is None or act is None:
+            print(f"weekly_leaderboard_stats {key}: {'missing' if act is None else 'unexpected'} row")
+            mismatches += 1
+            continue
+        for field, value in exp.items():
+            stored = getattr(act, field)
+            if not same_value(stored, value):
+                print(f"weekly_leaderboard_stats {key}: {field} stored={stored!r} expected={value!r}")
+                mismatches += 1
+    return mismatches
+
+
+def check_rollups(user_id=None):
+    """Compare every rollup with quiz_attempt and return the number of mismatches."""
+    return (
+        check_user_quiz_stats(user_id) + check_user_quiz_models(user_id)
+        + check_user_activity(user_id) + check_weekly_leaderboard(user_id)
+    )
+
+
+def rebuild_rollups(user_id=None):
+    count = rebuild_user_quiz_stats(user_id)
+    db.session.commit()
+    print(f"user_quiz_stats rebuilt: {count} rows.")
+    count = rebuild_user_quiz_models(user_id)
+    db.session.commit()
+    print(f"user_quiz_model rebuilt: {count} rows.")
+    count = rebuild_user_activity([user_id] if user_id is not None else None)
+    db.session.commit()
+    print(f"user_activity rebuilt: {count} users.")
+    count = rebuild_weekly_leaderboard(user_ids=[user_id] if user_id is not None else None)
+    db.session.commit()
+    print(f"weekly_leaderboard_stats rebuilt: {count} rows.")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = [a for a in argv if not a.startswith("--")]
+    user_id = int(args[0]) if args else None
+
+    with app.app_context():
+        if "--check" in argv:
+            mismatches = check_rollups(user_id)
+            print("✅ Rollups match." if not mismatches else f"❌ {mismatches} mismatches.")
+            sys.exit(1 if mismatches else 0)
+        rebuild_rollups(user_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,18 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
-from sqlalchemy import not_
+from sqlalchemy import not_, and_, or_, func, insert, update, case, event, text, inspect as sa_inspect
+from sqlalchemy.orm import defer
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.dialects.postgresql import JSONB
 from math import isfinite
 import jwt
 import json
 import os
 from functools import wraps
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 import re
 import dns.resolver
 import numpy as np
@@ -18,12 +21,29 @@ import random
 import uuid
 import pandas as pd
 import csv
+import io
 import secrets
 import requests
+import hashlib
+import base64
+import threading
+import time
+import queue
+import atexit
 from dotenv import load_dotenv
 from pathlib import Path
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
+from types import SimpleNamespace
+from cachetools import TTLCache
+from predictor import (
+    difficulty_to_num, empty_moments, add_observation, moments_to_json, moments_from_json, fit_from_moments,
+    stack_moments, predict_next_percentage, confidence_level, regression_metrics, PREDICTION_ATTEMPTS_REQUIRED,
+)
+from synthetic import SYNTHETIC_PATTERNS, DEFAULT_PARAMS as DEFAULT_SYNTHETIC_PARAMS, write_synthetic_dataset
+
+try:
+    import fcntl  # journal locking; not available on Windows
+except ImportError:
+    fcntl = None
 
 
 
@@ -82,16 +102,24 @@ class Quiz(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.String(400), nullable=True)
+    # set on DELETE; the row goes away once the background purge finishes
+    is_hidden = db.Column(db.Boolean, nullable=False, default=False)
+    # bumped by every question write; part of the question pool version
+    question_revision = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
 
 class Question(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     quiz_id = db.Column(db.Integer, db.ForeignKey("quiz.id"), nullable=False)
     question = db.Column(db.String(1000), nullable=False)
-    options = db.Column(db.Text, nullable=False)  # JSON encoded list
+    options = db.Column(db.JSON().with_variant(JSONB, "postgresql"), nullable=False)  # list of option strings
     correct_answer = db.Column(db.Integer, nullable=False)
     difficulty = db.Column(db.String(50), nullable=False, default="Medium")
 
+    # start_quiz samples by (quiz_id, difficulty)
+    __table_args__ = (
+        db.Index("ix_question_quiz_id_difficulty", "quiz_id", "difficulty"),
+    )
 
 
 class QuizAttempt(db.Model):
@@ -109,12 +137,240 @@ class QuizAttempt(db.Model):
     # Stores per-question review details (selected vs correct for each)
     answers_detail = db.Column(db.JSON, nullable=True)
     difficulty=db.Column(db.String(50),nullable=True)
+    # Correct option index per question_order slot, fixed when the attempt starts
+    answer_key = db.Column(db.JSON, nullable=True)
+    # Client-chosen key so retried POST /results(/batch) calls don't duplicate attempts
+    idempotency_key = db.Column(db.String(100), nullable=True)
+
+    __table_args__ = (
+        db.Index("ux_quiz_attempt_user_idempotency", "user_id", "idempotency_key", unique=True),
+        db.Index("ix_quiz_attempt_user_quiz_status_ts", "user_id", "quiz_id", "status", "timestamp"),
+    )
+
+
+class UserQuizStats(db.Model):
+    """Per-(user, quiz) rollup of submitted attempts, maintained at submit time."""
+    __tablename__ = "user_quiz_stats"
+    user_id = db.Column(db.Integer, primary_key=True)
+    quiz_id = db.Column(db.Integer, primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    percentage_sum = db.Column(db.Float, nullable=False, default=0.0)
+    percentage_count = db.Column(db.Integer, nullable=False, default=0)
+    best_percentage = db.Column(db.Float, nullable=True)
+    latest_percentage = db.Column(db.Float, nullable=True)
+    latest_timestamp = db.Column(db.DateTime, nullable=True)
+    latest_attempt_id = db.Column(db.Integer, nullable=True)
+    total_correct = db.Column(db.Integer, nullable=False, default=0)
+    total_questions = db.Column(db.Integer, nullable=False, default=0)
+
+
+class UserQuizModel(db.Model):
+    """Per-(user, quiz) sufficient statistics for the /predict regression, maintained at submit time."""
+    __tablename__ = "user_quiz_model"
+    user_id = db.Column(db.Integer, primary_key=True)
+    quiz_id = db.Column(db.Integer, primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    moments = db.Column(db.JSON, nullable=True)  # {"S": S0..S2, "T": T0..T2}, see predictor.py
+    percentage_sum = db.Column(db.Float, nullable=False, default=0.0)
+    percentage_sq_sum = db.Column(db.Float, nullable=False, default=0.0)
+    best_percentage = db.Column(db.Float, nullable=True)
+    last_percentage = db.Column(db.Float, nullable=True)
+    prev_percentage = db.Column(db.Float, nullable=True)
+    last_difficulty = db.Column(db.String(50), nullable=True)
+    last_total_questions = db.Column(db.Integer, nullable=True)
+    last_timestamp = db.Column(db.DateTime, nullable=True)
+    last_attempt_id = db.Column(db.Integer, nullable=True)
+    streak_days = db.Column(db.Integer, nullable=False, default=0)
+    streak_last_date = db.Column(db.Date, nullable=True)
+
+
+class UserActivity(db.Model):
+    """Per-user activity summary across all quizzes, maintained at submit time (UTC days)."""
+    __tablename__ = "user_activity"
+    user_id = db.Column(db.Integer, primary_key=True)
+    first_active_date = db.Column(db.Date, nullable=True)
+    last_active_date = db.Column(db.Date, nullable=True)
+    current_streak = db.Column(db.Integer, nullable=False, default=0)  # consecutive days ending at last_active_date
+    longest_streak = db.Column(db.Integer, nullable=False, default=0)
+    active_days = db.Column(db.Integer, nullable=False, default=0)
+    total_attempts = db.Column(db.Integer, nullable=False, default=0)
+
+
+class UserActivityDay(db.Model):
+    """Submitted attempts per user per UTC day (the activity calendar)."""
+    __tablename__ = "user_activity_day"
+    user_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+
+
+class WeeklyLeaderboardStats(db.Model):
+    """Per-(week, user) leaderboard sums over scored attempts, maintained at submit time (UTC weeks from Monday)."""
+    __tablename__ = "weekly_leaderboard_stats"
+    week_start = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+    weighted_points_sum = db.Column(db.Float, nullable=False, default=0.0)
+    weight_sum = db.Column(db.Float, nullable=False, default=0.0)
+    time_ratio_sum = db.Column(db.Float, nullable=False, default=0.0)
+    time_ratio_count = db.Column(db.Integer, nullable=False, default=0)
+    attempts_count = db.Column(db.Integer, nullable=False, default=0)
+    has_medium_or_hard = db.Column(db.Boolean, nullable=False, default=False)
+
+
+class QuizPurgeJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    quiz_id = db.Column(db.Integer, nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default="queued")  # queued, running, done, failed
+    attempts_deleted = db.Column(db.Integer, nullable=False, default=0)
+    questions_deleted = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.String(1000), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)  # bumped by the purging thread after every batch
 # -------------------------
 # Auth endpoints
 # -------------------------
 
 GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_CLIENT_ID")
 
+# -------------------------
+# Google ID-token verification
+# -------------------------
+# Google's signing keys are fetched over a pooled session and cached for the
+# Cache-Control max-age of the JWKS response, with a background refresh shortly
+# before expiry. A kid missing from the cached set triggers at most one fetch
+# per min_refetch_interval, only one thread fetches at a time, and kids still
+# missing after a fetch are rejected without a fetch for unknown_kid_ttl.
+# Point GOOGLE_JWKS_URL at a local JWKS stub to load-test offline.
+GOOGLE_JWKS_URL = os.environ.get("GOOGLE_JWKS_URL", "https://www.googleapis.com/oauth2/v3/certs")
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+
+class JwksKeySource:
+    """Caches the signing keys of a JWKS endpoint, keyed by kid."""
+
+    def __init__(self, url, default_max_age=3600, refresh_margin=300, timeout=5,
+                 min_refetch_interval=30, unknown_kid_ttl=60):
+        self.url = url
+        self.default_max_age = default_max_age
+        self.refresh_margin = refresh_margin
+        self.timeout = timeout
+        self.min_refetch_interval = min_refetch_interval
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=10)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._keys = {}
+        self._expires_at = 0.0
+        self._fetched_at = float("-inf")  # start of the last fetch, successful or not
+        self._fetches = 0
+        self._unknown_kids = TTLCache(maxsize=1024, ttl=unknown_kid_ttl)
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()  # single flight: one fetch at a time
+        self._refreshing = False
+
+    def _max_age(self, cache_control):
+        match = re.search(r"max-age=(\d+)", cache_control or "")
+        return int(match.group(1)) if match else self.default_max_age
+
+    def refresh(self):
+        with self._fetch_lock:
+            self._fetch()
+
+    def _fetch(self):
+        with self._lock:
+            self._fetched_at = time.monotonic()
+        try:
+            response = self.session.get(self.url, timeout=self.timeout)
+            response.raise_for_status()
+            keys = {
+                jwk["kid"]: jwt.PyJWK(jwk).key
+                for jwk in response.json().get("keys", [])
+                if "kid" in jwk
+            }
+            with self._lock:
+                self._keys = keys
+                self._expires_at = time.monotonic() + self._max_age(response.headers.get("Cache-Control"))
+                self._unknown_kids.clear()
+        finally:
+            with self._lock:
+                self._fetches += 1  # finished fetches, so waiters can tell one completed
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print("JWKS background refresh failed:", e)
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def get_key(self, kid):
+        now = time.monotonic()
+        with self._lock:
+            key = self._keys.get(kid)
+            expired = now >= self._expires_at
+            fetches = self._fetches
+            # an unknown kid usually means Google rotated keys, but a stream of made-up
+            # kids must not turn into a stream of fetches
+            throttled = not expired and (
+                kid in self._unknown_kids or now - self._fetched_at < self.min_refetch_interval
+            )
+            start_background = (
+                not expired and now >= self._expires_at - self.refresh_margin and not self._refreshing
+            )
+            if start_background:
+                self._refreshing = True
+
+        if start_background:
+            threading.Thread(target=self._background_refresh, daemon=True).start()
+
+        if (key is None and not throttled) or expired:
+            # with an expired key in hand, don't queue behind a fetch already in flight;
+            # without one, wait for it and reuse its result
+            if self._fetch_lock.acquire(blocking=key is None):
+                try:
+                    with self._lock:
+                        fetched_meanwhile = self._fetches != fetches
+                    if not fetched_meanwhile:
+                        self._fetch()
+                finally:
+                    self._fetch_lock.release()
+                with self._lock:
+                    key = self._keys.get(kid)
+                    if key is None and time.monotonic() < self._expires_at:
+                        self._unknown_kids[kid] = True
+        if key is None:
+            raise ValueError(f"Unknown signing key id: {kid}")
+        return key
+
+
+google_key_source = JwksKeySource(GOOGLE_JWKS_URL)
+
+
+def verify_google_id_token(token, key_source=None):
+    """Verify signature, audience, expiry and issuer; raises ValueError like google-auth does."""
+    key_source = key_source or google_key_source
+    try:
+        header = jwt.get_unverified_header(token)
+        key = key_source.get_key(header.get("kid"))
+        idinfo = jwt.decode(
+            token,
+            key,
+            algorithms=["RS256"],
+            audience=GOOGLE_CLIENT_ID,
+            options={"require": ["exp", "iat", "iss", "sub"]},
+        )
+    except jwt.PyJWTError as e:
+        raise ValueError(str(e))
+    except requests.RequestException as e:
+        raise ValueError(f"Could not fetch Google signing keys: {e}")
+
+    if idinfo.get("iss") not in GOOGLE_ISSUERS:
+        raise ValueError(f"Wrong issuer: {idinfo.get('iss')}")
+    return idinfo
+
+
 @app.route("/auth/google", methods=["POST"])
 def auth_google():
     """
@@ -135,11 +391,7 @@ def auth_google():
 
     try:
         # Verify token signature + audience + expiry
-        idinfo = id_token.verify_oauth2_token(
-            token_from_client,
-            google_requests.Request(),
-            GOOGLE_CLIENT_ID
-        )
+        idinfo = verify_google_id_token(token_from_client)
 
         # Extract user info
         email = (idinfo.get("email") or "").lower().strip()
@@ -184,7 +436,7 @@ def auth_google():
             db.session.commit()
 
     # issue your own JWT (same as your current generate_token)
-    jwt_token = generate_token(user.id, hours=12)
+    jwt_token = generate_token(user.id, hours=12, user=user)
 
     return jsonify({
         "message": "Google login successful",
@@ -196,17 +448,100 @@ def auth_google():
 # -------------------------
 # Helpers: token generation + decorator
 # -------------------------
-def generate_token(user_id, hours=12):
+# Set JWT_EMBED_CLAIMS=true to put email/role in the token so token_required can
+# skip the user lookup entirely. Role/email changes then only apply on next login.
+JWT_EMBED_CLAIMS = os.environ.get("JWT_EMBED_CLAIMS", "false").lower() in ("1", "true", "yes")
+
+def generate_token(user_id, hours=12, user=None):
+    now = datetime.utcnow()
     payload = {
         "user_id": user_id,
-        "exp": datetime.utcnow() + timedelta(hours=hours)
+        "iat": now,
+        "exp": now + timedelta(hours=hours)
     }
+    if JWT_EMBED_CLAIMS and user is not None:
+        payload["email"] = user.email
+        payload["role"] = user.role
     token = jwt.encode(payload, app.config["SECRET_KEY"], algorithm="HS256")
     # PyJWT returns bytes on some versions; ensure string
     if isinstance(token, bytes):
         token = token.decode("utf-8")
     return token
 
+
+# -------------------------
+# Authenticated principal cache
+# -------------------------
+# request.current_user only needs id/email/role, so token_required keeps those in
+# a TTL+LRU cache keyed by (user_id, iat) instead of loading User on every call.
+AUTH_CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", 10000))
+AUTH_CACHE_TTL = int(os.environ.get("AUTH_CACHE_TTL", 60))
+
+AuthPrincipal = namedtuple("AuthPrincipal", ["id", "email", "role"])
+
+_auth_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+_auth_lock = threading.Lock()
+auth_stats = {"requests": 0, "cache_hits": 0, "cache_misses": 0, "token_claims": 0, "total_seconds": 0.0}
+
+
+def invalidate_auth_principal(user_id):
+    with _auth_lock:
+        for key in [k for k in _auth_cache if k[0] == user_id]:
+            _auth_cache.pop(key, None)
+
+
+AUTH_INVALIDATE_KEY = "auth_principals_to_invalidate"
+
+
+@event.listens_for(User, "after_update")
+def _user_updated(mapper, connection, target):
+    state = sa_inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in ("email", "role", "password_hash")):
+        # dropped after commit: invalidating at flush would let a concurrent request
+        # re-cache the old row before this transaction is visible
+        state.session.info.setdefault(AUTH_INVALIDATE_KEY, set()).add(target.id)
+
+
+@event.listens_for(User, "after_delete")
+def _user_deleted(mapper, connection, target):
+    sa_inspect(target).session.info.setdefault(AUTH_INVALIDATE_KEY, set()).add(target.id)
+
+
+@event.listens_for(db.session, "after_commit")
+def _invalidate_committed_principals(session):
+    for user_id in session.info.pop(AUTH_INVALIDATE_KEY, ()):
+        invalidate_auth_principal(user_id)
+
+
+@event.listens_for(db.session, "after_transaction_end")
+def _forget_rolled_back_principals(session, transaction):
+    # after_commit has already run for a committed transaction
+    if transaction.parent is None:
+        session.info.pop(AUTH_INVALIDATE_KEY, None)
+
+
+def load_auth_principal(data):
+    """Resolve decoded token claims to an AuthPrincipal (or None if the user is gone)."""
+    if JWT_EMBED_CLAIMS and "email" in data and "role" in data:
+        source = "token_claims"
+        principal = AuthPrincipal(data["user_id"], data["email"], data["role"])
+    else:
+        key = (data["user_id"], data.get("iat"))
+        with _auth_lock:
+            principal = _auth_cache.get(key)
+        source = "cache_hits" if principal is not None else "cache_misses"
+        if principal is None:
+            user = User.query.get(data["user_id"])
+            if user is not None:
+                principal = AuthPrincipal(user.id, user.email, user.role)
+                with _auth_lock:
+                    _auth_cache[key] = principal
+
+    with _auth_lock:
+        auth_stats[source] += 1
+    return principal
+
+
 def token_required(f):
     @wraps(f)
     def wrapped(*args, **kwargs):
@@ -217,9 +552,10 @@ def token_required(f):
         if len(parts) != 2 or parts[0].lower() != "bearer":
             return jsonify({"error": "Authorization header must be: Bearer <token>"}), 401
         token = parts[1]
+        started = time.perf_counter()
         try:
             data = jwt.decode(token, app.config["SECRET_KEY"], algorithms=["HS256"])
-            user = User.query.get(data["user_id"])
+            user = load_auth_principal(data)
             if not user:
                 return jsonify({"error": "User not found"}), 401
             request.current_user = user
@@ -227,9 +563,34 @@ def token_required(f):
             return jsonify({"error": "Token expired"}), 401
         except Exception:
             return jsonify({"error": "Token is invalid!"}), 401
+        finally:
+            g.auth_seconds = time.perf_counter() - started
+            with _auth_lock:
+                auth_stats["requests"] += 1
+                auth_stats["total_seconds"] += g.auth_seconds
         return f(*args, **kwargs)
     return wrapped
 
+
+@app.after_request
+def add_server_timing(response):
+    auth_seconds = g.get("auth_seconds")
+    if auth_seconds is not None:
+        response.headers.add("Server-Timing", f"auth;dur={auth_seconds * 1000:.2f}")
+    return response
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """In-process counters for this worker."""
+    with _auth_lock:
+        auth = dict(auth_stats)
+    auth["avg_ms"] = round(auth["total_seconds"] * 1000 / auth["requests"], 3) if auth["requests"] else None
+    auth["total_seconds"] = round(auth["total_seconds"], 6)
+    with _prediction_cache_lock:
+        predictions = dict(prediction_cache_stats, size=len(_prediction_cache), maxsize=_prediction_cache.maxsize)
+    return jsonify({"auth": auth, "submissions": submission_writer.snapshot(), "predictions": predictions})
+
 # =====================================================
 # Module 1: Quiz Manager (CRUD + taking quizzes)
 # =====================================================
@@ -245,6 +606,7 @@ def create_quiz():
     quiz = Quiz(title=title, description=description)
     db.session.add(quiz)
     db.session.commit()
+    invalidate_quiz_catalog()
     return jsonify({"message": "Quiz created successfully", "quiz_id": quiz.id}), 201
 
 @app.route("/quizzes/<int:quiz_id>/questions", methods=["POST"])
@@ -254,7 +616,7 @@ def add_question(quiz_id):
     options = data.get("options")
     correct_answer = data.get("correct_answer")
     quiz = Quiz.query.get(quiz_id)
-    if not quiz:
+    if not quiz or quiz.is_hidden:
         return jsonify({"error": "Quiz not found"}), 404
     if not question_text or options is None or correct_answer is None:
         return jsonify({"error": "Missing fields"}), 400
@@ -262,9 +624,12 @@ def add_question(quiz_id):
         return jsonify({"error": "Options must be a list with at least 2 choices"}), 400
     if not (0 <= correct_answer < len(options)):
         return jsonify({"error": "correct_answer must be a valid index"}), 400
-    q = Question(quiz_id=quiz_id, question=question_text, options=json.dumps(options), correct_answer=correct_answer)
+    q = Question(quiz_id=quiz_id, question=question_text, options=options, correct_answer=correct_answer)
     db.session.add(q)
+    bump_question_revision(quiz_id)
     db.session.commit()
+    invalidate_quiz_catalog()
+    invalidate_question_pools(quiz_id)
     return jsonify({"message": "Question added successfully", "question_id": q.id}), 201
 
 
@@ -272,9 +637,12 @@ def add_question(quiz_id):
 def add_questions_bulk(quiz_id):
     data = request.get_json()
     quiz = Quiz.query.get(quiz_id)
-    if not quiz:
+    if not quiz or quiz.is_hidden:
         return jsonify({"error": "Quiz not found"}), 404
 
+    if not isinstance(data, list):
+        return jsonify({"error": "Request body must be a list of questions"}), 400
+
     valid_difficulties = ["Very Easy", "Easy", "Medium", "Hard"]
     created = []
 
@@ -290,42 +658,587 @@ def add_questions_bulk(quiz_id):
         if difficulty not in valid_difficulties:
             return jsonify({"error": f"Invalid difficulty: {difficulty}"}), 400
 
+        if not isinstance(options, list) or correct not in options:
+            return jsonify({"error": f"correct_answer {correct!r} is not one of the options"}), 400
+
         correct_index = options.index(correct)
 
         q = Question(
             quiz_id=quiz_id,
             question=question_text,
-            options=json.dumps(options),
+            options=options,
             correct_answer=correct_index,
             difficulty=difficulty
         )
         db.session.add(q)
         created.append({"question": question_text, "difficulty": difficulty})
 
+    bump_question_revision(quiz_id)
     db.session.commit()
+    invalidate_quiz_catalog()
+    invalidate_question_pools(quiz_id)
     return jsonify({"message": f"{len(created)} questions added", "questions": created}), 201
 
+# -------------------------
+# Streaming question import (NDJSON / CSV)
+# -------------------------
+IMPORT_BATCH_SIZE = 1000
+IMPORT_MAX_REPORTED_ERRORS = 1000
+QUESTION_TEXT_MAX_LENGTH = Question.question.type.length
+QUESTION_OPTION_MAX_LENGTH = 500
+
+
+def validate_question_row(item):
+    """
+    Validate one import row and return (values, error).
+    correct_answer may be the option text (like /questions/bulk) or its index.
+    """
+    if not isinstance(item, dict):
+        return None, "Row must be an object"
+
+    question_text = item.get("question_text") or item.get("question")
+    options = item.get("options")
+    correct = item.get("correct_answer")
+    difficulty = item.get("difficulty") or "Medium"
+
+    if question_text and not isinstance(question_text, str):
+        return None, "question_text must be a string"
+    if not isinstance(difficulty, str):
+        return None, "difficulty must be a string"
+    difficulty = difficulty.strip().title()
+
+    if isinstance(options, str):
+        # CSV cells hold either a JSON array or "a|b|c"
+        options = options.strip()
+        if options.startswith("["):
+            try:
+                options = json.loads(options)
+            except ValueError:
+                return None, "options is not a valid JSON array"
+        else:
+            options = [o.strip() for o in options.split("|") if o.strip()]
+
+    if not question_text or not options or correct in (None, ""):
+        return None, "Missing fields"
+    if not isinstance(options, list) or len(options) < 2:
+        return None, "Options must be a list with at least 2 choices"
+    if not all(isinstance(option, str) for option in options):
+        return None, "Options must be strings"
+    if len(question_text) > QUESTION_TEXT_MAX_LENGTH:
+        return None, f"question_text is longer than {QUESTION_TEXT_MAX_LENGTH} characters"
+    if any(len(option) > QUESTION_OPTION_MAX_LENGTH for option in options):
+        return None, f"Options must be at most {QUESTION_OPTION_MAX_LENGTH} characters"
+    if difficulty not in ["Very Easy", "Easy", "Medium", "Hard"]:
+        return None, f"Invalid difficulty: {difficulty}"
+
+    if isinstance(correct, int) and not isinstance(correct, bool):
+        correct_index = correct
+    elif correct in options:
+        correct_index = options.index(correct)
+    elif isinstance(correct, str) and correct.strip().isdigit():
+        correct_index = int(correct.strip())
+    else:
+        return None, f"correct_answer {correct!r} is not one of the options"
+
+    if not (0 <= correct_index < len(options)):
+        return None, "correct_answer must be a valid index"
+
+    return {
+        "question": question_text,
+        "options": options,
+        "correct_answer": correct_index,
+        "difficulty": difficulty,
+    }, None
+
+
+def iter_import_rows(stream, fmt):
+    """Yield (row_number, item, parse_error) from a binary stream without reading it whole."""
+    # utf-8-sig drops the byte order mark Excel puts in front of the CSV header
+    text_stream = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+    if fmt == "csv":
+        reader = csv.DictReader(text_stream)
+        for row_number, row in enumerate(reader, start=1):
+            yield row_number, row, None
+        return
+
+    for row_number, line in enumerate(text_stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield row_number, json.loads(line), None
+        except ValueError as e:
+            yield row_number, None, f"Invalid JSON: {e}"
+
+
+def import_questions(quiz_id, rows, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Validate rows one by one and insert the valid ones with executemany,
+    committing every batch_size rows. Bad rows are reported, not fatal; a batch
+    the database rejects is retried row by row so only the failing rows drop out.
+    """
+    started = time.perf_counter()
+    report = {
+        "rows_read": 0,
+        "rows_inserted": 0,
+        "rows_failed": 0,
+        "batches_committed": 0,
+        "errors": [],
+    }
+    batch = []  # (row_number, values)
+
+    def fail(row_number, error):
+        report["rows_failed"] += 1
+        if len(report["errors"]) < IMPORT_MAX_REPORTED_ERRORS:
+            report["errors"].append({"row": row_number, "error": error})
+
+    def flush():
+        if not batch:
+            return
+        try:
+            db.session.execute(insert(Question), [values for _, values in batch])
+            inserted = len(batch)
+        except SQLAlchemyError:
+            db.session.rollback()
+            inserted = 0
+            for row_number, values in batch:
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(insert(Question), [values])
+                    inserted += 1
+                except SQLAlchemyError as e:
+                    fail(row_number, f"Rejected by the database: {str(getattr(e, 'orig', e)).splitlines()[0]}")
+        if inserted:
+            bump_question_revision(quiz_id)
+        db.session.commit()
+        report["rows_inserted"] += inserted
+        report["batches_committed"] += 1
+        batch.clear()
+
+    for row_number, item, error in rows:
+        report["rows_read"] += 1
+        values = None
+        if error is None:
+            values, error = validate_question_row(item)
+
+        if error is not None:
+            fail(row_number, error)
+            continue
+
+        values["quiz_id"] = quiz_id
+        batch.append((row_number, values))
+        if len(batch) >= batch_size:
+            flush()
+
+    flush()
+
+    elapsed = time.perf_counter() - started
+    report["elapsed_seconds"] = round(elapsed, 3)
+    report["rows_per_second"] = round(report["rows_read"] / elapsed, 1) if elapsed > 0 else None
+    report["errors_truncated"] = report["rows_failed"] > len(report["errors"])
+    return report
+
+
+@app.route("/quizzes/<int:quiz_id>/questions/import", methods=["POST"])
+def import_questions_stream(quiz_id):
+    """
+    Stream an NDJSON (one question object per line) or CSV body into the quiz.
+    Query params: format=ndjson|csv (defaults from Content-Type), batch_size.
+    """
+    quiz = Quiz.query.get(quiz_id)
+    if not quiz or quiz.is_hidden:
+        return jsonify({"error": "Quiz not found"}), 404
+
+    fmt = request.args.get("format")
+    if fmt is None:
+        fmt = "csv" if "csv" in (request.content_type or "") else "ndjson"
+    if fmt not in ("ndjson", "csv"):
+        return jsonify({"error": "format must be ndjson or csv"}), 400
+
+    try:
+        batch_size = int(request.args.get("batch_size", IMPORT_BATCH_SIZE))
+    except ValueError:
+        return jsonify({"error": "batch_size must be numeric"}), 400
+    if batch_size <= 0:
+        return jsonify({"error": "batch_size must be greater than zero"}), 400
+
+    report = import_questions(quiz_id, iter_import_rows(request.stream, fmt), batch_size)
+    if report["rows_inserted"]:
+        invalidate_quiz_catalog()
+        invalidate_question_pools(quiz_id)
+
+    return jsonify({"quiz_id": quiz_id, "format": fmt, **report}), 200
+
 @app.route("/quizzes/<int:quiz_id>", methods=["PUT"])
 def update_quiz(quiz_id):
     data = request.get_json()
     quiz = Quiz.query.get(quiz_id)
-    if not quiz:
+    if not quiz or quiz.is_hidden:
         return jsonify({"error": "Quiz not found"}), 404
 
     quiz.title = data.get("title", quiz.title)
     quiz.description = data.get("description", quiz.description)
     db.session.commit()
+    invalidate_quiz_catalog()
+    invalidate_prediction_cache(quiz_id=quiz_id)
 
     return jsonify({"message": "Quiz updated"})
 
+@app.route("/quizzes/<int:quiz_id>/questions/<int:question_id>", methods=["PUT"])
+def update_question(quiz_id, question_id):
+    data = request.get_json() or {}
+    q = Question.query.filter_by(id=question_id, quiz_id=quiz_id).first()
+    if not q:
+        return jsonify({"error": "Question not found"}), 404
+
+    options = data.get("options", decode_options(q.options))
+    correct_answer = data.get("correct_answer", q.correct_answer)
+    difficulty = data.get("difficulty", q.difficulty)
+
+    if not isinstance(options, list) or len(options) < 2:
+        return jsonify({"error": "Options must be a list with at least 2 choices"}), 400
+    if not isinstance(correct_answer, int) or not (0 <= correct_answer < len(options)):
+        return jsonify({"error": "correct_answer must be a valid index"}), 400
+    if difficulty not in ["Very Easy", "Easy", "Medium", "Hard"]:
+        return jsonify({"error": f"Invalid difficulty: {difficulty}"}), 400
+
+    q.question = data.get("question", q.question)
+    q.options = options
+    q.correct_answer = correct_answer
+    q.difficulty = difficulty
+    bump_question_revision(quiz_id)
+    db.session.commit()
+    invalidate_question_cache([question_id])
+    invalidate_question_pools(quiz_id)
+
+    return jsonify({"message": "Question updated"})
+
 @app.route("/quizzes/<int:quiz_id>", methods=["DELETE"])
 def delete_quiz(quiz_id):
+    """Hide the quiz right away and purge its questions/attempts in the background."""
     quiz = Quiz.query.get(quiz_id)
     if not quiz:
         return jsonify({"error": "Quiz not found"}), 404
-    db.session.delete(quiz)
+
+    job = (
+        QuizPurgeJob.query
+        .filter(QuizPurgeJob.quiz_id == quiz_id, QuizPurgeJob.status.in_(["queued", "running"]))
+        .first()
+    )
+    if job is None:
+        quiz.is_hidden = True
+        job = QuizPurgeJob(quiz_id=quiz_id, status="queued")
+        db.session.add(job)
+        db.session.commit()
+        invalidate_quiz_catalog()
+        invalidate_question_pools(quiz_id)
+        start_quiz_purge(job.id)
+    else:
+        resume_quiz_purge_if_stale(job)
+
+    return jsonify({
+        "message": "Quiz deleted",
+        "purge_job": purge_job_payload(job),
+    }), 202
+
+
+# -------------------------
+# Background quiz purge
+# -------------------------
+# Questions and attempts are deleted in bounded batches, each in its own short
+# transaction, so a quiz with years of attempts never holds long locks on
+# quiz_attempt or ties up a request worker.
+#
+# Each attempt batch rebuilds the activity and leaderboard rows of its users in
+# the same transaction, so a purge stopped anywhere leaves those cross-quiz
+# rollups matching the attempts that are left (the quiz's own stats and model
+# rows are dropped at the end). The thread bumps heartbeat_at after every batch; a
+# queued or running job without a heartbeat for PURGE_STALE_SECONDS lost its
+# worker and is taken over by the first request of a new worker, by a repeated
+# DELETE, or by polling the job.
+PURGE_BATCH_SIZE = int(os.environ.get("PURGE_BATCH_SIZE", 500))
+PURGE_STALE_SECONDS = int(os.environ.get("PURGE_STALE_SECONDS", 300))
+
+
+def purge_job_payload(job):
+    return {
+        "id": job.id,
+        "quiz_id": job.quiz_id,
+        "status": job.status,
+        "attempts_deleted": job.attempts_deleted,
+        "questions_deleted": job.questions_deleted,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "heartbeat_at": job.heartbeat_at.isoformat() if job.heartbeat_at else None,
+    }
+
+
+def _purge_attempts_in_batches(job):
+    while True:
+        rows = (
+            db.session.query(QuizAttempt.id, QuizAttempt.user_id, QuizAttempt.timestamp)
+            .filter(QuizAttempt.quiz_id == job.quiz_id)
+            .limit(PURGE_BATCH_SIZE)
+            .all()
+        )
+        if not rows:
+            return
+        # users and leaderboard weeks whose rollups include this batch
+        affected_weeks = defaultdict(set)
+        for _, uid, ts in rows:
+            if ts is not None:
+                affected_weeks[week_start_of(ts)].add(uid)
+
+        QuizAttempt.query.filter(QuizAttempt.id.in_([row.id for row in rows])).delete(synchronize_session=False)
+        rebuild_user_activity(sorted({row.user_id for row in rows}))
+        for week, uids in affected_weeks.items():
+            rebuild_weekly_leaderboard(week, uids)
+        job.attempts_deleted += len(rows)
+        job.heartbeat_at = datetime.utcnow()
+        db.session.commit()
+
+
+def _purge_questions_in_batches(job):
+    while True:
+        ids = [
+            row_id for (row_id,) in
+            db.session.query(Question.id).filter(Question.quiz_id == job.quiz_id).limit(PURGE_BATCH_SIZE)
+        ]
+        if not ids:
+            return
+        Question.query.filter(Question.id.in_(ids)).delete(synchronize_session=False)
+        job.questions_deleted += len(ids)
+        job.heartbeat_at = datetime.utcnow()
+        db.session.commit()
+        invalidate_question_cache(ids)
+
+
+def run_quiz_purge(job_id):
+    with app.app_context():
+        job = QuizPurgeJob.query.get(job_id)
+        if job is None or job.status not in ("queued", "running"):
+            return
+        try:
+            # a resumed job picks up where the dead worker stopped
+            job.status = "running"
+            job.heartbeat_at = datetime.utcnow()
+            db.session.commit()
+
+            _purge_attempts_in_batches(job)
+            _purge_questions_in_batches(job)
+
+            UserQuizStats.query.filter_by(quiz_id=job.quiz_id).delete(synchronize_session=False)
+            UserQuizModel.query.filter_by(quiz_id=job.quiz_id).delete(synchronize_session=False)
+            Quiz.query.filter_by(id=job.quiz_id).delete(synchronize_session=False)
+            job.status = "done"
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            job.status = "failed"
+            job.error = str(e)[:1000]
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+        finally:
+            invalidate_quiz_catalog()
+            invalidate_question_pools(job.quiz_id)
+            invalidate_prediction_cache(quiz_id=job.quiz_id)
+
+
+def start_quiz_purge(job_id):
+    threading.Thread(target=run_quiz_purge, args=(job_id,), daemon=True).start()
+
+
+def resume_quiz_purge_if_stale(job):
+    """Restart a queued/running job whose worker stopped heart-beating; True if this call took it over."""
+    last_seen = job.heartbeat_at or job.created_at
+    if job.status not in ("queued", "running") or (
+        last_seen is not None and last_seen > datetime.utcnow() - timedelta(seconds=PURGE_STALE_SECONDS)
+    ):
+        return False
+
+    # compare-and-set on the heartbeat we read, so only one worker takes it over
+    seen = (
+        QuizPurgeJob.heartbeat_at.is_(None) if job.heartbeat_at is None
+        else QuizPurgeJob.heartbeat_at == job.heartbeat_at
+    )
+    claimed = db.session.execute(
+        update(QuizPurgeJob)
+        .where(QuizPurgeJob.id == job.id, QuizPurgeJob.status.in_(["queued", "running"]), seen)
+        .values(heartbeat_at=datetime.utcnow())
+    ).rowcount
     db.session.commit()
-    return jsonify({"message": "Quiz deleted"})
+    if not claimed:
+        return False
+    print(f"Resuming stale purge job {job.id} for quiz {job.quiz_id}")
+    start_quiz_purge(job.id)
+    return True
+
+
+_purge_recovery_checked = False
+
+
+@app.before_request
+def resume_stale_quiz_purges():
+    # once per worker, on its first request (not at import, like the submission writer)
+    global _purge_recovery_checked
+    if _purge_recovery_checked:
+        return
+    _purge_recovery_checked = True
+    for job in QuizPurgeJob.query.filter(QuizPurgeJob.status.in_(["queued", "running"])).all():
+        resume_quiz_purge_if_stale(job)
+
+
+@app.route("/quizzes/purge-jobs/<int:job_id>", methods=["GET"])
+def get_purge_job(job_id):
+    job = QuizPurgeJob.query.get(job_id)
+    if not job:
+        return jsonify({"error": "Purge job not found"}), 404
+    resume_quiz_purge_if_stale(job)
+    return jsonify(purge_job_payload(job))
+
+
+# -------------------------
+# Decoded question payloads
+# -------------------------
+# Quiz-taking and grading read the same few thousand questions over and over,
+# so decoded payloads are cached by question id. Writes in this worker drop the
+# entry; the TTL bounds how long another worker can serve an edited question.
+QUESTION_CACHE_SIZE = int(os.environ.get("QUESTION_CACHE_SIZE", 5000))
+QUESTION_CACHE_TTL = int(os.environ.get("QUESTION_CACHE_TTL", 300))
+
+_question_cache = TTLCache(maxsize=QUESTION_CACHE_SIZE, ttl=QUESTION_CACHE_TTL)
+_question_cache_lock = threading.Lock()
+
+
+def decode_options(raw):
+    """Options come back as a list from the JSON column; legacy TEXT rows still hold a string."""
+    if isinstance(raw, (str, bytes)):
+        return json.loads(raw)
+    return raw
+
+
+def question_payload(q):
+    return {
+        "id": q.id,
+        "quiz_id": q.quiz_id,
+        "question": q.question,
+        "options": decode_options(q.options),
+        "correct_answer": q.correct_answer,
+        "difficulty": q.difficulty,
+    }
+
+
+def get_question_payloads(question_ids):
+    """
+    Return {question_id: payload} for the given ids, loading cache misses with one IN query.
+    Payloads are shared between requests and must be treated as read-only.
+    """
+    found = {}
+    missing = []
+    with _question_cache_lock:
+        for qid in question_ids:
+            payload = _question_cache.get(qid)
+            if payload is None:
+                missing.append(qid)
+            else:
+                found[qid] = payload
+
+    if missing:
+        loaded = [question_payload(q) for q in Question.query.filter(Question.id.in_(missing)).all()]
+        with _question_cache_lock:
+            for payload in loaded:
+                _question_cache[payload["id"]] = payload
+                found[payload["id"]] = payload
+
+    return found
+
+
+def invalidate_question_cache(question_ids=None):
+    with _question_cache_lock:
+        if question_ids is None:
+            _question_cache.clear()
+        else:
+            for qid in question_ids:
+                _question_cache.pop(qid, None)
+    # attempt bundles are built from these payloads
+    invalidate_attempt_bundles(question_ids)
+
+
+# -------------------------
+# Question sampling pools
+# -------------------------
+# start_quiz only needs ids, so each (quiz_id, difficulty) bank is kept in memory
+# as a plain id list together with its version: quiz.question_revision, which
+# every question write path bumps in its transaction, plus (count, max id) from
+# ix_question_quiz_id_difficulty for rows written outside the app. Writes in this
+# worker drop the pool right away; the version is re-checked at most every
+# QUESTION_POOL_TTL seconds, which bounds how long other workers' edits are missed.
+QUESTIONS_PER_ATTEMPT = 20
+QUESTION_POOL_TTL = int(os.environ.get("QUESTION_POOL_TTL", 30))
+
+_question_pools = {}
+_question_pools_lock = threading.Lock()
+
+
+def invalidate_question_pools(quiz_id=None):
+    with _question_pools_lock:
+        if quiz_id is None:
+            _question_pools.clear()
+            return
+        for key in [k for k in _question_pools if k[0] == quiz_id]:
+            del _question_pools[key]
+
+
+def bump_question_revision(quiz_id):
+    db.session.execute(
+        update(Quiz).where(Quiz.id == quiz_id).values(question_revision=Quiz.question_revision + 1)
+    )
+
+
+def question_pool_signature(quiz_id, difficulty):
+    revision = db.session.query(Quiz.question_revision).filter(Quiz.id == quiz_id).scalar_subquery()
+    count, max_id, revision = (
+        db.session.query(func.count(Question.id), func.max(Question.id), revision)
+        .filter(Question.quiz_id == quiz_id, Question.difficulty == difficulty)
+        .one()
+    )
+    return revision, int(count or 0), max_id
+
+
+def get_question_pool(quiz_id, difficulty):
+    """Return the id list for a (quiz_id, difficulty) bank, reloading it if it changed."""
+    key = (quiz_id, difficulty)
+    with _question_pools_lock:
+        pool = _question_pools.get(key)
+        if pool is not None and time.monotonic() < pool["checked_at"] + QUESTION_POOL_TTL:
+            return pool["ids"]
+
+    signature = question_pool_signature(quiz_id, difficulty)
+    if pool is not None and pool["signature"] == signature:
+        with _question_pools_lock:
+            if _question_pools.get(key) is pool:
+                pool["checked_at"] = time.monotonic()
+        return pool["ids"]
+
+    ids = [
+        qid for (qid,) in
+        db.session.query(Question.id)
+        .filter(Question.quiz_id == quiz_id, Question.difficulty == difficulty)
+        .order_by(Question.id.asc())
+    ]
+
+    with _question_pools_lock:
+        _question_pools[key] = {"ids": ids, "signature": signature, "checked_at": time.monotonic()}
+    return ids
+
+
+def sample_question_ids(quiz_id, difficulty, k):
+    """Pick up to k distinct question ids; random.sample is O(k) on the cached list."""
+    ids = get_question_pool(quiz_id, difficulty)
+    return random.sample(ids, min(k, len(ids)))
 
 
 # -------------------------
@@ -345,6 +1258,15 @@ def start_quiz(quiz_id):
     if difficulty not in valid_levels:
         return jsonify({"error": "Invalid difficulty"}), 400
 
+    quiz = Quiz.query.get(quiz_id)
+    if not quiz or quiz.is_hidden:
+        return jsonify({"error": "Quiz not found"}), 404
+
+    # serialize starts per user so two concurrent requests can't both miss the
+    # open attempt and insert one each
+    if db.session.query(User.id).filter_by(id=current_user.id).with_for_update().first() is None:
+        return jsonify({"error": "User not found"}), 401  # deleted after the token was checked
+
     attempt = QuizAttempt.query.filter_by(
         quiz_id=quiz_id,
         user_id=current_user.id,
@@ -368,16 +1290,13 @@ def start_quiz(quiz_id):
         attempt.duration_seconds = None
         attempt.difficulty=difficulty
 
-    questions = Question.query.filter_by(
-        quiz_id=quiz_id,
-        difficulty=difficulty
-    ).all()
+    selected = sample_question_ids(quiz_id, difficulty, QUESTIONS_PER_ATTEMPT)
 
-    if not questions:
+    if not selected:
         return jsonify({"error": "No questions available"}), 404
 
-    selected = random.sample(questions, min(20, len(questions)))
-    attempt.question_order = [q.id for q in selected]
+    attempt.question_order = selected
+    attempt.answer_key = build_answer_key(selected)
     attempt.timestamp = datetime.utcnow()
     attempt.started_at = attempt.started_at or datetime.utcnow()
     attempt.difficulty = difficulty
@@ -391,46 +1310,191 @@ def start_quiz(quiz_id):
 
 
 
+# -------------------------
+# Quiz catalog (cached)
+# -------------------------
+# The catalog is the most-hit unauthenticated endpoint, so it is built with one
+# grouped query and kept in-process. Writes in this worker invalidate it right
+# away; the TTL bounds how stale other workers can be.
+QUIZ_CATALOG_TTL = int(os.environ.get("QUIZ_CATALOG_TTL", 60))
+
+_catalog_lock = threading.Lock()
+_catalog_cache = {"payload": None, "etag": None, "expires_at": 0.0, "generation": 0}
+
+
+def invalidate_quiz_catalog():
+    with _catalog_lock:
+        _catalog_cache["payload"] = None
+        _catalog_cache["etag"] = None
+        _catalog_cache["generation"] += 1
+
+
+def build_quiz_catalog():
+    """Quizzes with at least one question, in a single LEFT JOIN over grouped counts."""
+    question_counts = (
+        db.session.query(
+            Question.quiz_id.label("quiz_id"),
+            func.count(Question.id).label("total_questions"),
+        )
+        .group_by(Question.quiz_id)
+        .subquery()
+    )
+    total_questions = func.coalesce(question_counts.c.total_questions, 0)
+
+    rows = (
+        db.session.query(Quiz.id, Quiz.title, Quiz.description, total_questions)
+        .outerjoin(question_counts, question_counts.c.quiz_id == Quiz.id)
+        .filter(Quiz.title.notlike("%Synthetic%"), Quiz.is_hidden.is_(False), total_questions > 0)
+        .order_by(Quiz.id.asc())
+        .all()
+    )
+
+    return [
+        {
+            "id": quiz_id,
+            "title": title,
+            "description": description,
+            "total_questions": int(count),
+        }
+        for quiz_id, title, description, count in rows
+    ]
+
+
+def get_quiz_catalog():
+    """Return (payload, etag), rebuilding the cached catalog when missing or expired."""
+    now = time.monotonic()
+    with _catalog_lock:
+        if _catalog_cache["payload"] is not None and now < _catalog_cache["expires_at"]:
+            return _catalog_cache["payload"], _catalog_cache["etag"]
+        generation = _catalog_cache["generation"]
+
+    payload = build_quiz_catalog()
+    etag = hashlib.sha1(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    with _catalog_lock:
+        # don't publish a catalog that was built before a concurrent invalidation
+        if generation == _catalog_cache["generation"]:
+            _catalog_cache["payload"] = payload
+            _catalog_cache["etag"] = etag
+            _catalog_cache["expires_at"] = now + QUIZ_CATALOG_TTL
+    return payload, etag
+
+
 @app.route("/quizzes", methods=["GET"])
 def get_quizzes():
-    quizzes = Quiz.query.filter(
-        Quiz.title.notlike("%Synthetic%")
-    ).all()
+    payload, etag = get_quiz_catalog()
 
-    result = []
+    response = jsonify(payload)
+    response.set_etag(etag)
+    # let browsers keep the body but always revalidate with If-None-Match
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
 
-    for q in quizzes:
-        question_count = Question.query.filter_by(quiz_id=q.id).count()
-        if question_count > 0:
-            result.append({
-                "id": q.id,
-                "title": q.title,
-                "description": q.description,
-                "total_questions": question_count
-            })
 
-    return jsonify(result)
+# -------------------------
+# Opaque pagination cursors
+# -------------------------
+def encode_cursor(data):
+    raw = json.dumps(data, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError on anything malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise ValueError("invalid cursor")
+    if not isinstance(data, dict):
+        raise ValueError("invalid cursor")
+    return data
+
+
+QUIZ_PAGE_MAX_LIMIT = 200
+QUESTION_FIELDS = {
+    "id": Question.id,
+    "question": Question.question,
+    "options": Question.options,
+    "difficulty": Question.difficulty,
+}
+DEFAULT_QUESTION_FIELDS = ["id", "question", "options"]
 
 
 @app.route("/quizzes/<int:quiz_id>", methods=["GET"])
 def get_quiz(quiz_id):
+    """
+    Query params (all optional):
+      count_only=1  -> only the quiz header and total_questions
+      fields=id,question,options,difficulty  -> projected columns
+      limit=N, cursor=<next_cursor>, seed=<int>  -> page through one seeded shuffle
+    Without limit/cursor the whole (shuffled) bank is returned as before.
+    """
     quiz = Quiz.query.get(quiz_id)
-    if not quiz:
+    if not quiz or quiz.is_hidden:
         return jsonify({"error": "Quiz not found"}), 404
 
-    questions = Question.query.filter_by(quiz_id=quiz_id).all()
-    random.shuffle(questions)  # shuffle questions
+    header = {"id": quiz.id, "title": quiz.title, "description": quiz.description}
 
-    questions_list = [
-        {"id": q.id, "question": q.question, "options": json.loads(q.options)}
-        for q in questions
+    if request.args.get("count_only", "").lower() in ("1", "true", "yes"):
+        total = db.session.query(func.count(Question.id)).filter(Question.quiz_id == quiz_id).scalar()
+        return jsonify({**header, "total_questions": int(total or 0)})
+
+    fields = [f.strip() for f in request.args.get("fields", "").split(",") if f.strip()] or DEFAULT_QUESTION_FIELDS
+    unknown = [f for f in fields if f not in QUESTION_FIELDS]
+    if unknown:
+        return jsonify({"error": f"Unknown fields: {', '.join(unknown)}"}), 400
+    columns = [Question.id] + [QUESTION_FIELDS[f] for f in fields if f != "id"]
+
+    def serialize(row):
+        values = dict(zip(["id"] + [f for f in fields if f != "id"], row))
+        if "options" in values:
+            values["options"] = decode_options(values["options"])
+        return {f: values[f] for f in fields}
+
+    cursor = request.args.get("cursor")
+    limit = request.args.get("limit")
+
+    if cursor is None and limit is None:
+        rows = db.session.query(*columns).filter(Question.quiz_id == quiz_id).all()
+        random.shuffle(rows)  # shuffle questions
+        return jsonify({**header, "questions": [serialize(r) for r in rows]})
+
+    try:
+        limit = min(int(limit or QUIZ_PAGE_MAX_LIMIT), QUIZ_PAGE_MAX_LIMIT)
+        if cursor is not None:
+            state = decode_cursor(cursor)
+            seed, offset = int(state["seed"]), int(state["offset"])
+        else:
+            seed = int(request.args.get("seed", random.randrange(2 ** 31)))
+            offset = 0
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "Invalid limit, seed or cursor"}), 400
+    if limit <= 0:
+        return jsonify({"error": "limit must be greater than zero"}), 400
+    if offset < 0:
+        return jsonify({"error": "offset must be zero or greater"}), 400
+
+    # Shuffle ids only; the same seed over the same bank always yields the same order
+    ids = [
+        qid for (qid,) in
+        db.session.query(Question.id).filter(Question.quiz_id == quiz_id).order_by(Question.id.asc())
     ]
+    random.Random(seed).shuffle(ids)
+    page_ids = ids[offset:offset + limit]
+
+    rows = db.session.query(*columns).filter(Question.id.in_(page_ids)).all() if page_ids else []
+    row_map = {r[0]: r for r in rows}
+
+    next_offset = offset + len(page_ids)
+    next_cursor = encode_cursor({"seed": seed, "offset": next_offset}) if next_offset < len(ids) else None
 
     return jsonify({
-        "id": quiz.id,
-        "title": quiz.title,
-        "description": quiz.description,
-        "questions": questions_list
+        **header,
+        "total_questions": len(ids),
+        "seed": seed,
+        "next_cursor": next_cursor,
+        "questions": [serialize(row_map[qid]) for qid in page_ids if qid in row_map],
     })
 
 # Single question (index) endpoint - useful for one-question-per-page UI
@@ -452,11 +1516,7 @@ def get_random_questions(quiz_id, difficulty):
     if not attempt.question_order:
         return jsonify({"error": "Quiz not initialized"}), 400
 
-    questions = Question.query.filter(
-        Question.id.in_(attempt.question_order)
-    ).all()
-
-    question_map = {q.id: q for q in questions}
+    question_map = get_question_payloads(attempt.question_order)
 
     ordered_questions = [
         question_map[qid]
@@ -467,9 +1527,9 @@ def get_random_questions(quiz_id, difficulty):
     return jsonify({
         "questions": [
             {
-                "id": q.id,
-                "question": q.question,
-                "options": json.loads(q.options)
+                "id": q["id"],
+                "question": q["question"],
+                "options": q["options"]
             }
             for q in ordered_questions
         ]
@@ -481,13 +1541,28 @@ def get_user_attempts(user_id):
     # ensure token user matches requested user
     if request.current_user.id != user_id:
         return jsonify({"error": "Unauthorized"}), 401
-    attempts = QuizAttempt.query.filter_by(
+    query = QuizAttempt.query.filter_by(
         user_id=user_id,
         status="submitted"
-    ).all()
+    )
+    summary = request.args.get("view") == "summary"
+    if summary:
+        query = summary_only(query)
+
+    paged = "cursor" in request.args or "limit" in request.args
+    if paged:
+        try:
+            attempts, next_cursor = keyset_page(query, request.args.get("cursor"), request.args.get("limit"))
+        except ValueError:
+            return jsonify({"error": "Invalid limit or cursor"}), 400
+    else:
+        attempts = query.all()
+
+    question_map = {} if summary else prefetch_attempt_questions(attempts)
     result = []
     for a in attempts:
-        result.append({
+        item = {
+            "id": a.id,
             "quiz_id": a.quiz_id,
             "score": a.score,
             "total": a.total_questions,
@@ -495,9 +1570,14 @@ def get_user_attempts(user_id):
             "status": a.status,
             "timestamp": a.timestamp.isoformat(),
             "duration_seconds": a.duration_seconds,
-            "answers_detail": a.answers_detail,
             "difficulty": a.difficulty,
-        })
+        }
+        if not summary:
+            item["answers_detail"] = render_answers_detail(a, question_map)
+        result.append(item)
+
+    if paged:
+        return jsonify({"items": result, "next_cursor": next_cursor})
     return jsonify(result)
 
 @app.route(
@@ -521,30 +1601,606 @@ def get_attempt_question(quiz_id, attempt_id, index):
         return jsonify({"error": "Question index out of range"}), 400
 
     question_id = attempt.question_order[index]
-    q = Question.query.get_or_404(question_id)
+    q = get_question_payloads([question_id]).get(question_id)
+    if not q:
+        return jsonify({"error": "Question not found"}), 404
 
     return jsonify({
-        "id": q.id,
+        "id": q["id"],
         "index": index,
-        "question": q.question,
-        "options": json.loads(q.options),
+        "question": q["question"],
+        "options": q["options"],
         "total_questions": len(attempt.question_order)
     })
 
-# -------------------------
-# Submission & attempts (protected)
-# -------------------------
-@app.route("/quizzes/<int:quiz_id>/submit", methods=["POST"])
-@token_required
-def submit_quiz(quiz_id):
-    data = request.get_json() or {}
-    submitted_answers = data.get("answers")
+# Attempt bundle - every question of an attempt (or a window) in one response.
+# question_order does not change while the attempt is in progress, so the bundle
+# is cached per (attempt, order). Question text and options can still be edited,
+# so the ETag carries a hash of the bundle's content: edits in this worker drop
+# the bundles holding the question, and other workers pick them up within the
+# question payload TTL, which the bundle TTL defaults to as well.
+ATTEMPT_BUNDLE_CACHE_SIZE = int(os.environ.get("ATTEMPT_BUNDLE_CACHE_SIZE", 2000))
+ATTEMPT_BUNDLE_CACHE_TTL = int(os.environ.get("ATTEMPT_BUNDLE_CACHE_TTL", QUESTION_CACHE_TTL))
+
+_attempt_bundle_cache = TTLCache(maxsize=ATTEMPT_BUNDLE_CACHE_SIZE, ttl=ATTEMPT_BUNDLE_CACHE_TTL)
+_attempt_bundle_lock = threading.Lock()
+
+
+def question_order_fingerprint(question_order):
+    return hashlib.sha1(json.dumps(question_order).encode("utf-8")).hexdigest()[:16]
+
+
+def get_attempt_bundle(attempt_id, question_order):
+    """Ordered, answer-free question list for an attempt, plus a version hash of its content."""
+    key = (attempt_id, question_order_fingerprint(question_order))
+    with _attempt_bundle_lock:
+        bundle = _attempt_bundle_cache.get(key)
+    if bundle is not None:
+        return bundle
+
+    question_map = get_question_payloads(question_order)
+    bundle = [
+        {
+            "id": qid,
+            "index": index,
+            "question": question_map[qid]["question"],
+            "options": question_map[qid]["options"],
+        }
+        for index, qid in enumerate(question_order)
+        if qid in question_map
+    ]
+    version = hashlib.sha1(json.dumps(bundle, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+    with _attempt_bundle_lock:
+        _attempt_bundle_cache[key] = (bundle, version)
+    return bundle, version
+
+
+def invalidate_attempt_bundles(question_ids=None):
+    with _attempt_bundle_lock:
+        if question_ids is None:
+            _attempt_bundle_cache.clear()
+            return
+        question_ids = set(question_ids)
+        stale = [
+            key for key, (bundle, _) in _attempt_bundle_cache.items()
+            if any(q["id"] in question_ids for q in bundle)
+        ]
+        for key in stale:
+            _attempt_bundle_cache.pop(key, None)
+
+
+@app.route("/quizzes/<int:quiz_id>/attempts/<int:attempt_id>/questions", methods=["GET"])
+@token_required
+def get_attempt_questions(quiz_id, attempt_id):
+    """Optional query params: offset (default 0), limit (default all)."""
+    row = (
+        db.session.query(QuizAttempt.question_order)
+        .filter_by(id=attempt_id, quiz_id=quiz_id, user_id=request.current_user.id)
+        .first()
+    )
+    if not row:
+        return jsonify({"error": "Attempt not found"}), 404
+
+    question_order = row[0] or []
+
+    try:
+        offset = int(request.args.get("offset", 0))
+        limit = int(request.args.get("limit", len(question_order)))
+    except ValueError:
+        return jsonify({"error": "offset and limit must be numeric"}), 400
+    if offset < 0 or limit < 0:
+        return jsonify({"error": "offset and limit must not be negative"}), 400
+
+    bundle, version = get_attempt_bundle(attempt_id, question_order)
+    etag = f"{attempt_id}-{version}-{offset}-{limit}"
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    response = jsonify({
+        "attempt_id": attempt_id,
+        "quiz_id": quiz_id,
+        "total_questions": len(question_order),
+        "offset": offset,
+        "questions": bundle[offset:offset + limit],
+    })
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+# -------------------------
+# Submission & attempts (protected)
+# -------------------------
+# -------------------------
+# Grading engine
+# -------------------------
+def build_answer_key(question_ids):
+    """Correct option index for each slot of question_order (-1 if the question is gone)."""
+    question_map = get_question_payloads(question_ids)
+    return [
+        question_map[qid]["correct_answer"] if qid in question_map else -1
+        for qid in question_ids
+    ]
+
+
+# selected option indexes go through np.int64 arrays and int columns; anything
+# outside int32 can't be a real option and would overflow on the way
+ANSWER_INDEX_MIN, ANSWER_INDEX_MAX = -2 ** 31, 2 ** 31 - 1
+
+
+def parse_submitted_answers(submitted_answers):
+    try:
+        selected = [int(ans) for ans in submitted_answers]
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if any(not ANSWER_INDEX_MIN <= ans <= ANSWER_INDEX_MAX for ans in selected):
+        return None
+    return selected
+
+
+def grade_submissions(answer_keys, submissions):
+    """
+    Grade many submissions in one vectorized comparison.
+    All keys/answers are concatenated into flat arrays and per-attempt scores are
+    summed with np.add.reduceat. Returns [(score, correct_mask), ...] in input order.
+    """
+    if not answer_keys:
+        return []
+
+    lengths = np.array([len(k) for k in answer_keys], dtype=np.int64)
+    keys = np.concatenate([np.asarray(k, dtype=np.int64) for k in answer_keys])
+    answers = np.concatenate([np.asarray(a, dtype=np.int64) for a in submissions])
+
+    correct = keys == answers
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+    scores = np.zeros(len(lengths), dtype=np.int64)
+    non_empty = lengths > 0
+    if non_empty.any():
+        scores[non_empty] = np.add.reduceat(correct.astype(np.int64), offsets[non_empty])
+
+    return [
+        (int(scores[i]), correct[offsets[i]:offsets[i] + lengths[i]])
+        for i in range(len(lengths))
+    ]
+
+
+def build_answers_detail(question_ids, selected, answer_key, correct_mask, question_map):
+    answers_detail = []
+    for qid, selected_idx, correct_idx, is_correct in zip(question_ids, selected, answer_key, correct_mask):
+        q = question_map.get(qid)
+        options = q["options"] if q else []
+        answers_detail.append({
+            "question_id": qid,
+            "question": q["question"] if q else None,
+            "selected_option": selected_idx,
+            "selected_text": options[selected_idx] if 0 <= selected_idx < len(options) else None,
+            "correct_option": correct_idx,
+            "correct_text": options[correct_idx] if 0 <= correct_idx < len(options) else None,
+            "is_correct": bool(is_correct)
+        })
+    return answers_detail
+
+
+# Stored answers_detail is compact: selected indices plus a correctness bitmap,
+# both keyed to question_order. Question/option texts are rendered on read from
+# the question cache instead of being copied into every attempt row.
+COMPACT_DETAIL_FORMAT = "compact-v1"
+
+
+def compact_answers_detail(selected, correct_mask):
+    return {
+        "format": COMPACT_DETAIL_FORMAT,
+        "selected": [int(x) for x in selected],
+        "correct": np.packbits(np.asarray(correct_mask, dtype=bool)).tobytes().hex(),
+    }
+
+
+def is_compact_detail(detail):
+    return isinstance(detail, dict) and detail.get("format") == COMPACT_DETAIL_FORMAT
+
+
+def prefetch_attempt_questions(attempts):
+    """One cache/IN lookup for every question referenced by compact details."""
+    question_ids = {
+        qid
+        for a in attempts if is_compact_detail(a.answers_detail)
+        for qid in (a.question_order or [])
+    }
+    return get_question_payloads(list(question_ids)) if question_ids else {}
+
+
+def render_answers_detail(attempt, question_map=None):
+    """Expand a compact answers_detail into the review list; legacy/client lists pass through."""
+    detail = attempt.answers_detail
+    if not is_compact_detail(detail):
+        return detail
+
+    question_ids = attempt.question_order or []
+    selected = detail["selected"]
+    correct_mask = np.unpackbits(np.frombuffer(bytes.fromhex(detail["correct"]), dtype=np.uint8))[:len(selected)]
+
+    if question_map is None:
+        question_map = get_question_payloads(question_ids)
+    answer_key = attempt.answer_key or [
+        question_map[qid]["correct_answer"] if qid in question_map else -1
+        for qid in question_ids
+    ]
+    return build_answers_detail(question_ids, selected, answer_key, correct_mask, question_map)
+
+
+def submission_values(attempt, score, answers_detail, submitted_at):
+    """Column values that turn an in-progress attempt into a submitted one."""
+    total = len(attempt.question_order)
+    duration = int((submitted_at - (attempt.started_at or submitted_at)).total_seconds())
+    return {
+        "score": score,
+        "total_questions": total,
+        "percentage": (score / total) * 100,
+        "timestamp": submitted_at,
+        "duration_seconds": max(0, duration),
+        "answers_detail": answers_detail,
+        "status": "submitted",
+    }
+
+
+# -------------------------
+# Write-behind submissions
+# -------------------------
+# When a whole class submits at the bell, committing every attempt in its own
+# request transaction exhausts the database pool. With SUBMIT_WRITE_MODE set to
+# "async" or "journal", submit_quiz still grades synchronously but hands the
+# attempt update to a bounded queue; one writer thread per worker flushes it in
+# batched transactions. A full queue pushes back with 503 + Retry-After.
+#
+#   sync     commit inside the request (default)
+#   async    acknowledge once queued; a crash loses what is still queued
+#   journal  also append to an fsynced per-worker journal before acknowledging;
+#            requests waiting on the disk share one fsync (group commit), and
+#            orphaned journals (crashed workers) are replayed when a worker starts
+#
+# Before queueing, submit_quiz commits status "submitting" on the attempt. The
+# marker lives in the database, so start_quiz on any worker starts a fresh
+# attempt instead of recycling a queued one, and grade_batch skips it. The
+# writer only updates rows that are still open with the same started_at, so
+# replays and duplicate submissions are no-ops. In async mode a crash leaves
+# the queued attempts in "submitting"; they never count as submitted.
+#
+# A batch that still fails after SUBMIT_MAX_RETRIES while the database answers
+# is split in half until the failing submission is isolated; that one is
+# appended to dead-letter.ndjson in SUBMIT_JOURNAL_DIR and the rest are written.
+# Dead-letter lines are journal items, so renaming the file to
+# submit-<anything>.ndjson replays it on the next journal-mode start.
+SUBMIT_WRITE_MODE = os.environ.get("SUBMIT_WRITE_MODE", "sync").lower()
+SUBMIT_QUEUE_MAX = int(os.environ.get("SUBMIT_QUEUE_MAX", 2000))
+SUBMIT_BATCH_SIZE = int(os.environ.get("SUBMIT_BATCH_SIZE", 200))
+SUBMIT_FLUSH_INTERVAL = float(os.environ.get("SUBMIT_FLUSH_INTERVAL", 0.05))
+SUBMIT_ENQUEUE_TIMEOUT = float(os.environ.get("SUBMIT_ENQUEUE_TIMEOUT", 2.0))
+SUBMIT_JOURNAL_DIR = Path(os.environ.get("SUBMIT_JOURNAL_DIR", Path(__file__).with_name("submit_journal")))
+SUBMIT_MAX_RETRIES = int(os.environ.get("SUBMIT_MAX_RETRIES", 5))
+
+if SUBMIT_WRITE_MODE not in ("sync", "async", "journal"):
+    raise ValueError(f"SUBMIT_WRITE_MODE must be sync, async or journal, not {SUBMIT_WRITE_MODE!r}")
+
+SUBMISSION_UPDATE_FIELDS = (
+    "score", "total_questions", "percentage", "timestamp",
+    "duration_seconds", "answers_detail", "status",
+)
+
+
+class SubmissionWriter:
+    """Bounded submission queue plus the thread that drains it into the database."""
+
+    def __init__(self, mode, maxsize, batch_size, flush_interval, journal_dir):
+        self.mode = mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.journal_dir = Path(journal_dir)
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()  # guards pending, stats and the journal file
+        self._start_lock = threading.Lock()
+        # journal group commit: lines are numbered as they are written, and one
+        # fsync makes every line written before it durable
+        self._fsync_lock = threading.Lock()
+        self._journal_written = 0
+        self._journal_synced = 0
+        self._pending = set()
+        self._journal = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.stats = {
+            "enqueued": 0, "written": 0, "stale": 0, "rejected": 0,
+            "batches": 0, "errors": 0, "replayed": 0, "dead_lettered": 0, "journal_syncs": 0,
+        }
+
+    # ---- request side ----
+    def submit(self, item, timeout):
+        """Queue one submission; False when the queue stayed full for `timeout` seconds."""
+        self.start()
+        deadline = time.monotonic() + timeout
+        line = json.dumps(item, default=datetime.isoformat) + "\n" if self.mode == "journal" else None
+        while True:
+            seq = None
+            with self._lock:
+                try:
+                    self._queue.put_nowait(item)
+                except queue.Full:
+                    queued = False
+                else:
+                    queued = True
+                    self._pending.add(item["id"])
+                    self.stats["enqueued"] += 1
+                    if self._journal is not None:
+                        self._journal.write(line)
+                        self._journal.flush()
+                        self._journal_written += 1
+                        seq = self._journal_written
+            if queued:
+                if seq is not None:
+                    # the disk sync happens outside _lock, shared by everyone waiting on it
+                    self._sync_journal(seq)
+                return True
+            if time.monotonic() >= deadline:
+                with self._lock:
+                    self.stats["rejected"] += 1
+                return False
+            time.sleep(0.01)
+
+    def _sync_journal(self, seq):
+        """Return once journal line `seq` is on disk; concurrent callers share one fsync."""
+        with self._fsync_lock:
+            if self._journal_synced >= seq:
+                return  # a sync that started after our write already covered it
+            with self._lock:
+                target = self._journal_written  # every line up to here is flushed to the OS
+            os.fsync(self._journal.fileno())
+            self._journal_synced = target
+            with self._lock:
+                self.stats["journal_syncs"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["pending"] = len(self._pending)
+        stats.update({
+            "mode": self.mode,
+            "queue_depth": self._queue.qsize(),
+            "queue_max": self._queue.maxsize,
+            "running": bool(self._thread and self._thread.is_alive()),
+        })
+        return stats
+
+    # ---- writer side ----
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            if self.mode == "journal":
+                self._replay_orphaned_journals()
+                self._open_journal()
+            self._thread = threading.Thread(target=self._run, name="submission-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=10.0):
+        """Flush whatever is queued and stop the writer (called at interpreter exit)."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                if self._stop.is_set():
+                    return
+                continue
+            written, dead = self._write(batch)
+            with self._lock:
+                self._pending.difference_update(item["id"] for item in batch)
+                self.stats["written"] += written
+                self.stats["stale"] += len(batch) - written - dead
+                self.stats["batches"] += 1
+                if self._journal is not None and self._queue.empty():
+                    # everything journaled so far is committed (or dead-lettered)
+                    self._journal.truncate(0)
+
+    def _write(self, batch):
+        """
+        Write one batch with retries and return (written, dead_lettered). While the
+        database is unreachable it keeps retrying, so the queue backs up into 503s;
+        otherwise a batch that keeps failing is bisected down to the bad item.
+        """
+        backoff = self.flush_interval
+        failures = 0
+        while True:
+            try:
+                with app.app_context():
+                    return write_submission_batch(batch), 0
+            except Exception as e:
+                failures += 1
+                with self._lock:
+                    self.stats["errors"] += 1
+                print(f"Submission writer batch of {len(batch)} failed (try {failures}):", e)
+                if failures > SUBMIT_MAX_RETRIES and database_reachable():
+                    break
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 5.0)
+
+        if len(batch) > 1:
+            mid = len(batch) // 2
+            first, second = self._write(batch[:mid]), self._write(batch[mid:])
+            return first[0] + second[0], first[1] + second[1]
+        self._dead_letter(batch[0])
+        return 0, 1
+
+    def _dead_letter(self, item):
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.journal_dir / "dead-letter.ndjson", "a", encoding="utf-8") as f:
+            f.write(json.dumps(item, default=datetime.isoformat) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        with self._lock:
+            self.stats["dead_lettered"] += 1
+        print(f"Submission for attempt {item['id']} moved to {self.journal_dir / 'dead-letter.ndjson'}")
+
+    def _take_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    # ---- journal ----
+    def _open_journal(self):
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        self._journal = open(self.journal_dir / f"submit-{os.getpid()}-{uuid.uuid4().hex[:8]}.ndjson", "a", encoding="utf-8")
+        if fcntl is not None:
+            # held for the life of the worker; a lockable journal belongs to a dead one
+            fcntl.flock(self._journal, fcntl.LOCK_EX)
+
+    def _replay_orphaned_journals(self):
+        if not self.journal_dir.is_dir():
+            return
+        for path in sorted(self.journal_dir.glob("submit-*.ndjson")):
+            with open(path, "r+", encoding="utf-8") as f:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue  # a live worker owns it
+                items = []
+                for line in f:
+                    try:
+                        items.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        break  # torn final line from the crash
+                for start in range(0, len(items), self.batch_size):
+                    self._write(items[start:start + self.batch_size])
+                with self._lock:
+                    self.stats["replayed"] += len(items)
+                path.unlink()
+
+
+def database_reachable():
+    try:
+        with app.app_context():
+            db.session.execute(text("SELECT 1"))
+        return True
+    except Exception:
+        return False
+
+
+def submission_item(attempt, values):
+    """Everything the writer needs to apply one graded attempt without reloading it."""
+    return {
+        "id": attempt.id,
+        "user_id": attempt.user_id,
+        "quiz_id": attempt.quiz_id,
+        "difficulty": attempt.difficulty,
+        "started_at": attempt.started_at,
+        **values,
+    }
+
+
+def mark_attempt_submitting(attempt):
+    """
+    Flip an open attempt to "submitting" and commit, which also hands the pooled
+    connection back before waiting on the queue. False when another request
+    submitted or restarted it first.
+    """
+    marked = db.session.execute(
+        update(QuizAttempt)
+        .where(
+            QuizAttempt.id == attempt.id,
+            QuizAttempt.status == "in_progress",
+            QuizAttempt.started_at == attempt.started_at,
+        )
+        .values(status="submitting")
+    ).rowcount
+    db.session.commit()
+    return marked == 1
+
+
+def parse_journal_datetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def write_submission_batch(items):
+    """
+    Apply queued submissions in one transaction: a single locking read to find the
+    attempts that are still open, one bulk UPDATE, then the submit-time rollups.
+    Returns how many attempts were written.
+    """
+    for item in items:
+        for field in ("timestamp", "started_at"):
+            item[field] = parse_journal_datetime(item.get(field))
+
+    open_attempts = dict(
+        db.session.query(QuizAttempt.id, QuizAttempt.started_at)
+        .filter(
+            QuizAttempt.id.in_({item["id"] for item in items}),
+            QuizAttempt.status.in_(("in_progress", "submitting")),
+        )
+        .with_for_update()
+        .all()
+    )
+
+    rows = []
+    for item in items:
+        # a restarted attempt has a new started_at; an already written one is gone from open_attempts
+        if item["id"] in open_attempts and open_attempts[item["id"]] == item["started_at"]:
+            del open_attempts[item["id"]]
+            rows.append(item)
+
+    if rows:
+        db.session.execute(
+            update(QuizAttempt),
+            [{"id": row["id"], **{field: row[field] for field in SUBMISSION_UPDATE_FIELDS}} for row in rows],
+        )
+        for row in rows:
+            on_attempt_submitted(SimpleNamespace(**row))
+    db.session.commit()
+    return len(rows)
+
+
+submission_writer = SubmissionWriter(
+    SUBMIT_WRITE_MODE, SUBMIT_QUEUE_MAX, SUBMIT_BATCH_SIZE, SUBMIT_FLUSH_INTERVAL, SUBMIT_JOURNAL_DIR,
+)
+atexit.register(submission_writer.stop)
+
+
+@app.before_request
+def start_submission_writer():
+    # started on the first request rather than at import, so scripts that import
+    # server never spawn the thread; journal mode replays orphans here too
+    if submission_writer.mode != "sync":
+        submission_writer.start()
+
+
+@app.route("/quizzes/<int:quiz_id>/submit", methods=["POST"])
+@token_required
+def submit_quiz(quiz_id):
+    data = request.get_json() or {}
+    submitted_answers = data.get("answers")
 
     if not isinstance(submitted_answers, list):
         return jsonify({"error": "Answers must be a list"}), 400
 
     current_user = request.current_user
 
+    # a quiz hidden by a pending purge takes no more submissions
+    quiz = Quiz.query.get(quiz_id)
+    if not quiz or quiz.is_hidden:
+        return jsonify({"error": "Quiz not found"}), 404
+
     # 🔹 Get or create attempt
     attempt = QuizAttempt.query.filter_by(
         quiz_id=quiz_id,
@@ -560,50 +2216,58 @@ def submit_quiz(quiz_id):
 
     question_ids = attempt.question_order
 
-    questions = Question.query.filter(
-        Question.id.in_(question_ids)
-    ).all()
-
     if len(submitted_answers) != len(question_ids):
         return jsonify({"error": "Answer all questions"}), 400
 
-    question_map = {q.id: q for q in questions}
-
-    score = 0
-    answers_detail = []
-    for qid, ans in zip(question_ids, submitted_answers):
-        q = question_map[qid]
-        options = json.loads(q.options)
-        selected_idx = int(ans)
-        correct_idx = q.correct_answer
-        is_correct = selected_idx == correct_idx
-        if is_correct:
-            score += 1
-        answers_detail.append({
-            "question_id": qid,
-            "question": q.question,
-            "selected_option": selected_idx,
-            "selected_text": options[selected_idx] if 0 <= selected_idx < len(options) else None,
-            "correct_option": correct_idx,
-            "correct_text": options[correct_idx] if 0 <= correct_idx < len(options) else None,
-            "is_correct": is_correct
-        })
-
-    attempt.score = score
-    attempt.total_questions = len(question_ids)
-    attempt.percentage = (score / len(question_ids)) * 100
-    attempt.timestamp = datetime.utcnow()
-    calculated_duration = int((attempt.timestamp - (attempt.started_at or attempt.timestamp)).total_seconds())
-    if calculated_duration < 0:
-        calculated_duration = 0
-
-    attempt.duration_seconds = calculated_duration
-    attempt.answers_detail = answers_detail
-
-    # ✅ reset AFTER grading
-    attempt.status = "submitted"
-
-    db.session.commit()
+    selected = parse_submitted_answers(submitted_answers)
+    if selected is None:
+        return jsonify({"error": "Answers must be option indexes"}), 400
+
+    answer_key = attempt.answer_key or build_answer_key(question_ids)
+    (score, correct_mask), = grade_submissions([answer_key], [selected])
+
+    question_map = get_question_payloads(question_ids)
+    answers_detail = build_answers_detail(question_ids, selected, answer_key, correct_mask, question_map)
+
+    # ✅ reset AFTER grading (status is part of the submitted values)
+    stored_detail = compact_answers_detail(selected, correct_mask)
+    values = submission_values(attempt, score, stored_detail, datetime.utcnow())
+
+    item = submission_item(attempt, values)
+    if submission_writer.mode == "sync":
+        # claim the attempt with the write itself: a concurrent submit or grade_batch
+        # that got there first leaves nothing to update, so rollups are folded once
+        claimed = db.session.execute(
+            update(QuizAttempt)
+            .where(
+                QuizAttempt.id == attempt.id,
+                QuizAttempt.status == "in_progress",
+                QuizAttempt.started_at == attempt.started_at,
+            )
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if claimed != 1:
+            db.session.rollback()
+            return jsonify({"error": "Quiz already submitted"}), 409
+        on_attempt_submitted(SimpleNamespace(**item))
+        db.session.commit()
+    else:
+        # durable "submission pending" marker, committed before queueing: no worker
+        # will recycle the attempt for a new start, and a second submit gets 409
+        if not mark_attempt_submitting(attempt):
+            db.session.rollback()
+            return jsonify({"error": "Quiz already submitted"}), 409
+        if not submission_writer.submit(item, SUBMIT_ENQUEUE_TIMEOUT):
+            db.session.execute(
+                update(QuizAttempt)
+                .where(QuizAttempt.id == attempt.id, QuizAttempt.status == "submitting")
+                .values(status="in_progress")
+            )
+            db.session.commit()
+            response = jsonify({"error": "Too many submissions right now, please retry"})
+            response.headers["Retry-After"] = "1"
+            return response, 503
 
     return jsonify({
         "user_id": current_user.id,
@@ -615,102 +2279,845 @@ def submit_quiz(quiz_id):
 
 
 
+@app.route("/grading/batch", methods=["POST"])
+@token_required
+def grade_batch():
+    """
+    Grade many in-progress attempts at once (e.g. a proctored class at the bell).
+    Body: { "submissions": [ { "attempt_id": 1, "answers": [0, 2, ...] }, ... ] }
+    Admin only. Attempts load in one IN query, grade in one vectorized pass
+    and are written back with a single bulk UPDATE.
+    """
+    if request.current_user.role != "admin":
+        return jsonify({"error": "Admin access required"}), 403
+
+    data = request.get_json() or {}
+    submissions = data.get("submissions")
+    if not isinstance(submissions, list) or not submissions:
+        return jsonify({"error": "submissions must be a non-empty list"}), 400
+
+    attempt_ids = [s.get("attempt_id") for s in submissions if isinstance(s, dict)]
+    attempts = QuizAttempt.query.filter(
+        QuizAttempt.id.in_([a for a in attempt_ids if isinstance(a, int)]),
+        QuizAttempt.status == "in_progress",
+    ).all()
+    attempt_map = {a.id: a for a in attempts}
+
+    results = [None] * len(submissions)
+    to_grade = []  # (position, attempt, selected, answer_key)
+    for position, item in enumerate(submissions):
+        attempt_id = item.get("attempt_id") if isinstance(item, dict) else None
+        attempt = attempt_map.get(attempt_id)
+        if attempt is None or not attempt.question_order:
+            results[position] = {"attempt_id": attempt_id, "status": "error", "error": "No active quiz attempt"}
+            continue
+        answers = item.get("answers")
+        if not isinstance(answers, list) or len(answers) != len(attempt.question_order):
+            results[position] = {"attempt_id": attempt_id, "status": "error", "error": "Answer all questions"}
+            continue
+        selected = parse_submitted_answers(answers)
+        if selected is None:
+            results[position] = {"attempt_id": attempt_id, "status": "error", "error": "Answers must be option indexes"}
+            continue
+        # a duplicate attempt_id in one batch is graded once
+        attempt_map.pop(attempt_id)
+        to_grade.append((position, attempt, selected, attempt.answer_key or build_answer_key(attempt.question_order)))
+
+    graded = grade_submissions([g[3] for g in to_grade], [g[2] for g in to_grade])
+
+    now = datetime.utcnow()
+    rows = []
+    for (position, attempt, selected, answer_key), (score, correct_mask) in zip(to_grade, graded):
+        answers_detail = compact_answers_detail(selected, correct_mask)
+        rows.append({
+            "id": attempt.id,
+            "answer_key": answer_key,
+            **submission_values(attempt, score, answers_detail, now),
+        })
+        results[position] = {
+            "attempt_id": attempt.id,
+            "user_id": attempt.user_id,
+            "quiz_id": attempt.quiz_id,
+            "status": "graded",
+            "score": score,
+            "total": len(attempt.question_order),
+        }
+
+    if rows:
+        # claim the attempts that are still in progress; one a concurrent grade or
+        # submit finished in the meantime is reported, not applied a second time
+        claimed = set(db.session.execute(
+            update(QuizAttempt)
+            .where(QuizAttempt.id.in_([row["id"] for row in rows]), QuizAttempt.status == "in_progress")
+            .values(status="submitted")
+            .returning(QuizAttempt.id)
+            .execution_options(synchronize_session=False)
+        ).scalars())
+        applied = [(g, row) for g, row in zip(to_grade, rows) if row["id"] in claimed]
+        for (position, attempt, _, _), row in zip(to_grade, rows):
+            if row["id"] not in claimed:
+                results[position] = {"attempt_id": attempt.id, "status": "error", "error": "No active quiz attempt"}
+        rows = [row for _, row in applied]
+
+        if rows:
+            db.session.execute(update(QuizAttempt), rows)
+        for (_, attempt, _, _), values in applied:
+            on_attempt_submitted(SimpleNamespace(
+                user_id=attempt.user_id,
+                quiz_id=attempt.quiz_id,
+                difficulty=attempt.difficulty,
+                **values,
+            ))
+    db.session.commit()
+
+    return jsonify({
+        "graded": len(rows),
+        "failed": len(submissions) - len(rows),
+        "results": results,
+    }), 200
+
+
 # =====================================================
 # Module 2: Results Tracker (attempt storage + stats)
 # =====================================================
 
-@app.route("/results", methods=["POST"])
-@token_required
-def create_result():
-    data = request.get_json() or {}
+RESULTS_BATCH_MAX = int(os.environ.get("RESULTS_BATCH_MAX", 100))
+
+
+def parse_result_payload(data, user_id, timestamp):
+    """Validate one client-reported attempt; returns (column values, error message)."""
+    if not isinstance(data, dict):
+        return None, "Each result must be an object"
+
     quiz_id = data.get("quiz_id")
     score = data.get("score")
     total_questions = data.get("total_questions")
 
     if quiz_id is None or score is None or total_questions is None:
-        return jsonify({"error": "quiz_id, score, and total_questions are required"}), 400
+        return None, "quiz_id, score, and total_questions are required"
 
     try:
         quiz_id = int(quiz_id)
         score = int(score)
         total_questions = int(total_questions)
     except (TypeError, ValueError):
-        return jsonify({"error": "quiz_id, score, and total_questions must be numbers"}), 400
+        return None, "quiz_id, score, and total_questions must be numbers"
+
+    if total_questions <= 0:
+        return None, "total_questions must be greater than zero"
+
+    question_order = data.get("question_order") or []
+    if not isinstance(question_order, list):
+        return None, "question_order must be a list"
+
+    duration_seconds = data.get("duration_seconds")
+    try:
+        duration_seconds = int(duration_seconds) if duration_seconds is not None else None
+    except (TypeError, ValueError):
+        return None, "duration_seconds must be a number"
+
+    idempotency_key = data.get("idempotency_key")
+    if idempotency_key is not None and (not isinstance(idempotency_key, str) or not 0 < len(idempotency_key) <= 100):
+        return None, "idempotency_key must be a string of at most 100 characters"
+
+    difficulty = data.get("difficulty")
+    return {
+        "quiz_id": quiz_id,
+        "user_id": user_id,
+        "score": score,
+        "total_questions": total_questions,
+        "percentage": (score / total_questions) * 100,
+        "timestamp": timestamp,
+        "started_at": timestamp - timedelta(seconds=duration_seconds) if duration_seconds else timestamp,
+        "duration_seconds": duration_seconds,
+        "question_order": question_order,
+        "answers_detail": data.get("answers_detail"),
+        "status": "submitted",
+        "difficulty": (difficulty.strip().title() if isinstance(difficulty, str) else None),
+        "idempotency_key": idempotency_key,
+    }, None
+
+
+@app.route("/results", methods=["POST"])
+@token_required
+def create_result():
+    data = request.get_json() or {}
+    values, error = parse_result_payload(data, request.current_user.id, datetime.utcnow())
+    if error:
+        return jsonify({"error": error}), 400
+
+    status_code = 201
+    attempt = None
+    if values["idempotency_key"] is not None:
+        attempt = QuizAttempt.query.filter_by(
+            user_id=request.current_user.id,
+            idempotency_key=values["idempotency_key"]
+        ).first()
+        if attempt:
+            status_code = 200
+
+    if attempt is None:
+        attempt = QuizAttempt(**values)
+        try:
+            with db.session.begin_nested():
+                db.session.add(attempt)
+                db.session.flush()  # rollups need attempt.id
+        except IntegrityError:
+            # a concurrent request with the same key stored it first; return that row
+            db.session.rollback()
+            if values["idempotency_key"] is None:
+                raise  # not a key conflict
+            attempt = QuizAttempt.query.filter_by(
+                user_id=request.current_user.id,
+                idempotency_key=values["idempotency_key"]
+            ).first()
+            if attempt is None:
+                raise
+            status_code = 200
+        else:
+            on_attempt_submitted(attempt)
+            db.session.commit()
+
+    return jsonify({
+        "id": attempt.id,
+        "quiz_id": attempt.quiz_id,
+        "score": attempt.score,
+        "total_questions": attempt.total_questions,
+        "percentage": attempt.percentage,
+        "timestamp": attempt.timestamp.isoformat(),
+        "duration_seconds": attempt.duration_seconds,
+        "question_order": attempt.question_order,
+        "answers_detail": attempt.answers_detail,
+    }), status_code
+
+
+@app.route("/results/batch", methods=["POST"])
+@token_required
+def create_results_batch():
+    """
+    Ingest queued attempts from offline clients in one transaction.
+    Body: { "items": [ {<same fields as POST /results>, "idempotency_key": "..."}, ... ] }
+    Each item reports status created / duplicate / invalid. Items whose
+    idempotency_key was already stored are returned as duplicates, not re-inserted.
+    """
+    data = request.get_json() or {}
+    items = data.get("items")
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "items must be a non-empty list"}), 400
+    if len(items) > RESULTS_BATCH_MAX:
+        return jsonify({"error": f"At most {RESULTS_BATCH_MAX} items per batch"}), 400
+
+    user_id = request.current_user.id
+    now = datetime.utcnow()
+    results = [None] * len(items)
+    parsed = []  # (position, values)
+    for position, item in enumerate(items):
+        values, error = parse_result_payload(item, user_id, now)
+        if error:
+            results[position] = {"index": position, "status": "invalid", "error": error}
+        else:
+            parsed.append((position, values))
+
+    keys = {v["idempotency_key"] for _, v in parsed if v["idempotency_key"] is not None}
+    existing = {}
+    if keys:
+        existing = dict(
+            db.session.query(QuizAttempt.idempotency_key, QuizAttempt.id)
+            .filter(QuizAttempt.user_id == user_id, QuizAttempt.idempotency_key.in_(keys))
+            .all()
+        )
+
+    to_insert = []
+    seen_keys = set()
+    for position, values in parsed:
+        key = values["idempotency_key"]
+        if key is not None and (key in existing or key in seen_keys):
+            results[position] = {"index": position, "status": "duplicate", "id": existing.get(key), "idempotency_key": key}
+            continue
+        if key is not None:
+            seen_keys.add(key)
+        to_insert.append((position, values))
+
+    if to_insert:
+        try:
+            inserted_ids = db.session.execute(
+                insert(QuizAttempt).returning(QuizAttempt.id, sort_by_parameter_order=True),
+                [values for _, values in to_insert],
+            ).scalars().all()
+        except IntegrityError:
+            # a concurrent request stored one of these keys first; a retry will report it as duplicate
+            db.session.rollback()
+            batch_keys = [values["idempotency_key"] for _, values in to_insert if values["idempotency_key"] is not None]
+            if not batch_keys or not (
+                db.session.query(QuizAttempt.id)
+                .filter(QuizAttempt.user_id == user_id, QuizAttempt.idempotency_key.in_(batch_keys))
+                .first()
+            ):
+                raise  # not a key conflict
+            return jsonify({"error": "Conflicting concurrent submission, please retry"}), 409
+
+        for (position, values), attempt_id in zip(to_insert, inserted_ids):
+            on_attempt_submitted(SimpleNamespace(id=attempt_id, **values))
+            results[position] = {"index": position, "status": "created", "id": attempt_id, "idempotency_key": values["idempotency_key"]}
+
+        db.session.commit()
+
+    # a duplicate of a key first seen in this batch points at the row just created
+    created_by_key = {r["idempotency_key"]: r["id"] for r in results if r and r["status"] == "created"}
+    for r in results:
+        if r["status"] == "duplicate" and r["id"] is None:
+            r["id"] = created_by_key.get(r["idempotency_key"])
+
+    return jsonify({
+        "created": sum(1 for r in results if r["status"] == "created"),
+        "duplicates": sum(1 for r in results if r["status"] == "duplicate"),
+        "invalid": sum(1 for r in results if r["status"] == "invalid"),
+        "results": results,
+    }), 200
+
+
+# -------------------------
+# Attempt history paging
+# -------------------------
+HISTORY_PAGE_MAX_LIMIT = 100
+
+
+def summary_only(query):
+    """Leave the large JSON columns out of the SELECT."""
+    return query.options(
+        defer(QuizAttempt.question_order),
+        defer(QuizAttempt.answers_detail),
+        defer(QuizAttempt.answer_key),
+    )
+
+
+def keyset_page(query, cursor, limit):
+    """
+    One page of attempts, newest first, keyed on (timestamp, id).
+    Returns (attempts, next_cursor); raises ValueError for a bad cursor or limit.
+    """
+    limit = min(int(limit or HISTORY_PAGE_MAX_LIMIT), HISTORY_PAGE_MAX_LIMIT)
+    if limit <= 0:
+        raise ValueError("limit must be greater than zero")
+
+    if cursor:
+        state = decode_cursor(cursor)
+        try:
+            last_ts = datetime.fromisoformat(state["ts"])
+            last_id = int(state["id"])
+        except (KeyError, TypeError):
+            raise ValueError("invalid cursor")
+        query = query.filter(or_(
+            QuizAttempt.timestamp < last_ts,
+            and_(QuizAttempt.timestamp == last_ts, QuizAttempt.id < last_id),
+        ))
+
+    attempts = (
+        query.order_by(QuizAttempt.timestamp.desc(), QuizAttempt.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+
+    next_cursor = None
+    if len(attempts) > limit:
+        attempts = attempts[:limit]
+        last = attempts[-1]
+        next_cursor = encode_cursor({"ts": last.timestamp.isoformat(), "id": last.id})
+    return attempts, next_cursor
+
+
+def result_payload(a, summary=False, question_map=None):
+    payload = {
+        "id": a.id,
+        "quiz_id": a.quiz_id,
+        "score": a.score,
+        "total_questions": a.total_questions,
+        "percentage": a.percentage,
+        "timestamp": a.timestamp.isoformat(),
+        "duration_seconds": a.duration_seconds,
+    }
+    if not summary:
+        payload["question_order"] = a.question_order
+        payload["answers_detail"] = render_answers_detail(a, question_map)
+    return payload
+
+
+@app.route("/results", methods=["GET"])
+@token_required
+def list_results():
+    """
+    Return submitted attempts for the authenticated user.
+    Optional: view=summary (no question_order/answers_detail), limit and cursor
+    for keyset pages ({"items": [...], "next_cursor": ...}).
+    """
+    quiz_id = request.args.get("quiz_id")
+    query = QuizAttempt.query.filter_by(user_id=request.current_user.id, status="submitted")
+
+    if quiz_id is not None:
+        try:
+            quiz_id_int = int(quiz_id)
+            query = query.filter_by(quiz_id=quiz_id_int)
+        except ValueError:
+            return jsonify({"error": "quiz_id must be numeric"}), 400
+
+    summary = request.args.get("view") == "summary"
+    if summary:
+        query = summary_only(query)
+
+    if "cursor" in request.args or "limit" in request.args:
+        try:
+            attempts, next_cursor = keyset_page(query, request.args.get("cursor"), request.args.get("limit"))
+        except ValueError:
+            return jsonify({"error": "Invalid limit or cursor"}), 400
+        question_map = {} if summary else prefetch_attempt_questions(attempts)
+        return jsonify({
+            "items": [result_payload(a, summary, question_map) for a in attempts],
+            "next_cursor": next_cursor,
+        })
+
+    attempts = query.order_by(QuizAttempt.timestamp.desc()).all()
+    question_map = {} if summary else prefetch_attempt_questions(attempts)
+    return jsonify([result_payload(a, summary, question_map) for a in attempts])
+
+
+@app.route("/results/<int:attempt_id>", methods=["GET"])
+@token_required
+def get_result(attempt_id):
+    """Full detail (answers_detail included) for one submitted attempt."""
+    attempt = QuizAttempt.query.filter_by(
+        id=attempt_id,
+        user_id=request.current_user.id,
+        status="submitted"
+    ).first()
+    if not attempt:
+        return jsonify({"error": "Attempt not found"}), 404
+
+    return jsonify({**result_payload(attempt), "difficulty": attempt.difficulty, "status": attempt.status})
+
+
+# -------------------------
+# Streaming attempt export
+# -------------------------
+EXPORT_YIELD_PER = 1000
+EXPORT_COLUMNS = [
+    "id", "user_id", "quiz_id", "status", "difficulty", "score", "total_questions",
+    "percentage", "timestamp", "started_at", "duration_seconds", "question_order", "answers_detail",
+]
+
+
+def _export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+@app.route("/results/export", methods=["GET"])
+@token_required
+def export_results():
+    """
+    Stream attempt history as NDJSON (default) or CSV with bounded memory.
+    Query params: format=ndjson|csv, quiz_id, status (default submitted, "all" for any),
+    since/until (ISO timestamps), user_id (admins only; others always get their own).
+    """
+    args = request.args
+    fmt = args.get("format", "ndjson")
+    if fmt not in ("ndjson", "csv"):
+        return jsonify({"error": "format must be ndjson or csv"}), 400
+
+    # answer_key is only read to render compact answers_detail
+    columns = [getattr(QuizAttempt, c) for c in EXPORT_COLUMNS] + [QuizAttempt.answer_key]
+    query = db.session.query(*columns)
+
+    try:
+        if request.current_user.role == "admin":
+            if args.get("user_id") is not None:
+                query = query.filter(QuizAttempt.user_id == int(args["user_id"]))
+        else:
+            query = query.filter(QuizAttempt.user_id == request.current_user.id)
+        if args.get("quiz_id") is not None:
+            query = query.filter(QuizAttempt.quiz_id == int(args["quiz_id"]))
+        if args.get("since"):
+            query = query.filter(QuizAttempt.timestamp >= datetime.fromisoformat(args["since"]))
+        if args.get("until"):
+            query = query.filter(QuizAttempt.timestamp < datetime.fromisoformat(args["until"]))
+    except ValueError:
+        return jsonify({"error": "user_id/quiz_id must be numeric and since/until ISO timestamps"}), 400
+
+    status = args.get("status", "submitted")
+    if status != "all":
+        query = query.filter(QuizAttempt.status == status)
+
+    # yield_per streams rows through a server-side cursor on PostgreSQL
+    rows = query.order_by(QuizAttempt.id.asc()).execution_options(yield_per=EXPORT_YIELD_PER)
+
+    def export_chunks():
+        """Records EXPORT_YIELD_PER at a time, with one question lookup per chunk."""
+        chunk = []
+        for row in rows:
+            chunk.append(SimpleNamespace(**dict(zip(EXPORT_COLUMNS + ["answer_key"], row))))
+            if len(chunk) >= EXPORT_YIELD_PER:
+                yield export_records(chunk)
+                chunk = []
+        if chunk:
+            yield export_records(chunk)
+
+    def export_records(attempts):
+        question_map = prefetch_attempt_questions(attempts)
+        records = []
+        for attempt in attempts:
+            record = vars(attempt)
+            record["answers_detail"] = render_answers_detail(attempt, question_map)
+            del record["answer_key"]
+            records.append(record)
+        return records
+
+    def generate_ndjson():
+        for records in export_chunks():
+            yield "\n".join(
+                json.dumps({c: _export_value(v) for c, v in record.items()}) for record in records
+            ) + "\n"
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        for records in export_chunks():
+            for record in records:
+                writer.writerow([
+                    json.dumps(v) if isinstance(v, (list, dict)) else _export_value(v)
+                    for v in record.values()
+                ])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+        yield buffer.getvalue()
+
+    if fmt == "csv":
+        body, mimetype = generate_csv(), "text/csv"
+    else:
+        body, mimetype = generate_ndjson(), "application/x-ndjson"
+
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename=attempts.{fmt}"
+    return response
+
+
+# -------------------------
+# Submit-time rollups
+# -------------------------
+def on_attempt_submitted(attempt):
+    """
+    Update every rollup for a newly submitted attempt, inside the caller's
+    transaction. `attempt` only needs the QuizAttempt column attributes.
+    """
+    record_user_quiz_stats(attempt)
+    record_user_quiz_model(attempt)
+    record_user_activity(attempt)
+    record_weekly_leaderboard(attempt)
+    invalidate_prediction_cache(attempt.user_id, attempt.quiz_id)
+
+
+def record_user_quiz_stats(attempt):
+    """Fold one submitted attempt into user_quiz_stats with an atomic UPDATE (INSERT on first attempt)."""
+    pct = attempt.percentage
+    values = {
+        UserQuizStats.attempts: UserQuizStats.attempts + 1,
+        UserQuizStats.total_correct: UserQuizStats.total_correct + (attempt.score or 0),
+        UserQuizStats.total_questions: UserQuizStats.total_questions + (attempt.total_questions or 0),
+    }
+    if pct is not None:
+        is_latest = (UserQuizStats.latest_timestamp.is_(None)) | (UserQuizStats.latest_timestamp <= attempt.timestamp)
+        values.update({
+            UserQuizStats.percentage_sum: UserQuizStats.percentage_sum + pct,
+            UserQuizStats.percentage_count: UserQuizStats.percentage_count + 1,
+            UserQuizStats.best_percentage: case(
+                ((UserQuizStats.best_percentage.is_(None)) | (UserQuizStats.best_percentage < pct), pct),
+                else_=UserQuizStats.best_percentage,
+            ),
+            UserQuizStats.latest_percentage: case((is_latest, pct), else_=UserQuizStats.latest_percentage),
+            UserQuizStats.latest_attempt_id: case((is_latest, attempt.id), else_=UserQuizStats.latest_attempt_id),
+            UserQuizStats.latest_timestamp: case((is_latest, attempt.timestamp), else_=UserQuizStats.latest_timestamp),
+        })
+
+    def apply_update():
+        return db.session.execute(
+            update(UserQuizStats)
+            .where(UserQuizStats.user_id == attempt.user_id, UserQuizStats.quiz_id == attempt.quiz_id)
+            .values(values)
+        ).rowcount
+
+    if apply_update():
+        return
+
+    try:
+        with db.session.begin_nested():
+            db.session.add(UserQuizStats(
+                user_id=attempt.user_id,
+                quiz_id=attempt.quiz_id,
+                attempts=1,
+                percentage_sum=pct or 0.0,
+                percentage_count=1 if pct is not None else 0,
+                best_percentage=pct,
+                latest_percentage=pct,
+                latest_timestamp=attempt.timestamp if pct is not None else None,
+                latest_attempt_id=attempt.id if pct is not None else None,
+                total_correct=attempt.score or 0,
+                total_questions=attempt.total_questions or 0,
+            ))
+    except IntegrityError:
+        # another worker inserted the row first
+        apply_update()
+
+
+def aggregate_user_quiz_stats(user_id=None):
+    """
+    The same rollup computed from quiz_attempt in a single statement.
+    Used to rebuild user_quiz_stats and to cross-check it.
+    """
+    latest = db.aliased(QuizAttempt)
+    a = db.aliased(QuizAttempt)
+
+    def latest_of(column):
+        return (
+            db.session.query(column)
+            .filter(
+                latest.user_id == a.user_id,
+                latest.quiz_id == a.quiz_id,
+                latest.status == "submitted",
+                latest.percentage.isnot(None),
+            )
+            .order_by(latest.timestamp.desc(), latest.id.desc())
+            .limit(1)
+            .correlate(a)
+            .scalar_subquery()
+        )
+
+    query = (
+        db.session.query(
+            a.user_id,
+            a.quiz_id,
+            func.count(a.id),
+            func.coalesce(func.sum(a.percentage), 0.0),
+            func.count(a.percentage),
+            func.max(a.percentage),
+            latest_of(latest.percentage),
+            latest_of(latest.timestamp),
+            latest_of(latest.id),
+            func.coalesce(func.sum(a.score), 0),
+            func.coalesce(func.sum(a.total_questions), 0),
+        )
+        .filter(a.status == "submitted")
+        .group_by(a.user_id, a.quiz_id)
+    )
+    if user_id is not None:
+        query = query.filter(a.user_id == user_id)
+
+    columns = [
+        "user_id", "quiz_id", "attempts", "percentage_sum", "percentage_count", "best_percentage",
+        "latest_percentage", "latest_timestamp", "latest_attempt_id", "total_correct", "total_questions",
+    ]
+    return [dict(zip(columns, row)) for row in query.all()]
+
+
+def rebuild_user_quiz_stats(user_id=None):
+    """Replace user_quiz_stats (for one user or everyone) with the SQL aggregate. Caller commits."""
+    rows = aggregate_user_quiz_stats(user_id)
+    delete_query = UserQuizStats.query
+    if user_id is not None:
+        delete_query = delete_query.filter_by(user_id=user_id)
+    delete_query.delete(synchronize_session=False)
+    if rows:
+        db.session.execute(insert(UserQuizStats), rows)
+    return len(rows)
+
+
+# -------------------------
+# Activity calendar and streaks
+# -------------------------
+# Streaks used to be counted by sorting a user's whole attempt list. They only
+# change when an attempt is submitted, so user_activity_day counts attempts per
+# UTC day and user_activity keeps the streaks derived from it. An attempt dated
+# before the last active day that opens a new day can split or join runs, so
+# that user's streaks are recomputed from their day rows instead; a user with no
+# activity row yet is built from their history.
+#
+# Batch paths (write_submission_batch, grade_batch, /results/batch) write all
+# their attempts before running the hooks, so that history build already counts
+# the user's later attempts in the batch. Their ids are kept in session.info for
+# the rest of the transaction and record_user_activity skips them.
+ACTIVITY_CALENDAR_MAX_DAYS = 366
+ACTIVITY_COUNTED_KEY = "activity_counted_attempt_ids"
+
+
+ACTIVITY_FIELDS = (
+    "first_active_date", "last_active_date", "current_streak", "longest_streak", "active_days", "total_attempts",
+)
 
-    if total_questions <= 0:
-        return jsonify({"error": "total_questions must be greater than zero"}), 400
 
-    question_order = data.get("question_order") or []
-    if not isinstance(question_order, list):
-        return jsonify({"error": "question_order must be a list"}), 400
+def add_active_day(activity, day):
+    """Append a day later than any the activity has seen (same day doesn't count twice)."""
+    if activity.last_active_date is None or (day - activity.last_active_date).days > 1:
+        activity.current_streak = 1
+    else:
+        activity.current_streak += 1
+    activity.longest_streak = max(activity.longest_streak, activity.current_streak)
+    activity.first_active_date = activity.first_active_date or day
+    activity.last_active_date = day
+    activity.active_days += 1
 
-    answers_detail = data.get("answers_detail")
-    duration_seconds = data.get("duration_seconds")
 
-    percentage = (score / total_questions) * 100
-    timestamp = datetime.utcnow()
-    difficulty=data.get("difficulty")
-    attempt = QuizAttempt(
-        quiz_id=quiz_id,
-        user_id=request.current_user.id,
-        score=score,
-        total_questions=total_questions,
-        percentage=percentage,
-        timestamp=timestamp,
-        started_at=timestamp - timedelta(seconds=int(duration_seconds)) if duration_seconds else timestamp,
-        duration_seconds=int(duration_seconds) if duration_seconds is not None else None,
-        question_order=question_order,
-        answers_detail=answers_detail,
-        status="submitted",
-        difficulty=(difficulty.strip().title() if isinstance(difficulty,str) else  None),
+def fold_activity_days(user_id, days):
+    """UserActivity for one user from ascending (day, attempts) pairs. Not added to the session."""
+    activity = UserActivity(
+        user_id=user_id, current_streak=0, longest_streak=0, active_days=0, total_attempts=0,
     )
+    for day, attempts in days:
+        add_active_day(activity, day)
+        activity.total_attempts += attempts
+    return activity
+
+
+def activity_days_query(user_ids=None):
+    """(user_id, day, attempts) for submitted attempts, aggregated in SQL."""
+    day = func.date(QuizAttempt.timestamp, type_=db.Date)
+    query = (
+        db.session.query(QuizAttempt.user_id, day, func.count(QuizAttempt.id))
+        .filter(QuizAttempt.status == "submitted", QuizAttempt.timestamp.isnot(None))
+    )
+    if user_ids is not None:
+        query = query.filter(QuizAttempt.user_id.in_(list(user_ids)))
+    return query.group_by(QuizAttempt.user_id, day).order_by(QuizAttempt.user_id, day)
 
-    db.session.add(attempt)
-    db.session.commit()
 
-    return jsonify({
-        "id": attempt.id,
-        "quiz_id": attempt.quiz_id,
-        "score": attempt.score,
-        "total_questions": attempt.total_questions,
-        "percentage": attempt.percentage,
-        "timestamp": attempt.timestamp.isoformat(),
-        "duration_seconds": attempt.duration_seconds,
-        "question_order": attempt.question_order,
-        "answers_detail": attempt.answers_detail,
-    }), 201
+@event.listens_for(db.session, "after_transaction_end")
+def _forget_counted_activity(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(ACTIVITY_COUNTED_KEY, None)
 
 
-@app.route("/results", methods=["GET"])
-@token_required
-def list_results():
-    """Return submitted attempts for the authenticated user."""
-    quiz_id = request.args.get("quiz_id")
-    query = QuizAttempt.query.filter_by(user_id=request.current_user.id, status="submitted")
+def lock_user_activity(user_id):
+    return UserActivity.query.filter_by(user_id=user_id).with_for_update().first()
 
-    if quiz_id is not None:
+
+def record_user_activity(attempt):
+    """Count a newly submitted attempt in the user's calendar and streaks, inside the caller's transaction."""
+    if attempt.timestamp is None:
+        return
+    if attempt.id in db.session.info.get(ACTIVITY_COUNTED_KEY, ()):
+        return  # built from history earlier in this transaction
+    day = attempt.timestamp.date()
+
+    activity = lock_user_activity(attempt.user_id)
+    if activity is None:
+        # first attempt since the table was added: the history already includes this one
         try:
-            quiz_id_int = int(quiz_id)
-            query = query.filter_by(quiz_id=quiz_id_int)
-        except ValueError:
-            return jsonify({"error": "quiz_id must be numeric"}), 400
+            with db.session.begin_nested():
+                rebuild_user_activity([attempt.user_id])
+            counted = db.session.query(QuizAttempt.id).filter(
+                QuizAttempt.user_id == attempt.user_id,
+                QuizAttempt.status == "submitted",
+                QuizAttempt.timestamp.isnot(None),
+            )
+            db.session.info.setdefault(ACTIVITY_COUNTED_KEY, set()).update(row.id for row in counted)
+            return
+        except IntegrityError:
+            # another worker created the rows first; count this attempt on top of them
+            activity = lock_user_activity(attempt.user_id)
+
+    # the locked activity row serializes this user's day rows too
+    new_day = not db.session.execute(
+        update(UserActivityDay)
+        .where(UserActivityDay.user_id == attempt.user_id, UserActivityDay.day == day)
+        .values(attempts=UserActivityDay.attempts + 1)
+    ).rowcount
+    if new_day:
+        db.session.add(UserActivityDay(user_id=attempt.user_id, day=day, attempts=1))
+
+    activity.total_attempts += 1
+    if not new_day:
+        return
+    if activity.last_active_date is not None and day < activity.last_active_date:
+        db.session.flush()
+        days = (
+            db.session.query(UserActivityDay.day, UserActivityDay.attempts)
+            .filter_by(user_id=attempt.user_id)
+            .order_by(UserActivityDay.day)
+            .all()
+        )
+        fresh = fold_activity_days(attempt.user_id, days)
+        for field in ACTIVITY_FIELDS:
+            setattr(activity, field, getattr(fresh, field))
+        return
+    add_active_day(activity, day)
+
+
+def rebuild_user_activity(user_ids=None):
+    """Replace user_activity(_day) (for some users or everyone) from one SQL aggregate. Caller commits."""
+    # take the row locks record_user_activity takes before reading any attempts,
+    # so a concurrent submit is either in the aggregate or waits and counts itself
+    locked = db.session.query(UserActivity.user_id)
+    if user_ids is not None:
+        locked = locked.filter(UserActivity.user_id.in_(list(user_ids)))
+    locked.with_for_update().all()
+
+    for model in (UserActivity, UserActivityDay):
+        delete_query = model.query
+        if user_ids is not None:
+            delete_query = delete_query.filter(model.user_id.in_(list(user_ids)))
+        delete_query.delete(synchronize_session=False)
+
+    grouped = defaultdict(list)
+    for uid, day, attempts in activity_days_query(user_ids).all():
+        grouped[uid].append((day, attempts))
+
+    if grouped:
+        db.session.execute(insert(UserActivityDay), [
+            {"user_id": uid, "day": day, "attempts": attempts}
+            for uid, days in grouped.items() for day, attempts in days
+        ])
+    for uid, days in grouped.items():
+        db.session.add(fold_activity_days(uid, days))
+    return len(grouped)
+
+
+def activity_payload(activity):
+    if activity is None:
+        return {
+            "first_active_date": None, "last_active_date": None, "current_streak": 0,
+            "longest_streak": 0, "active_days": 0, "total_attempts": 0,
+        }
+    return {
+        "first_active_date": activity.first_active_date.isoformat() if activity.first_active_date else None,
+        "last_active_date": activity.last_active_date.isoformat() if activity.last_active_date else None,
+        "current_streak": activity.current_streak,
+        "longest_streak": activity.longest_streak,
+        "active_days": activity.active_days,
+        "total_attempts": activity.total_attempts,
+    }
 
-    attempts = query.order_by(QuizAttempt.timestamp.desc()).all()
 
-    payload = []
-    for a in attempts:
-        payload.append({
-            "id": a.id,
-            "quiz_id": a.quiz_id,
-            "score": a.score,
-            "total_questions": a.total_questions,
-            "percentage": a.percentage,
-            "timestamp": a.timestamp.isoformat(),
-            "duration_seconds": a.duration_seconds,
-            "question_order": a.question_order,
-            "answers_detail": a.answers_detail,
-        })
-    return jsonify(payload)
+@app.route("/results/activity", methods=["GET"])
+@token_required
+def results_activity():
+    """Streaks plus attempts per day over the last `days` days (default 30) for the authenticated user."""
+    try:
+        days = int(request.args.get("days", 30))
+    except ValueError:
+        return jsonify({"error": "days must be numeric"}), 400
+    days = max(1, min(days, ACTIVITY_CALENDAR_MAX_DAYS))
+
+    user_id = request.current_user.id
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    calendar = (
+        UserActivityDay.query
+        .filter(UserActivityDay.user_id == user_id, UserActivityDay.day >= since)
+        .order_by(UserActivityDay.day)
+        .all()
+    )
+    return jsonify({
+        **activity_payload(UserActivity.query.get(user_id)),
+        "calendar": [{"date": d.day.isoformat(), "attempts": d.attempts} for d in calendar],
+    })
 
 
 @app.route("/results/stats", methods=["GET"])
@@ -718,7 +3125,7 @@ def list_results():
 def results_stats():
     """Return aggregate stats for the authenticated user (optionally filtered by quiz)."""
     quiz_id = request.args.get("quiz_id")
-    query = QuizAttempt.query.filter_by(user_id=request.current_user.id, status="submitted")
+    query = UserQuizStats.query.filter_by(user_id=request.current_user.id)
 
     if quiz_id is not None:
         try:
@@ -727,8 +3134,8 @@ def results_stats():
         except ValueError:
             return jsonify({"error": "quiz_id must be numeric"}), 400
 
-    attempts = query.order_by(QuizAttempt.timestamp.desc()).all()
-    if not attempts:
+    rollups = [r for r in query.all() if r.attempts]
+    if not rollups:
         return jsonify({
             "attempts": 0,
             "average_percentage": None,
@@ -738,21 +3145,25 @@ def results_stats():
             "total_questions": 0,
         })
 
-    percentages = [a.percentage for a in attempts if a.percentage is not None]
-    scores = [a.score for a in attempts if a.score is not None]
-    totals = [a.total_questions for a in attempts if a.total_questions is not None]
+    percentage_count = sum(r.percentage_count for r in rollups)
+    bests = [r.best_percentage for r in rollups if r.best_percentage is not None]
+    latest = max(
+        (r for r in rollups if r.latest_timestamp is not None),
+        key=lambda r: (r.latest_timestamp, r.latest_attempt_id or 0),
+        default=None,
+    )
 
-    average_pct = sum(percentages) / len(percentages) if percentages else None
-    best_pct = max(percentages) if percentages else None
-    latest_pct = percentages[0] if percentages else None
+    average_pct = sum(r.percentage_sum for r in rollups) / percentage_count if percentage_count else None
+    best_pct = max(bests) if bests else None
+    latest_pct = latest.latest_percentage if latest else None
 
     return jsonify({
-        "attempts": len(attempts),
+        "attempts": sum(r.attempts for r in rollups),
         "average_percentage": round(average_pct, 2) if average_pct is not None else None,
         "best_percentage": round(best_pct, 2) if best_pct is not None else None,
         "latest_percentage": round(latest_pct, 2) if latest_pct is not None else None,
-        "total_correct": sum(scores),
-        "total_questions": sum(totals),
+        "total_correct": sum(r.total_correct for r in rollups),
+        "total_questions": sum(r.total_questions for r in rollups),
     })
 
 # -------------------------
@@ -768,89 +3179,69 @@ def create_synthetic_quiz_for_attempt(quiz_title):
 # Ensure folder exists for CSVs
 os.makedirs("ml_datasets", exist_ok=True)
 
+# the endpoint generates inside the request, so it stays small enough to finish
+# in a second or two; bigger training sets come from `python synthetic.py`
+SYNTHETIC_MAX_ROWS = int(os.environ.get("SYNTHETIC_MAX_ROWS", 200_000))
+
+
 @app.route("/module3/generate_synthetic", methods=["POST"])
 @token_required
 def generate_synthetic():
     """
-    Generate synthetic QuizAttempt records in memory (DB-free) for ML.
+    Generate synthetic QuizAttempt-shaped rows (DB-free) for ML into ml_datasets/.
     Body JSON (optional):
       {
-        "n": 10,
-        "base": 60,
-        "trend": 1.5,
-        "noise": 6,
-        "pattern": "linear",   # linear, quadratic, sinusoidal, plateau
-        "total_questions": 17,
+        "users": 1000,         # synthetic users, each following one pattern
+        "n": 30,               # attempts per user
+        "patterns": ["linear", "quadratic", "sinusoidal", "plateau"],
+        "pattern": "linear",   # shorthand for a single pattern
+        "seed": 42,
+        "format": "csv",       # csv or parquet (needs pyarrow)
+        "base": 60, "trend": 1.5, "noise": 6, "total_questions": 17,
+        "curvature": 0.5, "amplitude": 10, "frequency": 0.5, "growth": 0.3,
+        "base_spread": 10, "trend_spread": 0.5, "difficulty_penalty": 5,  # 0 when users is 1
         "quiz_id": "SYN-xxxxxx"  # optional, if not provided a new one will be generated
       }
-    Returns JSON with all columns of QuizAttempt.
+    Rows are generated in vectorized chunks and streamed to the file; the
+    response is only a summary. users * n is capped at SYNTHETIC_MAX_ROWS;
+    larger datasets go through synthetic.py on the command line.
     """
     data = request.get_json() or {}
-    n = int(data.get("n", 10))
-    base = float(data.get("base", 60.0))
-    trend = float(data.get("trend", 1.0))
-    noise = float(data.get("noise", 5.0))
-    pattern = data.get("pattern", "linear")
-    total_q = int(data.get("total_questions", 20))
-    current_user = request.current_user
+    try:
+        users = int(data.get("users", 1))
+        n = int(data.get("n", 10))
+        seed = int(data["seed"]) if data.get("seed") is not None else None
+        params = {k: float(data[k]) for k in DEFAULT_SYNTHETIC_PARAMS if data.get(k) is not None}
+    except (TypeError, ValueError):
+        return jsonify({"error": "users, n, seed and pattern parameters must be numbers"}), 400
+
+    patterns = data.get("patterns") or [data.get("pattern", "linear")]
+    if isinstance(patterns, str):
+        patterns = list(SYNTHETIC_PATTERNS) if patterns == "all" else [patterns]
+    fmt = data.get("format", "csv")
+
+    if users * n > SYNTHETIC_MAX_ROWS:
+        return jsonify({"error": f"At most {SYNTHETIC_MAX_ROWS} rows per request; use synthetic.py for more"}), 400
 
     # Use provided quiz_id or generate a new one
     quiz_id_base = data.get("quiz_id")
     if quiz_id_base is None:
         quiz_id_base = f"SYN-{uuid.uuid4().hex[:6]}"
 
-    created = []
-    start_time = datetime.utcnow() - timedelta(days=n)
-
-    for i in range(n):
-        # Unique attempt ID per quiz
-        quiz_id = f"{quiz_id_base}-{i}"
-
-        # Generate percentage according to pattern
-        if pattern == "linear":
-            pct = base + trend * i
-        elif pattern == "quadratic":
-            curvature = data.get("curvature", 0.5)
-            pct = base + trend * i + curvature * (i ** 2)
-        elif pattern == "sinusoidal":
-            amplitude = data.get("amplitude", 10.0)
-            frequency = data.get("frequency", 0.5)
-            pct = base + amplitude * math.sin(frequency * i)
-        elif pattern == "plateau":
-            growth = data.get("growth", 0.3)
-            midpoint = n / 2
-            pct = 100 / (1 + math.exp(-growth * (i - midpoint)))
-        else:
-            pct = base + trend * i
-
-        # Add Gaussian noise
-        pct += np.random.normal(0, noise)
-        pct = max(0.0, min(100.0, pct))  # clamp to [0,100]
-        score = int(round((pct / 100.0) * total_q))
-
-        attempt_data = {
-            "id": i + 1,
-            "quiz_id": quiz_id,
-            "user_id": current_user.id,
-            "score": score,
-            "total_questions": total_q,
-            "percentage": round(pct, 2),
-            "timestamp": (start_time + timedelta(days=i)).isoformat(),
-            "question_order": list(range(1, total_q + 1)),
-            "status": "submitted"
-        }
-        created.append(attempt_data)
-
-    # Save CSV for ML, per user per quiz
-    csv_file = f"ml_datasets/user_{current_user.id}_quiz_{quiz_id_base}.csv"
-    df = pd.DataFrame(created)
-    df.to_csv(csv_file, index=False)
+    # the quiz id is caller-controlled; keep it from escaping ml_datasets/
+    safe_quiz_id = re.sub(r"[^A-Za-z0-9_-]", "_", str(quiz_id_base))[:64]
+    dataset_file = f"ml_datasets/user_{request.current_user.id}_quiz_{safe_quiz_id}.{fmt}"
+    try:
+        summary = write_synthetic_dataset(
+            dataset_file, users, n, patterns=patterns, seed=seed, fmt=fmt, params=params, quiz_id=quiz_id_base,
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     return jsonify({
-        "message": f"Generated {len(created)} synthetic attempts (not saved to DB)",
-        "dataset_file": csv_file,
-        "samples": len(created),
-        "created": created
+        "message": f"Generated {summary['samples']} synthetic attempts (not saved to DB)",
+        "quiz_id": quiz_id_base,
+        **summary,
     }), 200
 
 # -------------------------------
@@ -865,17 +3256,6 @@ def fit_linear_regression(x, y):
     a, b = np.polyfit(x, y, 1)
     return {"slope": float(a), "intercept": float(b)}
 
-# -------------------------------
-# Regression metrics
-# -------------------------------
-def regression_metrics(y_true, y_pred):
-    y_true = np.array(y_true, dtype=float)
-    y_pred = np.array(y_pred, dtype=float)
-    mse = np.mean((y_true - y_pred) ** 2)
-    rmse = np.sqrt(mse)
-    mae = np.mean(np.abs(y_true - y_pred))
-    return {"mse": round(float(mse), 4), "rmse": round(float(rmse), 4), "mae": round(float(mae), 4)}
-
 # -------------------------------
 # Train/test split
 # -------------------------------
@@ -919,33 +3299,6 @@ def recommend_difficulty_from_percentage(pct):
 # -------------------------------
 # ✅ Add these helper functions somewhere ABOVE /predict (once)
 
-def confidence_level(attempt_count: int, percentages: np.ndarray):
-    """
-    Returns a confidence label/score based on number of attempts + variability.
-    """
-    if attempt_count < 2:
-        return {"label": "Low", "score": 0.2, "reason": "Need at least 2 attempts"}
-
-    std = float(np.std(percentages)) if attempt_count >= 2 else 0.0
-
-    # base increases with attempts (caps at 0.85)
-    base = min(0.85, 0.35 + 0.10 * attempt_count)
-    # penalty increases with instability (caps at 0.5)
-    penalty = min(0.50, std / 30.0)
-
-    score = max(0.10, min(0.95, base - penalty))
-
-    if score >= 0.75:
-        label = "High"
-    elif score >= 0.45:
-        label = "Medium"
-    else:
-        label = "Low"
-
-    reason = f"{attempt_count} attempts, variability (std) ≈ {round(std, 2)}"
-    return {"label": label, "score": round(score, 2), "reason": reason}
-
-
 def trend_insight(percentages: np.ndarray):
     """
     Simple 'what this means' insight based on last change.
@@ -965,141 +3318,177 @@ def trend_insight(percentages: np.ndarray):
         return {"label": "Stable", "reason": "Small change recently"}
 
 
-def calculate_streak_from_attempts(attempts):
-    """
-    Counts consecutive-day streak from submitted attempts.
-    - multiple attempts same day do not break streak
-    """
-    if not attempts:
-        return 0
-
-    attempts_sorted = sorted(attempts, key=lambda x: x.timestamp, reverse=True)
-    streak = 1
-    last_date = attempts_sorted[0].timestamp.date()
-
-    for att in attempts_sorted[1:]:
-        cur_date = att.timestamp.date()
-        day_diff = (last_date - cur_date).days
-
-        if day_diff == 0:
-            # same day attempt - ignore
-            continue
-        if day_diff == 1:
-            streak += 1
-            last_date = cur_date
-            continue
-
-        break
-
-    return streak
-def difficulty_to_num(d):
-    if not d:
-        return 3  # default Medium
-    d = d.strip().title()
-    mapping = {"Very Easy": 1, "Easy": 2, "Medium": 3, "Hard": 4}
-    return mapping.get(d, 3)
-
-
+# -------------------------------
+# Prediction model state
+# -------------------------------
+# /predict used to reload the whole history and solve lstsq on every view. The
+# regression's sufficient statistics (plus the few summary numbers the response
+# shows) now live in user_quiz_model and are folded forward when an attempt is
+# submitted. An attempt that sorts before the latest one shifts every later
+# index, so that pair is recomputed from history instead.
+MODEL_HISTORY_COLUMNS = (
+    QuizAttempt.id, QuizAttempt.percentage, QuizAttempt.difficulty,
+    QuizAttempt.total_questions, QuizAttempt.timestamp,
+)
+MODEL_STATE_FIELDS = (
+    "attempts", "moments", "percentage_sum", "percentage_sq_sum", "best_percentage",
+    "last_percentage", "prev_percentage", "last_difficulty", "last_total_questions",
+    "last_timestamp", "last_attempt_id", "streak_days", "streak_last_date",
+)
 
 
-@app.route("/predict", methods=["GET"])
-@token_required
-def predict_next_score():
-    uid = request.args.get("user_id")
-    quiz_id = request.args.get("quiz_id")
-    goal = request.args.get("goal")  # optional, e.g. 80
+def model_history_query(user_id=None, quiz_id=None):
+    """Submitted, scored attempts in /predict order."""
+    query = QuizAttempt.query.filter(
+        QuizAttempt.status == "submitted",
+        QuizAttempt.percentage.isnot(None),
+    )
+    if user_id is not None:
+        query = query.filter(QuizAttempt.user_id == user_id)
+    if quiz_id is not None:
+        query = query.filter(QuizAttempt.quiz_id == quiz_id)
+    return query.order_by(QuizAttempt.timestamp.asc(), QuizAttempt.id.asc())
+
+
+def fold_attempt_into_model(state, moments, attempt):
+    """Append one attempt (the newest so far) to a model state and its decoded moments."""
+    pct = float(attempt.percentage)
+    state.attempts += 1
+    add_observation(moments, state.attempts, difficulty_to_num(attempt.difficulty), pct)
+
+    state.percentage_sum += pct
+    state.percentage_sq_sum += pct * pct
+    state.best_percentage = pct if state.best_percentage is None else max(state.best_percentage, pct)
+    state.prev_percentage = state.last_percentage
+    state.last_percentage = pct
+    state.last_difficulty = attempt.difficulty
+    state.last_total_questions = attempt.total_questions
+    state.last_timestamp = attempt.timestamp
+    state.last_attempt_id = attempt.id
+
+    # consecutive-day streak ending at the latest attempt (same day doesn't count twice)
+    if attempt.timestamp is not None:
+        day = attempt.timestamp.date()
+        if state.streak_last_date is None or (day - state.streak_last_date).days > 1:
+            state.streak_days = 1
+        elif (day - state.streak_last_date).days == 1:
+            state.streak_days += 1
+        state.streak_last_date = day
+
+
+def build_user_quiz_model(user_id, quiz_id, rows=None):
+    """Model state from the full history (recovery and verification path). Not added to the session."""
+    if rows is None:
+        rows = model_history_query(user_id, quiz_id).with_entities(*MODEL_HISTORY_COLUMNS).all()
+    state = UserQuizModel(
+        user_id=user_id, quiz_id=quiz_id, attempts=0,
+        percentage_sum=0.0, percentage_sq_sum=0.0, streak_days=0,
+    )
+    moments = empty_moments()
+    for row in rows:
+        fold_attempt_into_model(state, moments, row)
+    state.moments = moments_to_json(moments)
+    return state
+
+
+def appends_in_order(state, attempt):
+    if not state.attempts:
+        return True
+    if attempt.timestamp is None or state.last_timestamp is None:
+        return False
+    return (attempt.timestamp, attempt.id) > (state.last_timestamp, state.last_attempt_id)
+
+
+def lock_user_quiz_model(user_id, quiz_id):
+    return (
+        UserQuizModel.query
+        .filter_by(user_id=user_id, quiz_id=quiz_id)
+        .with_for_update()
+        .first()
+    )
 
-    if uid is None or quiz_id is None:
-        return jsonify({"error": "user_id and quiz_id query parameters required"}), 400
 
-    try:
-        uid = int(uid)
-        quiz_id = int(quiz_id)
-    except ValueError:
-        return jsonify({"error": "invalid user_id or quiz_id"}), 400
+def record_user_quiz_model(attempt):
+    """Fold a newly submitted attempt into user_quiz_model, inside the caller's transaction."""
+    if attempt.percentage is None:
+        return
 
-    if request.current_user.id != uid:
-        return jsonify({"error": "Unauthorized"}), 401
+    state = lock_user_quiz_model(attempt.user_id, attempt.quiz_id)
+    if state is not None and appends_in_order(state, attempt):
+        moments = moments_from_json(state.moments)
+        fold_attempt_into_model(state, moments, attempt)
+        state.moments = moments_to_json(moments)
+        return
 
-    quiz = Quiz.query.get(quiz_id)
-    quiz_title = quiz.title if quiz else f"Quiz #{quiz_id}"
-    quiz_description = quiz.description if quiz else ""
+    # first attempt for this pair, or out of order: the history already includes it
+    fresh = build_user_quiz_model(attempt.user_id, attempt.quiz_id)
+    if state is None:
+        try:
+            with db.session.begin_nested():
+                db.session.add(fresh)
+            return
+        except IntegrityError:
+            # another worker created the row first; lock it and recompute
+            state = lock_user_quiz_model(attempt.user_id, attempt.quiz_id)
+            fresh = build_user_quiz_model(attempt.user_id, attempt.quiz_id)
+    for field in MODEL_STATE_FIELDS:
+        setattr(state, field, getattr(fresh, field))
+
+
+def rebuild_user_quiz_models(user_id=None):
+    """Replace user_quiz_model (for one user or everyone) from one ordered scan. Caller commits."""
+    delete_query = UserQuizModel.query
+    if user_id is not None:
+        delete_query = delete_query.filter_by(user_id=user_id)
+    delete_query.delete(synchronize_session=False)
 
-    # ✅ IMPORTANT: do NOT filter by difficulty
-    attempts = (
-        QuizAttempt.query
-        .filter_by(user_id=uid, quiz_id=quiz_id, status="submitted")
-        .order_by(QuizAttempt.timestamp.asc(),QuizAttempt.id.asc())
+    rows = (
+        model_history_query(user_id)
+        .with_entities(QuizAttempt.user_id, QuizAttempt.quiz_id, *MODEL_HISTORY_COLUMNS)
+        .order_by(None)
+        .order_by(QuizAttempt.user_id, QuizAttempt.quiz_id, QuizAttempt.timestamp, QuizAttempt.id)
         .all()
     )
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[(row.user_id, row.quiz_id)].append(row)
+
+    for (uid, qid), history in grouped.items():
+        db.session.add(build_user_quiz_model(uid, qid, history))
+    return len(grouped)
+
+
+def prediction_gate_payload(attempts_found):
+    """Response for a quiz without enough attempts to fit."""
+    return {
+        "message": f"At least {PREDICTION_ATTEMPTS_REQUIRED} quiz attempts are required for prediction",
+        "attempts_found": attempts_found,
+        "attempts_required": PREDICTION_ATTEMPTS_REQUIRED,
+        "progress": round((attempts_found / PREDICTION_ATTEMPTS_REQUIRED) * 100, 0),
+    }
 
-    attempts_required = 2
-    if len(attempts) < attempts_required:
-        progress = round((len(attempts) / attempts_required) * 100, 0)
-        return jsonify({
-            "message": "At least 2 quiz attempts are required for prediction",
-            "attempts_found": len(attempts),
-            "attempts_required": attempts_required,
-            "progress": progress,
-            "user_id": uid,
-            "quiz_id": quiz_id,
-            "quiz": {"id": quiz_id, "title": quiz_title, "description": quiz_description}
-        }), 200
-
-    # y = percentage
-    y = np.array([float(a.percentage) for a in attempts], dtype=float)
-
-    # x1 = attempt index
-    x1 = np.arange(1, len(y) + 1, dtype=float)
-
-    # x2 = difficulty numeric
-    x2 = np.array([difficulty_to_num(getattr(a, "difficulty", None)) for a in attempts], dtype=float)
-
-    # Weighted regression to react to recent drops (newest matters more)
-    w = np.linspace(0.6, 1.0, len(y))  # older=0.6 newest=1.0
-    W = np.diag(w)
-
-    # Design matrix: [1, x1, x2]
-    X = np.column_stack([np.ones_like(x1), x1, x2])
 
-    beta, *_ = np.linalg.lstsq(W @ X, W @ y, rcond=None)
-    b0, b1, b2 = beta.tolist()
+def prediction_payload(state, beta, goal=None):
+    """Prediction, summary, confidence, insight, streak and goal for one fitted model state."""
+    n = state.attempts
+    b0, b1, b2 = [float(b) for b in beta]
 
     # Predict next attempt at same difficulty as last attempt
-    next_x1 = float(len(y) + 1)
-    last_diff_num = float(x2[-1])
-
-    predicted_pct = b0 + b1 * next_x1 + b2 * last_diff_num
+    next_x1 = float(n + 1)
+    last_diff_num = float(difficulty_to_num(state.last_difficulty))
 
-    # Fallback for small data (prevents crazy 0%/100% swings with only few attempts)
-    if len(y) < 5:
-        predicted_pct = float(0.7 * y[-1] + 0.3 * y[-2])
-
-    # clamp to [0, 100]
-    predicted_pct = float(max(0.0, min(100.0, predicted_pct)))
+    predicted_pct = float(predict_next_percentage(
+        beta, n, last_diff_num, state.last_percentage, state.prev_percentage
+    ))
 
-    total_questions = int(attempts[-1].total_questions or 0)
+    total_questions = int(state.last_total_questions or 0)
     predicted_score = int(round((predicted_pct / 100.0) * total_questions)) if total_questions else None
 
     # summary
-    best_pct = float(np.max(y))
-    avg_pct = float(np.mean(y))
-    last_pct = float(y[-1])
-
-    conf = confidence_level(len(y), y)
-    insight = trend_insight(y)
-    streak = calculate_streak_from_attempts(attempts)
-
-    # history includes difficulty (useful for frontend)
-    history = [
-        {
-            "attempt_index": i + 1,
-            "percentage": float(att.percentage),
-            "difficulty": getattr(att, "difficulty", None),
-            "timestamp": att.timestamp.isoformat() if att.timestamp else None,
-        }
-        for i, att in enumerate(attempts)
-    ]
+    best_pct = float(state.best_percentage)
+    avg_pct = state.percentage_sum / n
+    last_pct = float(state.last_percentage)
+    std = math.sqrt(max(0.0, state.percentage_sq_sum / n - avg_pct ** 2))
 
     # goal estimation
     goal_pct = None
@@ -1115,7 +3504,7 @@ def predict_next_score():
             else:
                 if b1 > 0:
                     x_goal = (goal_pct - (b0 + b2 * last_diff_num)) / b1
-                    attempts_to_goal = max(0, math.ceil(x_goal - len(y)))
+                    attempts_to_goal = max(0, math.ceil(x_goal - n))
                     goal_note = "Estimated using your recent trend (difficulty-aware)."
                 else:
                     attempts_to_goal = None
@@ -1125,22 +3514,17 @@ def predict_next_score():
 
     diff = recommend_difficulty_from_percentage(predicted_pct)
 
-    return jsonify({
-        "user_id": uid,
-        "quiz_id": quiz_id,
-        "quiz": {"id": quiz_id, "title": quiz_title, "description": quiz_description},
-        "history": history,
-
+    return {
         "summary": {
-            "attempts": len(y),
+            "attempts": n,
             "best_percentage": round(best_pct, 2),
             "average_percentage": round(avg_pct, 2),
             "last_percentage": round(last_pct, 2)
         },
 
-        "confidence": conf,
-        "insight": insight,
-        "streak": streak,
+        "confidence": confidence_level(n, std),
+        "insight": trend_insight(np.array([state.prev_percentage, state.last_percentage], dtype=float)),
+        "streak": state.streak_days,
 
         "goal": {
             "target_percentage": round(goal_pct, 2) if goal_pct is not None else None,
@@ -1153,7 +3537,7 @@ def predict_next_score():
             "predicted_percentage": round(predicted_pct, 2),
             "predicted_score": predicted_score,
             "total_questions": total_questions,
-            "based_on_last_difficulty": getattr(attempts[-1], "difficulty", None)
+            "based_on_last_difficulty": state.last_difficulty
         },
 
         "recommendation": {
@@ -1162,10 +3546,230 @@ def predict_next_score():
         },
 
         "attempt_gate": {
-            "attempts_found": len(attempts),
-            "attempts_required": attempts_required
+            "attempts_found": n,
+            "attempts_required": PREDICTION_ATTEMPTS_REQUIRED
         }
-    }), 200
+    }
+
+
+# -------------------------------
+# Prediction cache
+# -------------------------------
+# A prediction only changes when the user submits another attempt for that quiz,
+# so results are cached per (user, quiz) and tagged with the model state's
+# (last_attempt_id, attempts). Checking that tag is one primary-key read of
+# user_quiz_model, which also catches attempts written by other workers; a
+# submit in this worker drops the entry right away. Each entry keeps the few
+# most recent goal values asked for and the history list.
+#
+# Entries also hold the quiz title and description. A quiz edit only drops this
+# worker's entries, so the TTL bounds how long other workers show the old ones.
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", 10000))
+PREDICTION_CACHE_TTL = int(os.environ.get("PREDICTION_CACHE_TTL", 300))
+PREDICTION_CACHE_GOALS = 8
+
+_prediction_cache = TTLCache(maxsize=PREDICTION_CACHE_SIZE, ttl=PREDICTION_CACHE_TTL)
+_prediction_cache_lock = threading.Lock()
+prediction_cache_stats = {"hits": 0, "misses": 0}
+
+
+def prediction_version(state):
+    return (state.last_attempt_id, state.attempts)
+
+
+def cached_prediction(state, goal, with_history=False):
+    """(item, history) cached for this model state; either may be None."""
+    with _prediction_cache_lock:
+        slot = _prediction_cache.get((state.user_id, state.quiz_id))
+        if slot is None or slot["version"] != prediction_version(state):
+            item, history = None, None
+        else:
+            item, history = slot["by_goal"].get(goal), slot["history"]
+        hit = item is not None and (history is not None or not with_history)
+        prediction_cache_stats["hits" if hit else "misses"] += 1
+    return item, history
+
+
+def cache_prediction(state, goal, item, history=None):
+    key = (state.user_id, state.quiz_id)
+    with _prediction_cache_lock:
+        slot = _prediction_cache.get(key)
+        if slot is None or slot["version"] != prediction_version(state):
+            slot = {"version": prediction_version(state), "by_goal": {}, "history": None}
+            _prediction_cache[key] = slot
+        by_goal = slot["by_goal"]
+        by_goal.pop(goal, None)
+        by_goal[goal] = item
+        while len(by_goal) > PREDICTION_CACHE_GOALS:
+            by_goal.pop(next(iter(by_goal)))
+        if history is not None:
+            slot["history"] = history
+
+
+def invalidate_prediction_cache(user_id=None, quiz_id=None):
+    with _prediction_cache_lock:
+        if user_id is not None and quiz_id is not None:
+            _prediction_cache.pop((user_id, quiz_id), None)
+            return
+        for key in list(_prediction_cache):
+            if (user_id is None or key[0] == user_id) and (quiz_id is None or key[1] == quiz_id):
+                del _prediction_cache[key]
+
+
+def quiz_prediction_item(state, quiz, goal, beta=None):
+    """One quiz's prediction (or attempt gate) as returned by /predict and /predict/batch."""
+    item = {
+        "quiz_id": state.quiz_id,
+        "quiz": {
+            "id": state.quiz_id,
+            "title": quiz.title if quiz else f"Quiz #{state.quiz_id}",
+            "description": quiz.description if quiz else "",
+        },
+    }
+    if state.attempts < PREDICTION_ATTEMPTS_REQUIRED:
+        item.update(prediction_gate_payload(state.attempts))
+    else:
+        if beta is None:
+            beta = fit_from_moments(moments_from_json(state.moments), state.attempts)
+        item.update(prediction_payload(state, beta, goal))
+    return item
+
+
+def get_user_quiz_model(user_id, quiz_id):
+    """Stored model state, or one built from history if the row has not been created yet."""
+    return UserQuizModel.query.get((user_id, quiz_id)) or build_user_quiz_model(user_id, quiz_id)
+
+
+@app.route("/predict", methods=["GET"])
+@token_required
+def predict_next_score():
+    uid = request.args.get("user_id")
+    quiz_id = request.args.get("quiz_id")
+    goal = request.args.get("goal")  # optional, e.g. 80
+
+    if uid is None or quiz_id is None:
+        return jsonify({"error": "user_id and quiz_id query parameters required"}), 400
+
+    try:
+        uid = int(uid)
+        quiz_id = int(quiz_id)
+    except ValueError:
+        return jsonify({"error": "invalid user_id or quiz_id"}), 400
+
+    if request.current_user.id != uid:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    # ✅ IMPORTANT: do NOT filter by difficulty
+    state = get_user_quiz_model(uid, quiz_id)
+
+    # history includes difficulty (useful for frontend); history=0 skips it
+    with_history = (
+        request.args.get("history", "1").lower() not in ("0", "false")
+        and state.attempts >= PREDICTION_ATTEMPTS_REQUIRED
+    )
+    item, history = cached_prediction(state, goal, with_history)
+
+    if item is None:
+        # Weighted regression on [1, attempt index, difficulty] (newest matters more),
+        # solved from the stored moments instead of the full history
+        item = quiz_prediction_item(state, Quiz.query.get(quiz_id), goal)
+    if with_history and history is None:
+        history = [
+            {
+                "attempt_index": i + 1,
+                "percentage": float(att.percentage),
+                "difficulty": att.difficulty,
+                "timestamp": att.timestamp.isoformat() if att.timestamp else None,
+            }
+            for i, att in enumerate(model_history_query(uid, quiz_id).with_entities(
+                QuizAttempt.percentage, QuizAttempt.difficulty, QuizAttempt.timestamp
+            ))
+        ]
+    cache_prediction(state, goal, item, history)
+
+    response = {"user_id": uid, **item}
+    if state.attempts >= PREDICTION_ATTEMPTS_REQUIRED:
+        response["history"] = history if with_history else None
+    return jsonify(response), 200
+
+
+@app.route("/predict/batch", methods=["GET"])
+@token_required
+def predict_batch():
+    """
+    Predictions for every quiz the user has attempted (or ?quiz_ids=1,2,3) in one call.
+    Model states load in one query and all fits are solved in one batched pass.
+    Each item matches /predict without "history".
+    """
+    uid = request.args.get("user_id")
+    goal = request.args.get("goal")
+    if uid is None:
+        return jsonify({"error": "user_id query parameter required"}), 400
+    try:
+        uid = int(uid)
+        quiz_ids = [int(q) for q in request.args.get("quiz_ids", "").split(",") if q.strip()]
+    except ValueError:
+        return jsonify({"error": "invalid user_id or quiz_ids"}), 400
+
+    if request.current_user.id != uid:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    # like the catalog, skip deleted quizzes and hidden ones still being purged
+    state_query = (
+        UserQuizModel.query.filter_by(user_id=uid)
+        .join(Quiz, Quiz.id == UserQuizModel.quiz_id)
+        .filter(Quiz.is_hidden.is_(False))
+    )
+    if quiz_ids:
+        state_query = state_query.filter(UserQuizModel.quiz_id.in_(quiz_ids))
+    states = {s.quiz_id: s for s in state_query.all()}
+
+    # quizzes attempted before user_quiz_model was backfilled
+    missing_query = db.session.query(QuizAttempt.quiz_id).join(Quiz, Quiz.id == QuizAttempt.quiz_id).filter(
+        QuizAttempt.user_id == uid,
+        QuizAttempt.status == "submitted",
+        QuizAttempt.quiz_id.notin_(list(states)),
+        Quiz.is_hidden.is_(False),
+    )
+    if quiz_ids:
+        missing_query = missing_query.filter(QuizAttempt.quiz_id.in_(quiz_ids))
+    missing = [qid for (qid,) in missing_query.distinct()]
+    if missing:
+        grouped = defaultdict(list)
+        for row in model_history_query(uid).filter(QuizAttempt.quiz_id.in_(missing)).with_entities(
+            QuizAttempt.quiz_id, *MODEL_HISTORY_COLUMNS
+        ):
+            grouped[row.quiz_id].append(row)
+        for qid in missing:
+            states[qid] = build_user_quiz_model(uid, qid, grouped[qid])
+
+    items = {}
+    for qid, state in states.items():
+        item, _ = cached_prediction(state, goal)
+        if item is not None:
+            items[qid] = item
+
+    todo = [s for qid, s in states.items() if qid not in items]
+    quizzes = {}
+    if todo:
+        quizzes = {q.id: q for q in Quiz.query.filter(Quiz.id.in_([s.quiz_id for s in todo])).all()}
+
+    ready = [s for s in todo if s.attempts >= PREDICTION_ATTEMPTS_REQUIRED]
+    betas = []
+    if ready:
+        betas = fit_from_moments(
+            stack_moments([moments_from_json(s.moments) for s in ready]),
+            np.array([s.attempts for s in ready], dtype=float),
+        )
+    fitted = {s.quiz_id: beta for s, beta in zip(ready, betas)}
+
+    for state in todo:
+        item = quiz_prediction_item(state, quizzes.get(state.quiz_id), goal, fitted.get(state.quiz_id))
+        cache_prediction(state, goal, item)
+        items[state.quiz_id] = item
+
+    predictions = [items[qid] for qid in sorted(items)]
+    return jsonify({"user_id": uid, "predictions": predictions}), 200
 
 @app.route("/debug/attempts", methods=["GET"])
 @token_required
@@ -1197,140 +3801,209 @@ def debug_attempts():
 # -------------------------------------------------------
 
 
-@app.route("/leaderboard/weekly", methods=["GET"])
-@token_required
-def weekly_leaderboard():
-    now = datetime.utcnow()
-    start_date = now.date() - timedelta(days=now.weekday())
-    start_of_week = datetime.combine(start_date, datetime.min.time())
-    end_of_week = start_of_week + timedelta(days=7)
-
-    DIFF_WEIGHT = {
-        "Very Easy": 0.9,
-        "Easy": 1.0,
-        "Medium": 1.2,
-        "Hard": 1.5,
-    }
-
-    EXPECTED_SEC_PER_Q = {
-        "Very Easy": 25,
-        "Easy": 35,
-        "Medium": 45,
-        "Hard": 60,
-    }
+# -------------------------
+# Weekly leaderboard
+# -------------------------
+# The leaderboard used to load every submitted attempt of the week. Each scored
+# attempt now adds its weighted points and time ratio to its (week, user) row in
+# weekly_leaderboard_stats, and the endpoint reads the top rows of one week.
+LEADERBOARD_DIFF_WEIGHT = {
+    "Very Easy": 0.9,
+    "Easy": 1.0,
+    "Medium": 1.2,
+    "Hard": 1.5,
+}
+
+LEADERBOARD_EXPECTED_SEC_PER_Q = {
+    "Very Easy": 25,
+    "Easy": 35,
+    "Medium": 45,
+    "Hard": 60,
+}
+
+LEADERBOARD_MIN_ATTEMPTS = 3
+LEADERBOARD_REQUIRE_MEDIUM_OR_HARD = True
+LEADERBOARD_SIZE = 10
+
+
+def leaderboard_difficulty(raw):
+    """Normalize any weird values into the 4 valid labels."""
+    if raw is None:
+        return "Easy"
+    s = str(raw).strip().lower()
+    s = s.replace("-", " ").replace("_", " ")
+    s = " ".join(s.split())  # collapse spaces
 
-    attempts = QuizAttempt.query.filter(
-        QuizAttempt.status == "submitted",
-        QuizAttempt.timestamp >= start_of_week,
-        QuizAttempt.timestamp < end_of_week,
-    ).all()
+    if s in ("very easy", "veryeasy"):
+        return "Very Easy"
+    if s == "easy":
+        return "Easy"
+    if s in ("medium", "med"):
+        return "Medium"
+    if s == "hard":
+        return "Hard"
+    return "Easy"
 
-    user_stats = defaultdict(lambda: {
-        "weighted_points_sum": 0.0,
-        "weight_sum": 0.0,
-        "time_ratios": [],
-        "attempts_count": 0,
-        "has_medium_or_hard": False,
-    })
 
-    # ✅ helper: normalize any weird values into the 4 valid labels
-    def norm_diff(raw):
-        if raw is None:
-            return "Easy"
-        s = str(raw).strip().lower()
-        s = s.replace("-", " ").replace("_", " ")
-        s = " ".join(s.split())  # collapse spaces
-
-        if s in ("very easy", "veryeasy"):
-            return "Very Easy"
-        if s == "easy":
-            return "Easy"
-        if s in ("medium", "med"):
-            return "Medium"
-        if s == "hard":
-            return "Hard"
-        return "Easy"
+def week_start_of(timestamp):
+    day = timestamp.date()
+    return day - timedelta(days=day.weekday())
 
-    for att in attempts:
-        if att.percentage is None:
-            continue
 
-        diff = norm_diff(getattr(att, "difficulty", None))
+def leaderboard_contribution(attempt):
+    """What one submitted attempt adds to its (week, user) row, or None if it doesn't count."""
+    if attempt.percentage is None or attempt.timestamp is None:
+        return None
 
-        # ✅ safe lookups (no KeyError)
-        w = DIFF_WEIGHT.get(diff, DIFF_WEIGHT["Easy"])
+    diff = leaderboard_difficulty(attempt.difficulty)
+    w = LEADERBOARD_DIFF_WEIGHT.get(diff, LEADERBOARD_DIFF_WEIGHT["Easy"])
+
+    time_ratio = None
+    dur, tq = attempt.duration_seconds, attempt.total_questions
+    if dur is not None and tq:
+        expected = LEADERBOARD_EXPECTED_SEC_PER_Q.get(diff, LEADERBOARD_EXPECTED_SEC_PER_Q["Easy"]) * int(tq)
+        if expected > 0:
+            time_ratio = float(dur) / float(expected)
+
+    return {
+        "weighted_points_sum": float(attempt.percentage) * w,
+        "weight_sum": w,
+        "time_ratio_sum": time_ratio or 0.0,
+        "time_ratio_count": 1 if time_ratio is not None else 0,
+        "attempts_count": 1,
+        "has_medium_or_hard": diff in ("Medium", "Hard"),
+    }
 
-        stats = user_stats[att.user_id]
-        stats["attempts_count"] += 1
 
-        stats["weighted_points_sum"] += float(att.percentage) * w
-        stats["weight_sum"] += w
+def record_weekly_leaderboard(attempt):
+    """Add a newly submitted attempt to its (week, user) row with an atomic UPDATE (INSERT on first attempt)."""
+    delta = leaderboard_contribution(attempt)
+    if delta is None:
+        return
+    week = week_start_of(attempt.timestamp)
 
-        if diff in ("Medium", "Hard"):
-            stats["has_medium_or_hard"] = True
+    values = {
+        getattr(WeeklyLeaderboardStats, field): getattr(WeeklyLeaderboardStats, field) + delta[field]
+        for field in ("weighted_points_sum", "weight_sum", "time_ratio_sum", "time_ratio_count", "attempts_count")
+    }
+    if delta["has_medium_or_hard"]:
+        values[WeeklyLeaderboardStats.has_medium_or_hard] = True
 
-        dur = getattr(att, "duration_seconds", None)
-        tq = getattr(att, "total_questions", None)
+    def apply_update():
+        return db.session.execute(
+            update(WeeklyLeaderboardStats)
+            .where(WeeklyLeaderboardStats.week_start == week, WeeklyLeaderboardStats.user_id == attempt.user_id)
+            .values(values)
+        ).rowcount
 
-        if dur is not None and tq:
-            expected_sec = EXPECTED_SEC_PER_Q.get(diff, EXPECTED_SEC_PER_Q["Easy"])
-            expected = expected_sec * int(tq)
-            if expected > 0:
-                stats["time_ratios"].append(float(dur) / float(expected))
+    if apply_update():
+        return
 
-    if not user_stats:
-        return jsonify({
-            "week_start": start_of_week.isoformat(),
-            "week_end": end_of_week.isoformat(),
-            "leaders": []
-        }), 200
+    try:
+        with db.session.begin_nested():
+            db.session.add(WeeklyLeaderboardStats(week_start=week, user_id=attempt.user_id, **delta))
+    except IntegrityError:
+        # another worker inserted the row first
+        apply_update()
 
-    MIN_ATTEMPTS = 3
-    REQUIRE_MEDIUM_OR_HARD = True
 
-    eligible_user_ids = []
-    for uid, stats in user_stats.items():
-        if stats["attempts_count"] < MIN_ATTEMPTS:
+def aggregate_weekly_leaderboard(week_start=None, user_ids=None):
+    """
+    The same rows folded from quiz_attempt, keyed by (week_start, user_id).
+    Used to rebuild weekly_leaderboard_stats and to cross-check it.
+    """
+    query = (
+        QuizAttempt.query
+        .with_entities(
+            QuizAttempt.user_id, QuizAttempt.timestamp, QuizAttempt.percentage, QuizAttempt.difficulty,
+            QuizAttempt.duration_seconds, QuizAttempt.total_questions,
+        )
+        .filter(QuizAttempt.status == "submitted", QuizAttempt.percentage.isnot(None))
+    )
+    if week_start is not None:
+        start = datetime.combine(week_start, datetime.min.time())
+        query = query.filter(QuizAttempt.timestamp >= start, QuizAttempt.timestamp < start + timedelta(days=7))
+    if user_ids is not None:
+        query = query.filter(QuizAttempt.user_id.in_(list(user_ids)))
+
+    rows = {}
+    for att in query.yield_per(5000):
+        delta = leaderboard_contribution(att)
+        if delta is None:
             continue
-        if REQUIRE_MEDIUM_OR_HARD and not stats["has_medium_or_hard"]:
+        key = (week_start_of(att.timestamp), att.user_id)
+        row = rows.get(key)
+        if row is None:
+            rows[key] = {"week_start": key[0], "user_id": att.user_id, **delta}
             continue
-        eligible_user_ids.append(uid)
-
-    if not eligible_user_ids:
-        return jsonify({
-            "week_start": start_of_week.isoformat(),
-            "week_end": end_of_week.isoformat(),
-            "leaders": []
-        }), 200
+        for field in ("weighted_points_sum", "weight_sum", "time_ratio_sum", "time_ratio_count", "attempts_count"):
+            row[field] += delta[field]
+        row["has_medium_or_hard"] = row["has_medium_or_hard"] or delta["has_medium_or_hard"]
+    return rows
+
+
+def rebuild_weekly_leaderboard(week_start=None, user_ids=None):
+    """Replace weekly_leaderboard_stats (one week, some users, or everything). Caller commits."""
+    existing = WeeklyLeaderboardStats.query
+    if week_start is not None:
+        existing = existing.filter_by(week_start=week_start)
+    if user_ids is not None:
+        existing = existing.filter(WeeklyLeaderboardStats.user_id.in_(list(user_ids)))
+    # lock the rows record_weekly_leaderboard updates before aggregating: a submit
+    # that commits first is in the aggregate, a later one waits and adds itself on top
+    existing.with_entities(WeeklyLeaderboardStats.week_start, WeeklyLeaderboardStats.user_id).with_for_update().all()
+
+    rows = aggregate_weekly_leaderboard(week_start, user_ids)
+    existing.delete(synchronize_session=False)
+    if rows:
+        db.session.execute(insert(WeeklyLeaderboardStats), list(rows.values()))
+    return len(rows)
 
-    users = User.query.filter(User.id.in_(eligible_user_ids)).all()
-    user_map = {u.id: u for u in users}
 
-    leaderboard = []
-    for uid in eligible_user_ids:
-        stats = user_stats[uid]
-        if stats["weight_sum"] <= 0:
-            continue
-
-        weighted_score = round(stats["weighted_points_sum"] / stats["weight_sum"], 2)
+@app.route("/leaderboard/weekly", methods=["GET"])
+@token_required
+def weekly_leaderboard():
+    now = datetime.utcnow()
+    start_date = week_start_of(now)
+    start_of_week = datetime.combine(start_date, datetime.min.time())
+    end_of_week = start_of_week + timedelta(days=7)
 
-        avg_time_ratio = None
-        if stats["time_ratios"]:
-            avg_time_ratio = round(sum(stats["time_ratios"]) / len(stats["time_ratios"]), 3)
+    s = WeeklyLeaderboardStats
+    weighted_score = func.round(db.cast(s.weighted_points_sum / s.weight_sum, db.Numeric), 2)
+    avg_time_ratio = case(
+        (s.time_ratio_count > 0, func.round(db.cast(s.time_ratio_sum / s.time_ratio_count, db.Numeric), 3)),
+        else_=None,
+    )
+    query = db.session.query(s, User.email).outerjoin(User, User.id == s.user_id).filter(
+        s.week_start == start_date,
+        s.attempts_count >= LEADERBOARD_MIN_ATTEMPTS,
+        s.weight_sum > 0,
+    )
+    if LEADERBOARD_REQUIRE_MEDIUM_OR_HARD:
+        query = query.filter(s.has_medium_or_hard.is_(True))
+    top = (
+        query.order_by(
+            weighted_score.desc(),
+            case((s.time_ratio_count > 0, 0), else_=1),  # no timing data ranks last among ties
+            avg_time_ratio.asc(),
+            s.user_id.asc(),
+        )
+        .limit(LEADERBOARD_SIZE)
+        .all()
+    )
 
+    leaderboard = []
+    for stats, email in top:
         leaderboard.append({
-            "user_id": uid,
-            "email": user_map.get(uid).email if user_map.get(uid) else "Unknown",
-            "weighted_score": weighted_score,
-            "avg_time_ratio": avg_time_ratio,
-            "attempts_count": stats["attempts_count"],
+            "user_id": stats.user_id,
+            "email": email or "Unknown",
+            "weighted_score": round(stats.weighted_points_sum / stats.weight_sum, 2),
+            "avg_time_ratio": (
+                round(stats.time_ratio_sum / stats.time_ratio_count, 3) if stats.time_ratio_count else None
+            ),
+            "attempts_count": stats.attempts_count,
         })
 
-    leaderboard.sort(key=lambda item: (
-        -item["weighted_score"],
-        item["avg_time_ratio"] if item["avg_time_ratio"] is not None else float("inf"),
-    ))
-
     for idx, entry in enumerate(leaderboard, start=1):
         entry["rank"] = idx
         entry["badge"] = "gold" if idx == 1 else "silver" if idx == 2 else "bronze" if idx == 3 else None
@@ -1338,13 +4011,10 @@ def weekly_leaderboard():
     return jsonify({
         "week_start": start_of_week.isoformat(),
         "week_end": end_of_week.isoformat(),
-        "leaders": leaderboard[:10]
+        "leaders": leaderboard
     }), 200
 
 
-
-
-
 # -------------------------
 # Initialize DB & run
 # -------------------------
@@ -0,0 +1,177 @@
+# synthetic.py
+# Vectorized synthetic attempt generator for Module 3 training sets.
+#
+# Usage:
+#   python synthetic.py <out_file> [--users 100000] [--attempts 30] [--patterns linear,plateau]
+#                       [--seed 42] [--format csv|parquet]
+#
+# Every synthetic user follows one pattern (linear, quadratic, sinusoidal or
+# plateau) with their own base level and trend. A single-user dataset keeps the
+# original curve (exact base and trend, no difficulty penalty) unless the
+# spreads/penalty are passed explicitly. Users are generated in chunks
+# of whole (users x attempts) arrays from one seeded NumPy Generator and each
+# chunk is appended to the output, so memory stays flat however many rows are
+# written. Parquet output needs pyarrow.
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+SYNTHETIC_PATTERNS = ("linear", "quadratic", "sinusoidal", "plateau")
+SYNTHETIC_FORMATS = ("csv", "parquet")
+SYNTHETIC_CHUNK_ROWS = 500_000
+
+DIFFICULTY_NAMES = ("Very Easy", "Easy", "Medium", "Hard")
+
+DEFAULT_PARAMS = {
+    "base": 60.0,
+    "trend": 1.0,
+    "noise": 5.0,
+    "curvature": 0.5,
+    "amplitude": 10.0,
+    "frequency": 0.5,
+    "growth": 0.3,
+    "base_spread": 10.0,         # std of each user's base level around "base"
+    "trend_spread": 0.5,         # std of each user's trend around "trend"
+    "difficulty_penalty": 5.0,   # percentage points lost per level above Easy
+    "total_questions": 20,
+}
+
+# what a one-user dataset uses instead, so it is the plain pattern plus noise
+SINGLE_USER_PARAMS = {"base_spread": 0.0, "trend_spread": 0.0, "difficulty_penalty": 0.0}
+
+
+def pattern_percentages(codes, base, trend, steps, params):
+    """
+    Noise-free percentages for every (user, attempt).
+    codes/base/trend have one entry per user; steps is 0..n-1.
+    """
+    i = steps[None, :]
+    base = base[:, None]
+    trend = trend[:, None]
+    n = len(steps)
+    return np.select(
+        [codes[:, None] == k for k in range(len(SYNTHETIC_PATTERNS))],
+        [
+            base + trend * i,
+            base + trend * i + params["curvature"] * i ** 2,
+            base + params["amplitude"] * np.sin(params["frequency"] * i),
+            np.broadcast_to(100 / (1 + np.exp(-params["growth"] * (i - n / 2))), (len(codes), n)),
+        ],
+    )
+
+
+def generate_chunk(rng, first_user_id, users, attempts, pattern_codes, params, start_time, first_id=1):
+    """One DataFrame of users * attempts rows, users numbered from first_user_id."""
+    codes = rng.choice(pattern_codes, size=users)
+    base = params["base"] + rng.normal(0, params["base_spread"], users)
+    trend = params["trend"] + rng.normal(0, params["trend_spread"], users)
+    steps = np.arange(attempts, dtype=float)
+
+    difficulty = rng.integers(0, len(DIFFICULTY_NAMES), size=(users, attempts))
+    pct = pattern_percentages(codes, base, trend, steps, params)
+    pct -= params["difficulty_penalty"] * np.maximum(difficulty - 1, 0)
+    pct += rng.normal(0, params["noise"], size=(users, attempts))
+    np.clip(pct, 0.0, 100.0, out=pct)
+
+    total_q = int(params["total_questions"])
+    rows = users * attempts
+    timestamps = np.datetime64(start_time, "s") + np.arange(attempts).astype("timedelta64[D]")
+
+    return pd.DataFrame({
+        "id": np.arange(first_id, first_id + rows, dtype=np.int64),
+        "user_id": np.repeat(np.arange(first_user_id, first_user_id + users, dtype=np.int64), attempts),
+        "attempt_index": np.tile(np.arange(1, attempts + 1, dtype=np.int32), users),
+        "pattern": pd.Categorical.from_codes(np.repeat(codes, attempts), SYNTHETIC_PATTERNS),
+        "difficulty": pd.Categorical.from_codes(difficulty.ravel(), DIFFICULTY_NAMES),
+        "score": np.rint(pct.ravel() / 100.0 * total_q).astype(np.int32),
+        "total_questions": np.full(rows, total_q, dtype=np.int32),
+        "percentage": np.round(pct.ravel(), 2),
+        "timestamp": np.tile(timestamps, users),
+        "status": "submitted",
+    })
+
+
+def write_synthetic_dataset(path, users, attempts, patterns=SYNTHETIC_PATTERNS, seed=None,
+                            fmt="csv", params=None, quiz_id="SYN", chunk_rows=SYNTHETIC_CHUNK_ROWS):
+    """Generate users * attempts rows into `path` chunk by chunk and return a summary."""
+    if fmt not in SYNTHETIC_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(SYNTHETIC_FORMATS)}")
+    unknown = [p for p in patterns if p not in SYNTHETIC_PATTERNS]
+    if unknown or not patterns:
+        raise ValueError(f"patterns must be a non-empty subset of {', '.join(SYNTHETIC_PATTERNS)}")
+    if users < 1 or attempts < 1:
+        raise ValueError("users and attempts must be positive")
+
+    pq = None
+    if fmt == "parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("parquet output needs pyarrow (pip install pyarrow)")
+
+    defaults = {**DEFAULT_PARAMS, **SINGLE_USER_PARAMS} if users == 1 else DEFAULT_PARAMS
+    params = {**defaults, **(params or {})}
+    pattern_codes = np.array([SYNTHETIC_PATTERNS.index(p) for p in patterns])
+    rng = np.random.default_rng(seed)
+    start_time = datetime.utcnow().replace(microsecond=0) - timedelta(days=attempts)
+    users_per_chunk = max(1, chunk_rows // attempts)
+
+    started = time.perf_counter()
+    writer = None
+    written = 0
+    try:
+        for first in range(0, users, users_per_chunk):
+            count = min(users_per_chunk, users - first)
+            df = generate_chunk(rng, first + 1, count, attempts, pattern_codes, params, start_time, written + 1)
+            df.insert(2, "quiz_id", quiz_id)
+            if fmt == "csv":
+                df.to_csv(path, mode="w" if first == 0 else "a", header=first == 0, index=False)
+            else:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+            written += len(df)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return {
+        "dataset_file": str(path),
+        "format": fmt,
+        "samples": written,
+        "users": users,
+        "attempts_per_user": attempts,
+        "patterns": list(patterns),
+        "seed": seed,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0].startswith("--"):
+        print("Usage: python synthetic.py <out_file> [--users N] [--attempts N] "
+              "[--patterns linear,plateau] [--seed N] [--format csv|parquet]")
+        sys.exit(1)
+
+    options = dict(zip(argv[1::2], argv[2::2]))
+    path = argv[0]
+    fmt = options.get("--format", "parquet" if path.endswith(".parquet") else "csv")
+    summary = write_synthetic_dataset(
+        path,
+        users=int(options.get("--users", 1000)),
+        attempts=int(options.get("--attempts", 30)),
+        patterns=options.get("--patterns", ",".join(SYNTHETIC_PATTERNS)).split(","),
+        seed=int(options["--seed"]) if "--seed" in options else None,
+        fmt=fmt,
+    )
+    print(f"✅ Wrote {summary['samples']} rows to {summary['dataset_file']} in {summary['seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# Tests run against a throwaway SQLite database; DATABASE_URL has to be set
+# before server is imported, since the engine is configured at import time.
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+DB_DIR = tempfile.mkdtemp(prefix="quiz-tests-")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(DB_DIR, "test.db")
+os.environ.setdefault("SUBMIT_JOURNAL_DIR", os.path.join(DB_DIR, "submit_journal"))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import server  # noqa: E402
+from server import app, db  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    app.config["TESTING"] = True
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    # ids restart at 1 in every test, so nothing cached by id may survive
+    for cache in (server._auth_cache, server._question_cache, server._attempt_bundle_cache, server._prediction_cache):
+        cache.clear()
+    server.invalidate_question_pools()
+    server.invalidate_quiz_catalog()
+    yield app.test_client()
+    with app.app_context():
+        db.session.remove()
+
+
+@pytest.fixture
+def make_user(client):
+    def make(email, role="user"):
+        with app.app_context():
+            user = server.User(email=email, role=role)
+            user.set_password("secret")
+            db.session.add(user)
+            db.session.commit()
+            return user.id, {"Authorization": "Bearer " + server.generate_token(user.id)}
+    return make
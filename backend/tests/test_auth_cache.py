@@ -0,0 +1,67 @@
+# token_required caches principals by (user_id, iat); a committed change to the
+# user must drop them, a flushed or rolled-back one must not.
+import server
+from server import app, db
+
+
+def cached_ids():
+    return {user_id for user_id, _ in server._auth_cache}
+
+
+def test_role_change_is_seen_after_commit(client, make_user):
+    user_id, headers = make_user("user@example.com")
+    grade = lambda: client.post("/grading/batch", json={"submissions": []}, headers=headers)  # noqa: E731
+    assert grade().status_code == 403
+    assert user_id in cached_ids()
+
+    with app.app_context():
+        user = db.session.get(server.User, user_id)
+        user.role = "admin"
+        db.session.flush()
+        assert user_id in cached_ids()  # not visible to other requests yet
+        db.session.commit()
+    assert user_id not in cached_ids()
+
+    assert grade().status_code == 400  # admin now; the empty batch is what's rejected
+
+
+def test_rolled_back_change_keeps_the_cache(client, make_user):
+    user_id, headers = make_user("user@example.com")
+    client.get("/results/activity", headers=headers)
+
+    with app.app_context():
+        db.session.get(server.User, user_id).role = "admin"
+        db.session.flush()
+        db.session.rollback()
+        # the next transaction in the same session commits something unrelated
+        db.session.add(server.Quiz(title="Other"))
+        db.session.commit()
+    assert user_id in cached_ids()
+
+
+def test_password_change_and_delete_drop_the_principal(client, make_user):
+    user_id, headers = make_user("user@example.com")
+    client.get("/results/activity", headers=headers)
+
+    with app.app_context():
+        db.session.get(server.User, user_id).set_password("changed")
+        db.session.commit()
+    assert user_id not in cached_ids()
+
+    client.get("/results/activity", headers=headers)
+    with app.app_context():
+        db.session.delete(db.session.get(server.User, user_id))
+        db.session.commit()
+    assert client.get("/results/activity", headers=headers).status_code == 401
+
+
+def test_unrelated_update_keeps_the_cache(client, make_user):
+    user_id, headers = make_user("user@example.com")
+    client.get("/results/activity", headers=headers)
+    hits = server.auth_stats["cache_hits"]
+
+    with app.app_context():
+        db.session.get(server.User, user_id).google_sub = "sub-123"
+        db.session.commit()
+    client.get("/results/activity", headers=headers)
+    assert server.auth_stats["cache_hits"] == hits + 1
@@ -0,0 +1,68 @@
+# Conditional GETs answer 304 until something they show is edited.
+import pytest
+
+
+@pytest.fixture
+def quiz(client, make_user):
+    _, admin = make_user("admin@example.com", "admin")
+    quiz_id = client.post("/quizzes", json={"title": "Cached"}, headers=admin).get_json()["quiz_id"]
+    client.post(f"/quizzes/{quiz_id}/questions/bulk", headers=admin, json=[
+        {"question_text": f"Question {i}", "options": ["a", "b"], "correct_answer": "a", "difficulty": "Easy"}
+        for i in range(5)
+    ])
+    return quiz_id
+
+
+def revalidate(client, url, etag, headers=None):
+    return client.get(url, headers={**(headers or {}), "If-None-Match": etag})
+
+
+def test_catalog_revalidates_until_edited(client, quiz):
+    first = client.get("/quizzes")
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "no-cache"
+    assert revalidate(client, "/quizzes", etag).status_code == 304
+
+    client.put(f"/quizzes/{quiz}", json={"title": "Renamed"})
+    edited = revalidate(client, "/quizzes", etag)
+    assert edited.status_code == 200
+    assert edited.headers["ETag"] != etag
+    assert [q["title"] for q in edited.get_json()] == ["Renamed"]
+
+    client.post(f"/quizzes/{quiz}/questions", json={"question": "New", "options": ["a", "b"], "correct_answer": 0})
+    added = revalidate(client, "/quizzes", edited.headers["ETag"])
+    assert added.status_code == 200
+    assert added.get_json()[0]["total_questions"] == 6
+
+
+def test_attempt_bundle_revalidates_until_a_question_is_edited(client, make_user, quiz):
+    _, headers = make_user("user@example.com")
+    attempt_id = client.post(f"/quizzes/{quiz}/start", json={"difficulty": "Easy"}, headers=headers).get_json()["attempt_id"]
+    url = f"/quizzes/{quiz}/attempts/{attempt_id}/questions"
+
+    first = client.get(url, headers=headers)
+    etag = first.headers["ETag"]
+    questions = first.get_json()["questions"]
+    assert len(questions) == 5
+    assert revalidate(client, url, etag, headers).status_code == 304
+
+    # a window of the same bundle has its own tag
+    window = client.get(f"{url}?offset=1&limit=2", headers=headers)
+    assert window.headers["ETag"] != etag
+    assert [q["index"] for q in window.get_json()["questions"]] == [1, 2]
+
+    edited_id = questions[0]["id"]
+    client.put(f"/quizzes/{quiz}/questions/{edited_id}", json={"question": "Edited"})
+    after_edit = revalidate(client, url, etag, headers)
+    assert after_edit.status_code == 200
+    assert after_edit.headers["ETag"] != etag
+    assert after_edit.get_json()["questions"][0]["question"] == "Edited"
+    assert revalidate(client, url, after_edit.headers["ETag"], headers).status_code == 304
+
+
+def test_attempt_bundle_is_private_to_its_user(client, make_user, quiz):
+    _, headers = make_user("user@example.com")
+    _, other = make_user("other@example.com")
+    attempt_id = client.post(f"/quizzes/{quiz}/start", json={"difficulty": "Easy"}, headers=headers).get_json()["attempt_id"]
+
+    assert client.get(f"/quizzes/{quiz}/attempts/{attempt_id}/questions", headers=other).status_code == 404
@@ -0,0 +1,70 @@
+# Streaming question import: every row ends up either inserted or in the report.
+import json
+
+import server
+from server import app
+
+
+def create_quiz(client, make_user):
+    _, admin = make_user("admin@example.com", "admin")
+    return client.post("/quizzes", json={"title": "Import"}, headers=admin).get_json()["quiz_id"]
+
+
+def import_rows(client, quiz_id, body, fmt, **params):
+    query = "&".join(f"{k}={v}" for k, v in {"format": fmt, **params}.items())
+    response = client.post(f"/quizzes/{quiz_id}/questions/import?{query}", data=body.encode("utf-8"))
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def ndjson(rows):
+    return "\n".join(json.dumps(row) for row in rows)
+
+
+def question(text, **extra):
+    return {"question_text": text, "options": ["a", "b", "c"], "correct_answer": "b", "difficulty": "Easy", **extra}
+
+
+def test_csv_with_byte_order_mark(client, make_user):
+    quiz_id = create_quiz(client, make_user)
+    body = "\ufeffquestion_text,options,correct_answer,difficulty\nq1,a|b|c,b,Easy\nq2,a|b,0,Hard\n"
+
+    report = import_rows(client, quiz_id, body, "csv")
+    assert report["rows_inserted"] == 2
+    assert report["errors"] == []
+
+
+def test_rows_over_column_limits_are_reported(client, make_user):
+    quiz_id = create_quiz(client, make_user)
+    rows = [
+        question("ok"),
+        question("q" * (server.QUESTION_TEXT_MAX_LENGTH + 1)),
+        question("long option", options=["a", "b" * (server.QUESTION_OPTION_MAX_LENGTH + 1)], correct_answer=0),
+    ]
+
+    report = import_rows(client, quiz_id, ndjson(rows), "ndjson")
+    assert report["rows_inserted"] == 1
+    assert [e["row"] for e in report["errors"]] == [2, 3]
+
+
+def test_rejected_batch_is_retried_row_by_row(client, make_user, monkeypatch):
+    quiz_id = create_quiz(client, make_user)
+    real = server.validate_question_row
+
+    def validate(item):
+        values, error = real(item)
+        if values and values["question"] == "bad":
+            values["correct_answer"] = None  # passes validation, violates NOT NULL
+        return values, error
+
+    monkeypatch.setattr(server, "validate_question_row", validate)
+    rows = [question("q1"), question("bad"), question("q3"), question("q4"), question("q5")]
+
+    report = import_rows(client, quiz_id, ndjson(rows), "ndjson", batch_size=3)
+    assert report["rows_inserted"] == 4
+    assert report["rows_failed"] == 1
+    assert report["errors"][0]["row"] == 2
+    assert report["batches_committed"] == 2
+    with app.app_context():
+        stored = [q.question for q in server.Question.query.order_by(server.Question.id)]
+    assert stored == ["q1", "q3", "q4", "q5"]
@@ -0,0 +1,126 @@
+# JwksKeySource: one fetch per cold start, throttled refetches for unknown kids,
+# and stale keys served while a refresh is in flight.
+import json
+import threading
+import time
+
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+
+import server
+
+
+def jwk(kid):
+    public_key = rsa.generate_private_key(public_exponent=65537, key_size=2048).public_key()
+    return {**json.loads(RSAAlgorithm.to_jwk(public_key)), "kid": kid, "alg": "RS256", "use": "sig"}
+
+
+class FakeResponse:
+    def __init__(self, keys, max_age):
+        self._keys = keys
+        self.headers = {"Cache-Control": f"public, max-age={max_age}"}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"keys": self._keys}
+
+
+class FakeSession:
+    """Serves the current key set; counts requests and can hold them open."""
+
+    def __init__(self, keys, max_age=3600, delay=0.0):
+        self.keys = keys
+        self.max_age = max_age
+        self.delay = delay
+        self.calls = 0
+
+    def get(self, url, timeout):
+        self.calls += 1
+        time.sleep(self.delay)
+        return FakeResponse(list(self.keys), self.max_age)
+
+
+@pytest.fixture(scope="module")
+def keys():
+    return {kid: jwk(kid) for kid in ("k1", "k2")}
+
+
+def key_source(session, **options):
+    source = server.JwksKeySource("https://example.test/certs", **options)
+    source.session = session
+    return source
+
+
+def test_cold_start_fetches_once(keys):
+    session = FakeSession([keys["k1"]], delay=0.1)
+    source = key_source(session)
+    found = []
+    threads = [threading.Thread(target=lambda: found.append(source.get_key("k1"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert session.calls == 1
+    assert len(found) == 8
+
+
+def test_unknown_kid_is_throttled(keys):
+    session = FakeSession([keys["k1"]])
+    source = key_source(session, min_refetch_interval=30)
+    source.get_key("k1")
+
+    for _ in range(5):
+        with pytest.raises(ValueError):
+            source.get_key("made-up")
+    assert session.calls == 1  # fetched too recently to try again
+
+
+def test_unknown_kid_is_negatively_cached(keys):
+    session = FakeSession([keys["k1"]])
+    source = key_source(session, min_refetch_interval=0)
+    source.get_key("k1")
+
+    for _ in range(5):
+        with pytest.raises(ValueError):
+            source.get_key("made-up")
+    assert session.calls == 2  # one fetch to look for it, then remembered as unknown
+
+
+def test_rotated_key_is_picked_up(keys):
+    session = FakeSession([keys["k1"]])
+    source = key_source(session, min_refetch_interval=0)
+    source.get_key("k1")
+
+    session.keys = [keys["k1"], keys["k2"]]
+    assert source.get_key("k2") is not None
+    assert session.calls == 2
+
+
+def test_expired_key_is_served_while_a_fetch_is_in_flight(keys):
+    session = FakeSession([keys["k1"]])
+    source = key_source(session)
+    stale = source.get_key("k1")
+    source._expires_at = 0.0
+
+    with source._fetch_lock:  # another request is fetching
+        assert source.get_key("k1") is stale
+    assert session.calls == 1
+
+    source.get_key("k1")  # nobody fetching now: this one refreshes
+    assert session.calls == 2
+
+
+def test_refresh_starts_in_the_background_before_expiry(keys):
+    session = FakeSession([keys["k1"]], max_age=100)
+    source = key_source(session, refresh_margin=300)
+    source.get_key("k1")  # inside the margin as soon as it is fetched
+
+    source.get_key("k1")
+    deadline = time.monotonic() + 2
+    while session.calls < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert session.calls == 2
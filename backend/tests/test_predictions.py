@@ -0,0 +1,24 @@
+# /predict/batch serves one prediction per visible quiz the user has attempted.
+import server
+from server import app, db
+
+
+def test_batch_skips_hidden_and_deleted_quizzes(client, make_user):
+    user_id, headers = make_user("user@example.com")
+    _, admin = make_user("admin@example.com", "admin")
+    quiz_ids = [client.post("/quizzes", json={"title": f"Quiz {i}"}, headers=admin).get_json()["quiz_id"]
+                for i in range(3)]
+    for quiz_id in quiz_ids:
+        client.post("/results/batch", headers=headers, json={"items": [
+            {"quiz_id": quiz_id, "score": score, "total_questions": 10} for score in (4, 6, 7)
+        ]})
+    # an attempt at a quiz that no longer exists, from before user_quiz_model was backfilled
+    client.post("/results", json={"quiz_id": 99, "score": 5, "total_questions": 10}, headers=headers)
+    with app.app_context():
+        server.UserQuizModel.query.filter_by(quiz_id=99).delete()
+        db.session.get(server.Quiz, quiz_ids[1]).is_hidden = True  # purge in progress
+        db.session.commit()
+
+    response = client.get(f"/predict/batch?user_id={user_id}", headers=headers)
+    assert response.status_code == 200
+    assert [p["quiz_id"] for p in response.get_json()["predictions"]] == [quiz_ids[0], quiz_ids[2]]
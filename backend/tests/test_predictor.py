@@ -0,0 +1,72 @@
+# The incremental moment path must give the same fit as a weighted lstsq over
+# the full history, including histories where every attempt has one difficulty.
+import numpy as np
+import pytest
+
+from predictor import (
+    add_observation, empty_moments, fit_from_moments, fit_weighted_history, moments_from_history,
+    moments_from_json, moments_to_json, predict_next_percentage, stack_moments,
+)
+
+
+def history(n, seed, difficulties=(1, 2, 3, 4)):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0, 100, n), rng.choice(difficulties, n).astype(float)
+
+
+def folded(y, d):
+    moments = empty_moments()
+    for index, (pct, diff) in enumerate(zip(y, d), start=1):
+        add_observation(moments, index, diff, pct)
+    return moments
+
+
+def predicted(beta, n, difficulty):
+    return beta[0] + beta[1] * (n + 1) + beta[2] * difficulty
+
+
+@pytest.mark.parametrize("n", [2, 3, 7, 40, 300])
+def test_folded_moments_match_history(n):
+    y, d = history(n, seed=n)
+    moments = folded(y, d)
+    expected = moments_from_history(y, d)
+    assert np.allclose(moments["S"], expected["S"])
+    assert np.allclose(moments["T"], expected["T"])
+
+    restored = moments_from_json(moments_to_json(moments))
+    assert np.array_equal(restored["S"], moments["S"])
+
+
+@pytest.mark.parametrize("n", [3, 7, 40, 300])
+def test_fit_matches_weighted_lstsq(n):
+    y, d = history(n, seed=n)
+    beta = fit_from_moments(moments_from_history(y, d), n)
+    assert np.allclose(beta, fit_weighted_history(y, d), rtol=1e-7, atol=1e-7)
+
+
+@pytest.mark.parametrize("n", [2, 3, 10, 60, 500])
+def test_same_difficulty_history_is_rank_two(n):
+    # [1, index, difficulty] has a constant third column, so X is rank 2; the
+    # SOLVE_RCOND cutoff must land on lstsq's minimum-norm answer, not blow up
+    y, d = history(n, seed=n, difficulties=(3,))
+    beta = fit_from_moments(moments_from_history(y, d), n)
+    reference = fit_weighted_history(y, d)
+    assert np.allclose(beta, reference, rtol=1e-6, atol=1e-6)
+    assert predicted(beta, n, 3) == pytest.approx(predicted(reference, n, 3), abs=1e-6)
+
+
+def test_stacked_fit_matches_one_by_one():
+    histories = [history(n, seed=n) for n in (2, 5, 9, 30)] + [history(12, seed=1, difficulties=(2,))]
+    stacked = fit_from_moments(
+        stack_moments([moments_from_history(y, d) for y, d in histories]),
+        np.array([len(y) for y, _ in histories], dtype=float),
+    )
+    for beta, (y, d) in zip(stacked, histories):
+        assert np.allclose(beta, fit_from_moments(moments_from_history(y, d), len(y)))
+
+
+def test_small_history_blends_last_two_scores():
+    beta = np.array([0.0, 50.0, 0.0])  # a fit that would predict far above 100
+    assert predict_next_percentage(beta, 3, 2, 80.0, 60.0) == pytest.approx(0.7 * 80 + 0.3 * 60)
+    assert predict_next_percentage(beta, 8, 2, 80.0, 60.0) == 100.0
+    assert list(predict_next_percentage(np.stack([beta, -beta]), np.array([8, 8]), 2, 50.0, 50.0)) == [100.0, 0.0]
@@ -0,0 +1,60 @@
+# start_quiz samples from in-memory question pools; edits from any worker must
+# reach them once the pool version is re-checked.
+import server
+from server import app, db
+
+
+def setup_quiz(client, make_user):
+    _, admin = make_user("admin@example.com", "admin")
+    quiz_id = client.post("/quizzes", json={"title": "Pools"}, headers=admin).get_json()["quiz_id"]
+    client.post(f"/quizzes/{quiz_id}/questions/bulk", headers=admin, json=[
+        {"question_text": f"Question {i}", "options": ["a", "b"], "correct_answer": "a", "difficulty": difficulty}
+        for i in range(5) for difficulty in ("Easy", "Hard")
+    ])
+    return quiz_id
+
+
+def pool(quiz_id, difficulty="Easy"):
+    with app.app_context():
+        return sorted(server.get_question_pool(quiz_id, difficulty))
+
+
+def test_edit_from_another_worker_reaches_the_pool(client, make_user, monkeypatch):
+    quiz_id = setup_quiz(client, make_user)
+    monkeypatch.setattr(server, "QUESTION_POOL_TTL", 0)
+    easy, hard = pool(quiz_id), pool(quiz_id, "Hard")
+
+    # another worker swaps the difficulty of two questions: count and max id of
+    # both banks stay the same, only the revision moves
+    with app.app_context():
+        db.session.get(server.Question, easy[0]).difficulty = "Hard"
+        db.session.get(server.Question, hard[0]).difficulty = "Easy"
+        server.bump_question_revision(quiz_id)
+        db.session.commit()
+
+    assert pool(quiz_id) == sorted(easy[1:] + hard[:1])
+    assert pool(quiz_id, "Hard") == sorted(hard[1:] + easy[:1])
+
+
+def test_pool_version_is_checked_once_per_ttl(client, make_user, monkeypatch):
+    quiz_id = setup_quiz(client, make_user)
+    _, headers = make_user("user@example.com")
+    calls = []
+    real = server.question_pool_signature
+    monkeypatch.setattr(server, "question_pool_signature", lambda *args: calls.append(args) or real(*args))
+
+    for _ in range(3):
+        assert client.post(f"/quizzes/{quiz_id}/start", json={"difficulty": "Easy"}, headers=headers).status_code == 200
+    assert len(calls) == 1
+
+
+def test_start_for_deleted_user(client, make_user):
+    quiz_id = setup_quiz(client, make_user)
+    user_id, headers = make_user("user@example.com")
+    client.post(f"/quizzes/{quiz_id}/start", json={"difficulty": "Easy"}, headers=headers)  # caches the principal
+    with app.app_context():
+        server.User.query.filter_by(id=user_id).delete()
+        db.session.commit()
+
+    response = client.post(f"/quizzes/{quiz_id}/start", json={"difficulty": "Easy"}, headers=headers)
+    assert response.status_code == 401
@@ -0,0 +1,38 @@
+# GET /quizzes/<id> pages through one seeded shuffle of the question bank.
+import server
+
+
+def setup_quiz(client, make_user):
+    _, admin = make_user("admin@example.com", "admin")
+    quiz_id = client.post("/quizzes", json={"title": "Pages"}, headers=admin).get_json()["quiz_id"]
+    client.post(f"/quizzes/{quiz_id}/questions/bulk", headers=admin, json=[
+        {"question_text": f"Question {i}", "options": ["a", "b"], "correct_answer": "a", "difficulty": "Easy"}
+        for i in range(7)
+    ])
+    return quiz_id
+
+
+def test_cursor_walks_the_whole_bank_once(client, make_user):
+    quiz_id = setup_quiz(client, make_user)
+    seen, cursor = [], None
+    while True:
+        query = f"cursor={cursor}" if cursor else "limit=3&seed=42"
+        page = client.get(f"/quizzes/{quiz_id}?{query}").get_json()
+        seen += [q["id"] for q in page["questions"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert sorted(seen) == list(range(1, 8))
+
+
+def test_bad_limit_and_offset(client, make_user):
+    quiz_id = setup_quiz(client, make_user)
+
+    response = client.get(f"/quizzes/{quiz_id}?limit=0")
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "limit must be greater than zero"
+
+    cursor = server.encode_cursor({"seed": 1, "offset": -3})
+    response = client.get(f"/quizzes/{quiz_id}?cursor={cursor}")
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "offset must be zero or greater"
@@ -0,0 +1,109 @@
+# Client-reported results: idempotent replays, concurrent conflicts, and errors
+# that are not key conflicts.
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+import server
+from server import app, db
+
+
+@pytest.fixture
+def user(client, make_user):
+    user_id, headers = make_user("user@example.com")
+    return user_id, headers
+
+
+def result(score, key=None, quiz_id=1):
+    item = {"quiz_id": quiz_id, "score": score, "total_questions": 10}
+    if key is not None:
+        item["idempotency_key"] = key
+    return item
+
+
+def stored_attempts():
+    with app.app_context():
+        return server.QuizAttempt.query.count(), server.UserQuizStats.query.with_entities(server.UserQuizStats.attempts).scalar()
+
+
+def store_concurrently(monkeypatch, user_id, key):
+    """Insert a row with `key` right after the request has parsed its payload."""
+    real = server.parse_result_payload
+
+    def parse_and_race(data, *args):
+        values, error = real(data, *args)
+        if values and values["idempotency_key"] == key:
+            with db.engine.begin() as conn:
+                conn.execute(insert(server.QuizAttempt), [{**values, "score": 1}])
+        return values, error
+
+    monkeypatch.setattr(server, "parse_result_payload", parse_and_race)
+
+
+def test_replayed_key_returns_the_stored_attempt(client, user):
+    _, headers = user
+    first = client.post("/results", json=result(7, "k1"), headers=headers)
+    again = client.post("/results", json=result(9, "k1"), headers=headers)
+
+    assert first.status_code == 201
+    assert again.status_code == 200
+    assert again.get_json()["id"] == first.get_json()["id"]
+    assert again.get_json()["score"] == 7
+    assert stored_attempts() == (1, 1)
+
+
+def test_concurrent_insert_with_same_key(client, user, monkeypatch):
+    user_id, headers = user
+    store_concurrently(monkeypatch, user_id, "k1")
+
+    response = client.post("/results", json=result(7, "k1"), headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()["score"] == 1  # the row the other request stored
+
+
+def test_keyless_integrity_error_is_not_a_replay(client, user, monkeypatch):
+    _, headers = user
+    client.post("/results", json=result(5), headers=headers)
+    real = server.parse_result_payload
+
+    def parse_without_quiz(*args):
+        values, error = real(*args)
+        return {**values, "quiz_id": None}, error
+
+    monkeypatch.setattr(server, "parse_result_payload", parse_without_quiz)
+    with pytest.raises(IntegrityError):
+        client.post("/results", json=result(6), headers=headers)
+    with pytest.raises(IntegrityError):
+        client.post("/results/batch", json={"items": [result(6), result(7, "k2")]}, headers=headers)
+
+
+def test_batch_reports_duplicates(client, user):
+    _, headers = user
+    client.post("/results", json=result(5, "k1"), headers=headers)
+    response = client.post("/results/batch", json={"items": [
+        result(6, "k1"), result(7, "k2"), result(8, "k2"), result(9), {"score": 1},
+    ]}, headers=headers).get_json()
+
+    assert [r["status"] for r in response["results"]] == ["duplicate", "created", "duplicate", "created", "invalid"]
+    assert response["results"][2]["id"] == response["results"][1]["id"]
+    assert stored_attempts() == (3, 3)
+
+
+def test_batch_conflicting_with_concurrent_insert(client, user, monkeypatch):
+    user_id, headers = user
+    real = server.insert
+
+    def race_then_insert(table):
+        # another request stores k2 between the duplicate lookup and the bulk insert
+        monkeypatch.setattr(server, "insert", real)
+        with db.engine.begin() as conn:
+            conn.execute(real(table), [{**result(1, "k2"), "user_id": user_id, "question_order": [], "status": "submitted"}])
+        return real(table)
+
+    monkeypatch.setattr(server, "insert", race_then_insert)
+    response = client.post("/results/batch", json={"items": [result(6, "k1"), result(7, "k2")]}, headers=headers)
+    assert response.status_code == 409
+    assert stored_attempts()[0] == 1
+
+    retry = client.post("/results/batch", json={"items": [result(6, "k1"), result(7, "k2")]}, headers=headers).get_json()
+    assert [r["status"] for r in retry["results"]] == ["created", "duplicate"]
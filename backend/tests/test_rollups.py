@@ -0,0 +1,115 @@
+# Every submit path folds the attempt into the rollups incrementally; after any
+# mix of them the rollups must equal a rebuild from quiz_attempt, which is what
+# `rebuild_rollups.py --check` verifies.
+import pytest
+
+import server
+from rebuild_rollups import check_rollups, rebuild_rollups
+from server import app
+
+QUESTIONS = 25
+
+
+@pytest.fixture
+def quiz(client, make_user):
+    _, admin = make_user("admin@example.com", "admin")
+    response = client.post("/quizzes", json={"title": "Rollups"}, headers=admin)
+    quiz_id = response.get_json()["quiz_id"]
+    client.post(f"/quizzes/{quiz_id}/questions/bulk", headers=admin, json=[
+        {"question_text": f"Question {i}", "options": ["a", "b", "c"], "correct_answer": "b", "difficulty": difficulty}
+        for i in range(QUESTIONS) for difficulty in ("Easy", "Hard")
+    ])
+    return quiz_id, admin
+
+
+def start(client, quiz_id, headers, difficulty="Easy"):
+    response = client.post(f"/quizzes/{quiz_id}/start", json={"difficulty": difficulty}, headers=headers)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def assert_rollups_match():
+    with app.app_context():
+        assert check_rollups() == 0
+        rebuild_rollups()
+        assert check_rollups() == 0
+
+
+def test_single_submit(client, make_user, quiz):
+    quiz_id, _ = quiz
+    _, headers = make_user("user@example.com")
+    for difficulty, answer in (("Easy", 1), ("Hard", 0), ("Easy", 2)):
+        total = start(client, quiz_id, headers, difficulty)["total_questions"]
+        response = client.post(f"/quizzes/{quiz_id}/submit", json={"answers": [answer] * total}, headers=headers)
+        assert response.status_code == 200
+
+    assert_rollups_match()
+
+
+def test_queued_submit(client, make_user, quiz, monkeypatch):
+    quiz_id, _ = quiz
+    writer = server.SubmissionWriter("async", 100, 10, 0.01, server.SUBMIT_JOURNAL_DIR)
+    monkeypatch.setattr(server, "submission_writer", writer)
+    users = [make_user(f"user{i}@example.com") for i in range(3)]
+    for _, headers in users:
+        for _ in range(2):
+            total = start(client, quiz_id, headers)["total_questions"]
+            response = client.post(f"/quizzes/{quiz_id}/submit", json={"answers": [1] * total}, headers=headers)
+            assert response.status_code == 200
+            # the writer only applies attempts still marked as submitting; let it catch up
+            writer.stop()
+            writer._thread = None
+            writer._stop.clear()
+
+    assert writer.stats["written"] == 6
+    assert_rollups_match()
+
+
+def test_grading_batch(client, make_user, quiz):
+    quiz_id, admin = quiz
+    attempt_ids = [start(client, quiz_id, headers)["attempt_id"] for _, headers in
+                   (make_user(f"user{i}@example.com") for i in range(4))]
+    submissions = [{"attempt_id": attempt_id, "answers": [1] * 20} for attempt_id in attempt_ids]
+
+    response = client.post("/grading/batch", json={"submissions": submissions}, headers=admin)
+    assert response.get_json()["graded"] == 4
+    # grading the same attempts again must not fold them twice
+    response = client.post("/grading/batch", json={"submissions": submissions[:2]}, headers=admin)
+    assert response.get_json()["graded"] == 0
+
+    assert_rollups_match()
+
+
+def test_results_batch_same_day(client, make_user, quiz):
+    """Two batches on the same day used to count the first batch's attempts twice."""
+    quiz_id, _ = quiz
+    _, headers = make_user("user@example.com")
+    for scores in ((5, 7), (6,), (8, 9)):
+        items = [{"quiz_id": quiz_id, "score": score, "total_questions": 10} for score in scores]
+        response = client.post("/results/batch", json={"items": items}, headers=headers)
+        assert response.status_code in (200, 201)
+
+    activity = client.get("/results/activity", headers=headers).get_json()
+    assert activity["total_attempts"] == 5
+    assert_rollups_match()
+
+
+def test_mixed_paths(client, make_user, quiz):
+    quiz_id, admin = quiz
+    _, headers = make_user("user@example.com")
+
+    total = start(client, quiz_id, headers)["total_questions"]
+    client.post(f"/quizzes/{quiz_id}/submit", json={"answers": [1] * total}, headers=headers)
+    client.post("/results", json={"quiz_id": quiz_id, "score": 4, "total_questions": 10}, headers=headers)
+    client.post("/results/batch", json={"items": [
+        {"quiz_id": quiz_id, "score": 6, "total_questions": 10},
+        {"quiz_id": quiz_id, "score": 9, "total_questions": 10},
+    ]}, headers=headers)
+    attempt_id = start(client, quiz_id, headers, "Hard")["attempt_id"]
+    response = client.post("/grading/batch", json={"submissions": [{"attempt_id": attempt_id, "answers": [0] * 20}]},
+                           headers=admin)
+    assert response.get_json()["graded"] == 1
+
+    activity = client.get("/results/activity", headers=headers).get_json()
+    assert activity["total_attempts"] == 5
+    assert_rollups_match()
@@ -0,0 +1,148 @@
+# Write-behind submissions: journal group commit, replay of orphaned journals,
+# and isolating a submission the database keeps rejecting.
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+import server
+from rebuild_rollups import check_rollups
+from server import app, db
+
+
+@pytest.fixture
+def attempts(client, make_user):
+    """Four users with one started attempt each; returns their attempt ids."""
+    _, admin = make_user("admin@example.com", "admin")
+    quiz_id = client.post("/quizzes", json={"title": "Writer"}, headers=admin).get_json()["quiz_id"]
+    client.post(f"/quizzes/{quiz_id}/questions/bulk", headers=admin, json=[
+        {"question_text": f"Question {i}", "options": ["a", "b"], "correct_answer": "b", "difficulty": "Easy"}
+        for i in range(20)
+    ])
+    ids = []
+    for i in range(4):
+        _, headers = make_user(f"user{i}@example.com")
+        ids.append(client.post(f"/quizzes/{quiz_id}/start", json={"difficulty": "Easy"}, headers=headers)
+                   .get_json()["attempt_id"])
+    return ids
+
+
+def submission_items(attempt_ids):
+    """What submit_quiz would queue for each attempt, with the attempts marked as submitting."""
+    items = []
+    with app.app_context():
+        for attempt_id in attempt_ids:
+            attempt = db.session.get(server.QuizAttempt, attempt_id)
+            selected = [1] * len(attempt.question_order)
+            detail = server.compact_answers_detail(selected, [True] * len(selected))
+            values = server.submission_values(attempt, len(selected), detail, datetime.utcnow())
+            items.append(server.submission_item(attempt, values))
+            assert server.mark_attempt_submitting(attempt)
+    return items
+
+
+def statuses(attempt_ids):
+    with app.app_context():
+        return [db.session.get(server.QuizAttempt, attempt_id).status for attempt_id in attempt_ids]
+
+
+def new_writer(tmp_path, mode="journal", batch_size=10):
+    return server.SubmissionWriter(mode, 100, batch_size, 0.01, tmp_path)
+
+
+def test_journal_replay_applies_orphaned_submissions(attempts, tmp_path):
+    items = submission_items(attempts)
+    # a crashed worker's journal, with a torn final line
+    journal = tmp_path / "submit-1234-deadbeef.ndjson"
+    lines = [json.dumps(item, default=datetime.isoformat) for item in items]
+    journal.write_text("\n".join(lines) + "\n" + lines[0][:20])
+
+    writer = new_writer(tmp_path, batch_size=3)
+    writer.start()
+    writer.stop()
+
+    assert writer.stats["replayed"] == 4
+    assert not journal.exists()
+    assert statuses(attempts) == ["submitted"] * 4
+    with app.app_context():
+        assert check_rollups() == 0
+
+    # replaying the same journal again is a no-op: the attempts are no longer open
+    journal.write_text("\n".join(lines) + "\n")
+    writer = new_writer(tmp_path)
+    writer.start()
+    writer.stop()
+    with app.app_context():
+        assert server.UserQuizStats.query.with_entities(db.func.sum(server.UserQuizStats.attempts)).scalar() == 4
+
+
+def test_concurrent_journal_writes_share_fsyncs(tmp_path, monkeypatch):
+    real_fsync = os.fsync
+
+    def slow_fsync(fd):
+        time.sleep(0.05)
+        real_fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", slow_fsync)
+    writer = new_writer(tmp_path)
+    monkeypatch.setattr(writer, "_run", lambda: None)  # keep the queue and journal to inspect them
+    writer.start()
+
+    threads = [threading.Thread(target=writer.submit, args=({"id": i}, 1.0)) for i in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert writer.stats["enqueued"] == 16
+    assert 1 <= writer.stats["journal_syncs"] < 16
+    assert writer._journal_synced == 16
+    journal = next(tmp_path.glob("submit-*.ndjson"))
+    assert sorted(json.loads(line)["id"] for line in journal.read_text().splitlines()) == list(range(16))
+
+
+def test_failing_submission_is_bisected_into_the_dead_letter_file(attempts, tmp_path, monkeypatch):
+    items = submission_items(attempts)
+    bad_id = attempts[2]
+    real = server.write_submission_batch
+
+    def reject_bad(batch):
+        if any(item["id"] == bad_id for item in batch):
+            raise ValueError("bad submission")
+        return real(batch)
+
+    monkeypatch.setattr(server, "write_submission_batch", reject_bad)
+    monkeypatch.setattr(server, "SUBMIT_MAX_RETRIES", 0)
+    writer = new_writer(tmp_path, mode="async")
+
+    assert writer._write(items) == (3, 1)
+    assert statuses(attempts) == ["submitted", "submitted", "submitting", "submitted"]
+    dead = [json.loads(line) for line in (tmp_path / "dead-letter.ndjson").read_text().splitlines()]
+    assert [item["id"] for item in dead] == [bad_id]
+    assert writer.stats["dead_lettered"] == 1
+
+
+def test_full_queue_rejects_and_reopens_the_attempt(client, make_user, tmp_path, monkeypatch):
+    _, admin = make_user("admin@example.com", "admin")
+    quiz_id = client.post("/quizzes", json={"title": "Full"}, headers=admin).get_json()["quiz_id"]
+    client.post(f"/quizzes/{quiz_id}/questions/bulk", headers=admin, json=[
+        {"question_text": "Question", "options": ["a", "b"], "correct_answer": "b", "difficulty": "Easy"}
+    ])
+    _, headers = make_user("user@example.com")
+    attempt_id = client.post(f"/quizzes/{quiz_id}/start", json={"difficulty": "Easy"}, headers=headers).get_json()["attempt_id"]
+
+    writer = server.SubmissionWriter("async", 1, 10, 0.01, tmp_path)
+    monkeypatch.setattr(writer, "_run", lambda: None)
+    writer.start()
+    writer.submit({"id": -1}, 0)  # fill the queue
+    monkeypatch.setattr(server, "submission_writer", writer)
+    monkeypatch.setattr(server, "SUBMIT_ENQUEUE_TIMEOUT", 0.05)
+
+    response = client.post(f"/quizzes/{quiz_id}/submit", json={"answers": [1]}, headers=headers)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert statuses([attempt_id]) == ["in_progress"]
+    assert writer.stats["rejected"] == 1
@@ -0,0 +1,88 @@
+# A quiz attempt is submitted exactly once, whichever path gets there first.
+import server
+from rebuild_rollups import check_rollups
+from server import app, db
+
+
+def setup_quiz(client, make_user):
+    _, admin = make_user("admin@example.com", "admin")
+    quiz_id = client.post("/quizzes", json={"title": "Submit"}, headers=admin).get_json()["quiz_id"]
+    client.post(f"/quizzes/{quiz_id}/questions/bulk", headers=admin, json=[
+        {"question_text": f"Question {i}", "options": ["a", "b", "c"], "correct_answer": "b", "difficulty": "Easy"}
+        for i in range(20)
+    ])
+    return quiz_id, admin
+
+
+def stored_attempts():
+    with app.app_context():
+        stats = server.UserQuizStats.query.one()
+        return stats.attempts, check_rollups()
+
+
+def race_during_grading(monkeypatch, other_request):
+    """Run other_request while the outer submit is between its read and its write."""
+    real = server.grade_submissions
+    raced = []
+
+    def grade_and_race(*args):
+        monkeypatch.setattr(server, "grade_submissions", real)
+        raced.append(other_request())
+        return real(*args)
+
+    monkeypatch.setattr(server, "grade_submissions", grade_and_race)
+    return raced
+
+
+def test_second_submit_is_rejected(client, make_user):
+    quiz_id, _ = setup_quiz(client, make_user)
+    _, headers = make_user("user@example.com")
+    client.post(f"/quizzes/{quiz_id}/start", json={"difficulty": "Easy"}, headers=headers)
+
+    assert client.post(f"/quizzes/{quiz_id}/submit", json={"answers": [1] * 20}, headers=headers).status_code == 200
+    assert client.post(f"/quizzes/{quiz_id}/submit", json={"answers": [1] * 20}, headers=headers).status_code == 400
+    assert stored_attempts() == (1, 0)
+
+
+def test_concurrent_submits_fold_once(client, make_user, monkeypatch):
+    quiz_id, _ = setup_quiz(client, make_user)
+    _, headers = make_user("user@example.com")
+    client.post(f"/quizzes/{quiz_id}/start", json={"difficulty": "Easy"}, headers=headers)
+
+    raced = race_during_grading(monkeypatch, lambda: client.post(
+        f"/quizzes/{quiz_id}/submit", json={"answers": [0] * 20}, headers=headers))
+    response = client.post(f"/quizzes/{quiz_id}/submit", json={"answers": [1] * 20}, headers=headers)
+
+    assert raced[0].status_code == 200
+    assert response.status_code == 409
+    assert stored_attempts() == (1, 0)
+    with app.app_context():
+        assert db.session.query(server.QuizAttempt.score).scalar() == 0  # the first writer won
+
+
+def test_submit_racing_grade_batch_folds_once(client, make_user, monkeypatch):
+    quiz_id, admin = setup_quiz(client, make_user)
+    _, headers = make_user("user@example.com")
+    attempt_id = client.post(f"/quizzes/{quiz_id}/start", json={"difficulty": "Easy"}, headers=headers).get_json()["attempt_id"]
+
+    raced = race_during_grading(monkeypatch, lambda: client.post(
+        "/grading/batch", json={"submissions": [{"attempt_id": attempt_id, "answers": [1] * 20}]}, headers=admin))
+    response = client.post(f"/quizzes/{quiz_id}/submit", json={"answers": [1] * 20}, headers=headers)
+
+    assert raced[0].get_json()["graded"] == 1
+    assert response.status_code == 409
+    assert stored_attempts() == (1, 0)
+
+
+def test_submit_to_hidden_quiz_is_rejected(client, make_user):
+    quiz_id, _ = setup_quiz(client, make_user)
+    _, headers = make_user("user@example.com")
+    client.post(f"/quizzes/{quiz_id}/start", json={"difficulty": "Easy"}, headers=headers)
+    with app.app_context():
+        db.session.get(server.Quiz, quiz_id).is_hidden = True  # delete_quiz before the purge runs
+        db.session.commit()
+
+    response = client.post(f"/quizzes/{quiz_id}/submit", json={"answers": [1] * 20}, headers=headers)
+    assert response.status_code == 404
+    with app.app_context():
+        assert server.UserQuizStats.query.count() == 0
@@ -0,0 +1,18 @@
+# The HTTP synthetic generator runs inside the request, so its size is capped.
+import server
+
+
+def test_generate_synthetic_caps_rows(client, make_user, monkeypatch, tmp_path):
+    _, headers = make_user("user@example.com")
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "ml_datasets").mkdir()
+
+    too_big = {"users": server.SYNTHETIC_MAX_ROWS // 10 + 1, "n": 10}
+    response = client.post("/module3/generate_synthetic", json=too_big, headers=headers)
+    assert response.status_code == 400
+    assert "synthetic.py" in response.get_json()["error"]
+    assert not list((tmp_path / "ml_datasets").iterdir())
+
+    response = client.post("/module3/generate_synthetic", json={"users": 3, "n": 5, "seed": 1}, headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()["samples"] == 15